@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Event driven dispatcher for the batched ingestion pipeline
+
+Receives MinIO bucket notifications on a webhook, coalesces the created
+objects into micro-batches (by count or time window) and submits one
+doc_batch_ingestion_pl run per batch.
+
+Configure MinIO to send notifications to the dispatcher, e.g.:
+
+    mc admin config set myminio notify_webhook:ingest endpoint="http://ingest-dispatcher:8000/events"
+    mc event add myminio/doc-ingestion arn:minio:sqs::ingest:webhook --event put
+
+For local testing events can be replayed from a JSONL file of MinIO
+notification payloads with --replay, together with --dry-run.
+
+Batches that fail to submit are retried with exponential backoff. Documents
+still failing after --max-attempts are appended to the --dead-letter file as
+notification payloads, so they can be resubmitted later with --replay.
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote_plus, unquote_plus
+
+from kfp import compiler
+from kubeflow_pipeline import doc_batch_ingestion_pl
+
+
+def compile_batch_pipeline(output_path="doc_batch_ingestion_pl.yaml"):
+    """Compile the batched pipeline once, every batch run reuses the package"""
+    print(f"Compiling batch pipeline to {output_path}...")
+    compiler.Compiler().compile(
+        pipeline_func=doc_batch_ingestion_pl,
+        package_path=output_path
+    )
+    print(f"✓ Batch pipeline compiled successfully to '{output_path}'")
+    return output_path
+
+
+def parse_minio_event(payload):
+    """Return (s3_location, etag) for every object created event in a MinIO notification payload"""
+    created = []
+    for record in payload.get("Records", []):
+        if not record.get("eventName", "").startswith("s3:ObjectCreated:"):
+            continue
+        s3 = record.get("s3", {})
+        bucket_name = s3.get("bucket", {}).get("name")
+        # Object keys are URL encoded in bucket notifications
+        object_key = unquote_plus(s3.get("object", {}).get("key", ""))
+        if not bucket_name or not object_key:
+            continue
+        created.append((f"s3://{bucket_name}/{object_key}", s3["object"].get("eTag")))
+    return created
+
+
+def minio_event(s3_location, etag=None):
+    """Object created notification payload for an S3 location, the inverse of parse_minio_event"""
+    bucket_name, _, object_key = s3_location[len("s3://"):].partition("/")
+    s3_object = {"key": quote_plus(object_key)}
+    if etag is not None:
+        s3_object["eTag"] = etag
+    return {
+        "EventName": "s3:ObjectCreated:Put",
+        "Records": [{"eventName": "s3:ObjectCreated:Put", "s3": {"bucket": {"name": bucket_name}, "object": s3_object}}],
+    }
+
+
+class MicroBatcher:
+    """Coalesce S3 locations into batches, flushed when full or when the oldest entry is too old
+
+    Repeated events for the same key while it is pending collapse into one
+    entry. Redelivered events for an object that was already submitted with
+    the same ETag are dropped.
+
+    A batch that fails to submit goes back to the front of the pending
+    entries and nothing is submitted until a backoff of retry_base_seconds,
+    doubled on every failure, has passed. After max_attempts failures, or
+    when the submission on close fails, the documents are written to
+    dead_letter_path.
+    """
+
+    def __init__(self, submit_batch, max_batch_size=50, max_wait_seconds=30.0, recent_size=10000,
+                 max_attempts=5, retry_base_seconds=2.0, dead_letter_path=None):
+        self.submit_batch = submit_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.recent_size = recent_size
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.dead_letter_path = dead_letter_path
+
+        self._lock = threading.Condition()
+        self._pending = OrderedDict()
+        self._oldest = None
+        self._attempts = {}
+        self._retry_at = None
+        self._submitted = OrderedDict()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+
+    def start(self):
+        self._worker.start()
+        return self
+
+    def add(self, s3_location, etag=None):
+        """Queue an S3 location, returns False if the event was a duplicate"""
+        with self._lock:
+            if etag is not None and self._submitted.get(s3_location) == etag:
+                return False
+            if s3_location in self._pending:
+                self._pending[s3_location] = etag
+                return False
+            if not self._pending:
+                # Wake the worker so it starts the time window
+                self._oldest = time.monotonic()
+                self._lock.notify()
+            self._pending[s3_location] = etag
+            if len(self._pending) >= self.max_batch_size:
+                self._lock.notify()
+            return True
+
+    def close(self):
+        """Flush whatever is pending and stop the worker"""
+        with self._lock:
+            self._closed = True
+            self._lock.notify()
+        if self._worker.is_alive():
+            self._worker.join()
+        else:
+            self._flush(self._take())
+
+    def _take(self):
+        with self._lock:
+            batch = self._pending
+            self._pending = OrderedDict()
+            self._oldest = None
+            self._retry_at = None
+            return batch
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._closed:
+                    if self._retry_at is not None:
+                        # Backing off after a failed submission, full batches wait too
+                        deadline = self._retry_at
+                    elif len(self._pending) >= self.max_batch_size:
+                        break
+                    elif self._oldest is None:
+                        self._lock.wait()
+                        continue
+                    else:
+                        deadline = self._oldest + self.max_wait_seconds
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._lock.wait(remaining)
+                closed = self._closed
+            self._flush(self._take())
+            if closed:
+                return
+
+    def _flush(self, batch):
+        locations = list(batch)
+        # A burst larger than max_batch_size is split into several runs
+        for start in range(0, len(locations), self.max_batch_size):
+            chunk = locations[start:start + self.max_batch_size]
+            try:
+                self.submit_batch(chunk)
+            except Exception as e:
+                print(f"✗ Failed to submit batch of {len(chunk)} documents: {e}", file=sys.stderr)
+                # The later chunks would most likely fail the same way, retry them all after the backoff
+                self._retry(chunk, locations[start + len(chunk):], batch, e)
+                return
+            with self._lock:
+                for s3_location in chunk:
+                    self._attempts.pop(s3_location, None)
+                    self._submitted[s3_location] = batch[s3_location]
+                    self._submitted.move_to_end(s3_location)
+                while len(self._submitted) > self.recent_size:
+                    self._submitted.popitem(last=False)
+
+    def _retry(self, failed, untried, batch, error):
+        """Put a failed chunk and the chunks after it back in front of the pending entries"""
+        dead = []
+        with self._lock:
+            attempts = 0
+            for s3_location in failed:
+                self._attempts[s3_location] = self._attempts.get(s3_location, 0) + 1
+                attempts = max(attempts, self._attempts[s3_location])
+            requeue = []
+            for s3_location in failed + untried:
+                if self._closed or self._attempts.get(s3_location, 0) >= self.max_attempts:
+                    self._attempts.pop(s3_location, None)
+                    dead.append((s3_location, batch[s3_location]))
+                # A document with a newer event pending meanwhile keeps that event's ETag
+                elif s3_location not in self._pending:
+                    requeue.append(s3_location)
+            for s3_location in reversed(requeue):
+                self._pending[s3_location] = batch[s3_location]
+                self._pending.move_to_end(s3_location, last=False)
+            if self._pending and not self._closed:
+                now = time.monotonic()
+                self._oldest = now if self._oldest is None else min(self._oldest, now)
+                self._retry_at = now + self.retry_base_seconds * 2 ** (attempts - 1)
+                print(f"Retrying {len(self._pending)} documents in {self._retry_at - now:.1f}s")
+        if dead:
+            self._dead_letter(dead, error)
+
+    def _dead_letter(self, entries, error):
+        if self.dead_letter_path is None:
+            for s3_location, _ in entries:
+                print(f"✗ Giving up on {s3_location}: {error}", file=sys.stderr)
+            return
+        with open(self.dead_letter_path, "a") as f:
+            for s3_location, etag in entries:
+                f.write(json.dumps(minio_event(s3_location, etag)) + "\n")
+        print(f"✗ Gave up on {len(entries)} documents, written to {self.dead_letter_path}: {error}", file=sys.stderr)
+
+
+def make_kfp_submitter(host, pipeline_path, arguments):
+    """Return a callable submitting one batched pipeline run per batch"""
+    from kfp import client
+
+    print(f"Connecting to Kubeflow at {host}...")
+    kfp_client = client.Client(host=host)
+
+    def submit(locations):
+        run = kfp_client.create_run_from_pipeline_package(
+            pipeline_file=pipeline_path,
+            arguments={**arguments, "ingestion_document_s3_locations": locations},
+            run_name=f"document-ingestion-batch-{int(time.time())}"
+        )
+        print(f"✓ Submitted batch of {len(locations)} documents, Run ID: {run.run_id}")
+
+    return submit
+
+
+def dry_run_submit(locations):
+    print(f"[dry-run] batch of {len(locations)} documents: {json.dumps(locations)}")
+
+
+def make_handler(batcher):
+    class NotificationHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError:
+                self.send_response(400)
+                self.end_headers()
+                return
+            for s3_location, etag in parse_minio_event(payload):
+                batcher.add(s3_location, etag)
+            self.send_response(200)
+            self.end_headers()
+
+        def do_GET(self):
+            # Health probe
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    return NotificationHandler
+
+
+def replay_events(path, batcher):
+    """Feed MinIO notification payloads from a JSONL file, stand-in for the webhook"""
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                for s3_location, etag in parse_minio_event(json.loads(line)):
+                    batcher.add(s3_location, etag)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch MinIO bucket notifications into Kubeflow pipeline runs")
+    parser.add_argument(
+        "--host",
+        default="http://localhost:8080",
+        help="Kubeflow host URL (default: http://localhost:8080)"
+    )
+    parser.add_argument(
+        "--output",
+        default="doc_batch_ingestion_pl.yaml",
+        help="Output path for compiled batch pipeline (default: doc_batch_ingestion_pl.yaml)"
+    )
+    parser.add_argument(
+        "--listen",
+        default="0.0.0.0:8000",
+        help="Webhook listen address (default: 0.0.0.0:8000)"
+    )
+    parser.add_argument(
+        "--max-batch-size",
+        type=int,
+        default=50,
+        help="Submit a run once this many documents are pending (default: 50)"
+    )
+    parser.add_argument(
+        "--max-wait-seconds",
+        type=float,
+        default=30.0,
+        help="Submit a run once the oldest pending document waited this long (default: 30)"
+    )
+    parser.add_argument(
+        "--max-attempts",
+        type=int,
+        default=5,
+        help="Submissions tried per document before it is dead-lettered (default: 5)"
+    )
+    parser.add_argument(
+        "--dead-letter",
+        help="Append documents that could not be submitted to this JSONL file, it can be resubmitted with --replay"
+    )
+    parser.add_argument(
+        "--document-metadata",
+        default="{}",
+        help="JSON metadata passed to every document of a batch (default: {})"
+    )
+    parser.add_argument(
+        "--replay",
+        help="Read MinIO notification payloads from a JSONL file instead of listening"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Print batches instead of submitting them"
+    )
+
+    args = parser.parse_args()
+
+    if args.dry_run:
+        submit = dry_run_submit
+    else:
+        pipeline_path = compile_batch_pipeline(args.output)
+        submit = make_kfp_submitter(
+            args.host,
+            pipeline_path,
+            {"document_metadata": json.loads(args.document_metadata)},
+        )
+
+    batcher = MicroBatcher(
+        submit,
+        max_batch_size=args.max_batch_size,
+        max_wait_seconds=args.max_wait_seconds,
+        max_attempts=args.max_attempts,
+        dead_letter_path=args.dead_letter,
+    ).start()
+
+    if args.replay:
+        replay_events(args.replay, batcher)
+        batcher.close()
+        return
+
+    host, port = args.listen.rsplit(":", 1)
+    server = ThreadingHTTPServer((host, int(port)), make_handler(batcher))
+    print(f"Listening for bucket notifications on {args.listen}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
+
+
+if __name__ == "__main__":
+    main()
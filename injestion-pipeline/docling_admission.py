@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Admission control service for docling-serve
+
+Conversion stages of all pipeline runs share one concurrency budget. A
+stage takes a ticket describing the document (page count, size), waits
+until the ticket is granted, converts while renewing the lease, and then
+releases it. Queued tickets are granted shortest job first, with aging so
+large documents are not starved, which keeps small documents from
+waiting behind 1,000 page scans and keeps docling-serve at its saturation
+point instead of timing out.
+
+Leases and queued tickets that are not renewed within the lease TTL are
+dropped, so a killed conversion pod cannot leak budget.
+
+API:
+    POST   /tickets              {"pages": 12, "size_bytes": 1048576, "name": "a.pdf"}
+    POST   /tickets/<id>/wait    {"timeout": 30}  -> {"granted": bool, "position": int}
+    POST   /tickets/<id>/renew
+    DELETE /tickets/<id>
+    GET    /status
+"""
+
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Cost estimate for documents without a known page count
+BYTES_PER_PAGE = 100 * 1024
+MAX_WAIT_SECONDS = 60.0
+
+
+def estimate_cost(pages, size_bytes):
+    """Estimated conversion cost in pages"""
+    if pages and pages > 0:
+        return float(pages)
+    return max(1.0, size_bytes / BYTES_PER_PAGE)
+
+
+class AdmissionController:
+    """Shared concurrency budget with a shortest-job-first queue
+
+    A queued ticket's priority is its cost minus aging_pages_per_second for
+    every second it has waited, lowest priority is granted first.
+    """
+
+    def __init__(self, max_concurrent, lease_ttl=60.0, aging_pages_per_second=1.0):
+        self.max_concurrent = max_concurrent
+        self.lease_ttl = lease_ttl
+        self.aging_pages_per_second = aging_pages_per_second
+
+        self._cond = threading.Condition()
+        self._queued = {}
+        self._leases = {}
+
+    def enqueue(self, pages=0, size_bytes=0, name=""):
+        now = time.monotonic()
+        ticket_id = uuid.uuid4().hex
+        cost = estimate_cost(pages, size_bytes)
+        with self._cond:
+            self._queued[ticket_id] = {
+                "name": name,
+                "cost": cost,
+                "enqueued_at": now,
+                "expires_at": now + self.lease_ttl,
+            }
+            self._schedule(now)
+        return ticket_id, cost
+
+    def wait(self, ticket_id, timeout):
+        """Block until the ticket is granted or timeout, returns (granted, position) or None if unknown"""
+        deadline = time.monotonic() + min(timeout, MAX_WAIT_SECONDS)
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._schedule(now)
+                if ticket_id in self._leases:
+                    self._leases[ticket_id]["expires_at"] = now + self.lease_ttl
+                    return True, 0
+                if ticket_id not in self._queued:
+                    return None
+                self._queued[ticket_id]["expires_at"] = now + self.lease_ttl
+                if now >= deadline:
+                    return False, self._position(ticket_id, now)
+                # Wake up before the ticket would expire while we hold it
+                self._cond.wait(min(deadline - now, self.lease_ttl / 2))
+
+    def renew(self, ticket_id):
+        with self._cond:
+            ticket = self._leases.get(ticket_id) or self._queued.get(ticket_id)
+            if ticket is None:
+                return False
+            ticket["expires_at"] = time.monotonic() + self.lease_ttl
+            return True
+
+    def release(self, ticket_id):
+        with self._cond:
+            self._leases.pop(ticket_id, None)
+            self._queued.pop(ticket_id, None)
+            self._schedule(time.monotonic())
+
+    def status(self):
+        with self._cond:
+            now = time.monotonic()
+            self._schedule(now)
+            return {
+                "max_concurrent": self.max_concurrent,
+                "in_use": len(self._leases),
+                "queued": len(self._queued),
+                "queued_pages": sum(t["cost"] for t in self._queued.values()),
+                "oldest_wait_seconds": max((now - t["enqueued_at"] for t in self._queued.values()), default=0.0),
+            }
+
+    def _priority(self, ticket, now):
+        return ticket["cost"] - self.aging_pages_per_second * (now - ticket["enqueued_at"])
+
+    def _position(self, ticket_id, now):
+        ticket = self._queued[ticket_id]
+        priority = self._priority(ticket, now)
+        return sum(1 for t in self._queued.values() if self._priority(t, now) < priority)
+
+    def _schedule(self, now):
+        """Drop expired tickets and grant free budget, caller holds the lock"""
+        for tickets in (self._leases, self._queued):
+            for ticket_id in [i for i, t in tickets.items() if t["expires_at"] < now]:
+                del tickets[ticket_id]
+
+        granted = False
+        while self._queued and len(self._leases) < self.max_concurrent:
+            ticket_id = min(self._queued, key=lambda i: self._priority(self._queued[i], now))
+            ticket = self._queued.pop(ticket_id)
+            ticket["expires_at"] = now + self.lease_ttl
+            self._leases[ticket_id] = ticket
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+
+def make_handler(controller):
+    class AdmissionHandler(BaseHTTPRequestHandler):
+        def _reply(self, status, body=None):
+            payload = json.dumps(body).encode("utf-8") if body is not None else b""
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _body(self):
+            length = int(self.headers.get("Content-Length", 0))
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_GET(self):
+            if self.path == "/status":
+                self._reply(200, controller.status())
+            else:
+                self._reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            parts = self.path.strip("/").split("/")
+            try:
+                body = self._body()
+            except json.JSONDecodeError:
+                self._reply(400, {"error": "invalid JSON"})
+                return
+
+            if parts == ["tickets"]:
+                ticket_id, cost = controller.enqueue(
+                    pages=int(body.get("pages", 0)),
+                    size_bytes=int(body.get("size_bytes", 0)),
+                    name=body.get("name", ""),
+                )
+                self._reply(201, {"ticket_id": ticket_id, "cost": cost, "lease_ttl": controller.lease_ttl})
+            elif len(parts) == 3 and parts[0] == "tickets" and parts[2] == "wait":
+                result = controller.wait(parts[1], float(body.get("timeout", 30)))
+                if result is None:
+                    self._reply(404, {"error": "unknown or expired ticket"})
+                else:
+                    self._reply(200, {"granted": result[0], "position": result[1]})
+            elif len(parts) == 3 and parts[0] == "tickets" and parts[2] == "renew":
+                if controller.renew(parts[1]):
+                    self._reply(200, {"renewed": True})
+                else:
+                    self._reply(404, {"error": "unknown or expired ticket"})
+            else:
+                self._reply(404, {"error": "not found"})
+
+        def do_DELETE(self):
+            parts = self.path.strip("/").split("/")
+            if len(parts) == 2 and parts[0] == "tickets":
+                controller.release(parts[1])
+                self._reply(204)
+            else:
+                self._reply(404, {"error": "not found"})
+
+        def log_message(self, format, *args):
+            pass
+
+    return AdmissionHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Admission control service for docling-serve")
+    parser.add_argument(
+        "--listen",
+        default="0.0.0.0:8080",
+        help="Listen address (default: 0.0.0.0:8080)"
+    )
+    parser.add_argument(
+        "--max-concurrent",
+        type=int,
+        default=4,
+        help="Conversions admitted at once, match the docling-serve worker count (default: 4)"
+    )
+    parser.add_argument(
+        "--lease-ttl",
+        type=float,
+        default=60.0,
+        help="Seconds a ticket survives without being renewed (default: 60)"
+    )
+    parser.add_argument(
+        "--aging",
+        type=float,
+        default=1.0,
+        help="Pages of priority a queued document gains per second of waiting (default: 1)"
+    )
+
+    args = parser.parse_args()
+
+    controller = AdmissionController(
+        args.max_concurrent,
+        lease_ttl=args.lease_ttl,
+        aging_pages_per_second=args.aging,
+    )
+    host, port = args.listen.rsplit(":", 1)
+    server = ThreadingHTTPServer((host, int(port)), make_handler(controller))
+    print(f"Admitting {args.max_concurrent} concurrent conversions, listening on {args.listen}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,685 @@
+#!/usr/bin/env python3
+"""
+Local end-to-end benchmark of the ingestion stages
+
+Runs the bodies of ingestion_stage, conversion_stage and storage_stage
+in-process, one document after the other, against local stand-ins instead
+of a cluster:
+
+    S3             moto in server mode (or an existing MinIO with --s3-url)
+    docling-serve  a fake that returns canned DoclingDocuments after a
+                   latency of --docling-latency plus --docling-page-latency
+                   per page, with --presigned it fetches the documents from
+                   S3 itself
+    Milvus         milvus-lite (or an existing Milvus with --milvus-host)
+
+The corpus is synthetic: --documents documents drawn from the --mix of
+document kinds, each with its own page count, paragraphs and tables. The
+benchmark reports the latency and peak RSS of every stage and the
+end-to-end docs/s, and can save the results as JSON or compare them with a
+saved baseline.
+
+Documents the ingestion stage routes to local conversion are converted
+in-process as well, which needs docling installed. The synthetic documents
+are random bytes and always take the docling serve route.
+
+The storage stage still computes placeholder vectors in-process, there is
+no embedding service to stand in for. With --storage-worker the documents
+are stored by storage_worker.py, started in-process, through the thin
+storage_worker_stage instead. The chunker loads its tokenizer from
+--embed-model-id, a Hugging Face model id or a local directory.
+
+    pip install "moto[server]" milvus-lite
+    python ingestion_benchmark.py --documents 50 --save bench.json
+    python ingestion_benchmark.py --documents 50 --baseline bench.json --max-regression 0.5
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import warnings
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+from urllib.request import urlopen
+
+import kubeflow_pipeline
+from run_pipeline import percentile
+
+# Where the docling-client-config ConfigMap is mounted, the stages read it from there
+DOCLING_CONFIG_PATH = "/tmp/docling-config/docling-config.json"
+DOCLING_CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "docling-config.json")
+
+STAGES = ["ingestion", "conversion", "storage"]
+
+# Document kinds of the corpus: page range, paragraphs and table rows per
+# page, and a multiplier of the docling page latency (scans need OCR)
+KINDS = {
+    "memo": {"extension": "docx", "pages": (1, 3), "paragraphs": 6, "table_rows": 0, "latency_factor": 1.0},
+    "report": {"extension": "pdf", "pages": (10, 40), "paragraphs": 8, "table_rows": 10, "latency_factor": 1.0},
+    "spreadsheet": {"extension": "xlsx", "pages": (1, 5), "paragraphs": 1, "table_rows": 200, "latency_factor": 0.5},
+    "scan": {"extension": "pdf", "pages": (5, 20), "paragraphs": 4, "table_rows": 0, "latency_factor": 4.0},
+}
+
+MIME_TYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+WORDS = (
+    "pipeline document conversion storage vector chunk table revenue quarter policy "
+    "customer contract section figure summary analysis cluster latency throughput "
+    "report model index query schema budget forecast region product service"
+).split()
+
+
+class LocalArtifact:
+    """The path and metadata of a KFP artifact, for calling stage bodies directly"""
+
+    def __init__(self, path):
+        self.path = path
+        self.metadata = {}
+
+
+class RssSampler:
+    """Track the peak RSS of this process since the last reset"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+        self.page_size = os.sysconf("SC_PAGE_SIZE")
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def rss(self):
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * self.page_size
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.peak = max(self.peak, self.rss())
+
+    def reset(self):
+        self.peak = self.rss()
+
+    def start(self):
+        self.reset()
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+
+def parse_mix(value):
+    """Parse kind=weight pairs, e.g. memo=5,report=3"""
+    mix = {}
+    for item in value.split(","):
+        kind, _, weight = item.partition("=")
+        if kind not in KINDS:
+            raise argparse.ArgumentTypeError(f"Unknown document kind {kind}, expected one of {', '.join(KINDS)}")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def build_docling_document(rng, name, kind, pages, md5_hash):
+    """A DoclingDocument as docling serve would return it for this document"""
+    from docling_core.types.doc.base import BoundingBox, Size
+    from docling_core.types.doc.document import (
+        DoclingDocument,
+        DocumentOrigin,
+        ProvenanceItem,
+        TableCell,
+        TableData,
+    )
+    from docling_core.types.doc.labels import DocItemLabel
+
+    spec = KINDS[kind]
+    doc = DoclingDocument(name=os.path.splitext(name)[0])
+    doc.origin = DocumentOrigin(
+        filename=name,
+        mimetype=MIME_TYPES[spec["extension"]],
+        binary_hash=int(md5_hash[:16], 16),
+    )
+    for page_no in range(1, pages + 1):
+        doc.add_page(page_no=page_no, size=Size(width=612, height=792))
+        prov = ProvenanceItem(page_no=page_no, bbox=BoundingBox(l=50, t=50, r=560, b=740), charspan=(0, 0))
+        doc.add_heading(sentence(rng, 4), level=1 + page_no % 2, prov=prov)
+        for _ in range(spec["paragraphs"]):
+            doc.add_text(label=DocItemLabel.TEXT, text=sentence(rng, rng.randint(30, 90)), prov=prov)
+        if spec["table_rows"]:
+            columns = 6
+            cells = [
+                TableCell(
+                    text=str(rng.randint(0, 10**6)) if row else rng.choice(WORDS),
+                    start_row_offset_idx=row,
+                    end_row_offset_idx=row + 1,
+                    start_col_offset_idx=column,
+                    end_col_offset_idx=column + 1,
+                    column_header=row == 0,
+                )
+                for row in range(spec["table_rows"])
+                for column in range(columns)
+            ]
+            doc.add_table(data=TableData(num_rows=spec["table_rows"], num_cols=columns, table_cells=cells), prov=prov)
+    return doc
+
+
+def generate_corpus(args):
+    """Synthetic documents, their canned conversions and docling latencies"""
+    rng = random.Random(args.seed)
+    kinds = list(args.mix)
+    weights = [args.mix[kind] for kind in kinds]
+    corpus = []
+    for index in range(args.documents + args.warmup):
+        kind = rng.choices(kinds, weights)[0]
+        spec = KINDS[kind]
+        pages = max(1, round(rng.randint(*spec["pages"]) * args.scale))
+        name = f"{kind}-{index:05d}.{spec['extension']}"
+        # Random content so every document hashes differently, PDFs carry page
+        # markers for the page count of the docling admission request
+        content = rng.randbytes(pages * args.page_kb * 1024)
+        if spec["extension"] == "pdf":
+            content = b"%PDF-1.7\n" + b"<< /Type /Page >>\n" * pages + content
+        md5_hash = hashlib.md5(content).hexdigest()
+        document = build_docling_document(rng, name, kind, pages, md5_hash)
+        latency = args.docling_latency + args.docling_page_latency * pages * spec["latency_factor"]
+        response = (
+            b'{"status": "success", "processing_time": ' + json.dumps(latency).encode()
+            + b', "document": {"json_content": ' + document.model_dump_json().encode() + b"}}"
+        )
+        corpus.append({"name": name, "kind": kind, "pages": pages, "content": content,
+                       "latency": latency, "response": response})
+    return corpus
+
+
+def start_fake_docling(corpus, request_latency):
+    """Serve canned conversions by file name, after each document's latency
+
+    Uploaded files and presigned URL sources are both accepted. Several files
+    in one request are answered with a zip archive of their JSON outputs,
+    after request_latency once plus the page latency of every document.
+    """
+    documents = {document["name"]: document for document in corpus}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            if self.path.endswith("/source"):
+                # Fetch the presigned URL like docling serve does
+                url = json.loads(body)["sources"][0]["url"]
+                document = documents.get(unquote(urlparse(url).path.rsplit("/", 1)[-1]))
+                with urlopen(url) as response:
+                    content = response.read()
+                if document is not None and content != document["content"]:
+                    document = None
+            else:
+                names = re.findall(rb'filename="([^"]+)"', body)
+                if len(names) > 1:
+                    self.send_archive([documents.get(name.decode()) for name in names])
+                    return
+                document = documents.get(names[0].decode()) if names else None
+            if document is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+            time.sleep(document["latency"])
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(document["response"])))
+            self.end_headers()
+            self.wfile.write(document["response"])
+
+        def send_archive(self, batch):
+            time.sleep(request_latency + sum(document["latency"] - request_latency for document in batch if document))
+            archive = io.BytesIO()
+            with zipfile.ZipFile(archive, "w") as f:
+                for document in batch:
+                    # Unknown files are left out, like documents docling fails to convert
+                    if document is not None:
+                        output = json.loads(document["response"])["document"]["json_content"]
+                        f.writestr(f"{os.path.splitext(document['name'])[0]}.json", json.dumps(output))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/zip")
+            self.send_header("Content-Length", str(len(archive.getvalue())))
+            self.end_headers()
+            self.wfile.write(archive.getvalue())
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/v1/convert/file"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_s3(args):
+    """Start moto unless an S3 endpoint was given, returns (endpoint, stop)"""
+    if args.s3_url:
+        return args.s3_url, lambda: None
+    from moto.server import ThreadedMotoServer
+
+    port = free_port()
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+    server.start()
+    return f"http://127.0.0.1:{port}", server.stop
+
+
+def start_milvus(args, workdir):
+    """Start milvus-lite unless a Milvus host was given, returns (host, port)"""
+    if args.milvus_host:
+        return args.milvus_host, str(args.milvus_port)
+    from milvus_lite.server_manager import server_manager_instance
+
+    uri = urlparse(server_manager_instance.start_and_get_uri(os.path.join(workdir, "milvus.db")) or "")
+    if uri.scheme not in ("http", "https") or not uri.port:
+        print(f"✗ milvus-lite did not start a TCP server ({uri.geturl()}), "
+              "install milvus-lite 3 or pass --milvus-host", file=sys.stderr)
+        sys.exit(1)
+    return uri.hostname, str(uri.port)
+
+
+def run_stage(function, verbose, **kwargs):
+    """Call a stage body, returns (output, seconds), output is None if it failed"""
+    started = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(sys.stdout if verbose else open(os.devnull, "w")):
+            output = function(**kwargs)
+        return output if output is not None else {}, time.perf_counter() - started
+    except SystemExit:
+        return None, time.perf_counter() - started
+
+
+def ingest(document, bucket, args, sampler, workdir):
+    """Run the three stages on one document, returns {stage: (seconds, peak_rss)} and whether it succeeded"""
+    artifacts = tempfile.mkdtemp(dir=workdir)
+
+    def artifact(name):
+        return LocalArtifact(os.path.join(artifacts, name))
+
+    timings = {}
+    sampler.reset()
+    outputs, seconds = run_stage(
+        kubeflow_pipeline.ingestion_stage.python_func, args.verbose,
+        ingestion_document_s3_location=f"s3://{bucket}/{document['name']}",
+        document_metadata={},
+        profile_stacks=artifact("ingestion-stacks"),
+        profile_summary=artifact("ingestion-summary"),
+    )
+    timings["ingestion"] = (seconds, sampler.peak)
+    if outputs is None:
+        return timings, False
+
+    docling_document = artifact("docling-document.json")
+    sampler.reset()
+    metadata, seconds = run_stage(
+        kubeflow_pipeline.conversion_stage.python_func, args.verbose,
+        input_document_metadata=outputs.document_metadata,
+        docling_document=docling_document,
+        profile_stacks=artifact("conversion-stacks"),
+        profile_summary=artifact("conversion-summary"),
+        conversion_route=outputs.conversion_route,
+    )
+    timings["conversion"] = (seconds, sampler.peak)
+    if metadata is None:
+        return timings, False
+
+    sampler.reset()
+    storage = kubeflow_pipeline.storage_worker_stage if args.storage_worker else kubeflow_pipeline.storage_stage
+    result, seconds = run_stage(
+        storage.python_func, args.verbose,
+        input_document_metadata=metadata,
+        docling_document=docling_document,
+        embed_model_id=args.embed_model_id,
+        chunk_max_tokens=args.chunk_max_tokens,
+        profile_stacks=artifact("storage-stacks"),
+        profile_summary=artifact("storage-summary"),
+    )
+    timings["storage"] = (seconds, sampler.peak)
+    shutil.rmtree(artifacts)
+    return timings, result is not None
+
+
+def summarize(args, corpus, timings, failed, wall_seconds, peak_rss, batch_seconds=None):
+    succeeded = len(corpus) - len(failed)
+    results = {
+        "config": {
+            "documents": args.documents,
+            "mix": args.mix,
+            "scale": args.scale,
+            "page_kb": args.page_kb,
+            "docling_latency": args.docling_latency,
+            "docling_page_latency": args.docling_page_latency,
+            "embed_model_id": args.embed_model_id,
+            "chunk_max_tokens": args.chunk_max_tokens,
+            "seed": args.seed,
+            "presigned": args.presigned,
+            "batch_conversion": args.batch_conversion,
+            "storage_worker": args.storage_worker,
+        },
+        "environment": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+        "documents": len(corpus),
+        "failed": len(failed),
+        "pages": sum(document["pages"] for document in corpus),
+        "bytes": sum(len(document["content"]) for document in corpus),
+        "wall_seconds": round(wall_seconds, 3),
+        "docs_per_second": round(succeeded / wall_seconds, 4) if wall_seconds else 0.0,
+        "pages_per_second": round(
+            sum(document["pages"] for document in corpus if document["name"] not in failed) / wall_seconds, 4
+        ) if wall_seconds else 0.0,
+        "peak_rss_mib": round(peak_rss / 2**20, 1),
+        "batch_conversion_seconds": round(batch_seconds, 3) if batch_seconds is not None else None,
+        "stages": {},
+    }
+    for stage in STAGES:
+        seconds = [timing[stage][0] for timing in timings if stage in timing]
+        if not seconds:
+            continue
+        results["stages"][stage] = {
+            "documents": len(seconds),
+            "mean_s": round(sum(seconds) / len(seconds), 4),
+            "p50_s": round(percentile(seconds, 50), 4),
+            "p95_s": round(percentile(seconds, 95), 4),
+            "max_s": round(max(seconds), 4),
+            "peak_rss_mib": round(max(timing[stage][1] for timing in timings if stage in timing) / 2**20, 1),
+        }
+    return results
+
+
+def print_results(results):
+    print(f"\n{'stage':<12} {'docs':>6} {'mean s':>8} {'p50 s':>8} {'p95 s':>8} {'max s':>8} {'peak RSS MiB':>13}")
+    for stage, stats in results["stages"].items():
+        print(f"{stage:<12} {stats['documents']:>6} {stats['mean_s']:>8.3f} {stats['p50_s']:>8.3f} "
+              f"{stats['p95_s']:>8.3f} {stats['max_s']:>8.3f} {stats['peak_rss_mib']:>13.1f}")
+    print("=" * 80)
+    print(f"Documents: {results['documents']}  failed: {results['failed']}  pages: {results['pages']}")
+    print(f"Throughput: {results['docs_per_second']:.3f} docs/s  {results['pages_per_second']:.2f} pages/s  "
+          f"in {results['wall_seconds']:.1f}s")
+    print(f"Peak RSS: {results['peak_rss_mib']:.1f} MiB")
+    if results.get("batch_conversion_seconds") is not None:
+        print(f"Batch conversion: {results['batch_conversion_seconds']:.1f}s, included in the throughput")
+
+
+def compare(results, baseline_path, max_regression):
+    """Stage means and throughput against a saved baseline, returns the regressions"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    if baseline["config"] != results["config"]:
+        print(f"Note: {baseline_path} was run with a different configuration, {baseline['config']}")
+    regressions = []
+    for stage, stats in results["stages"].items():
+        if stage in baseline["stages"] and baseline["stages"][stage]["mean_s"]:
+            ratio = stats["mean_s"] / baseline["stages"][stage]["mean_s"]
+            if ratio > 1 + max_regression:
+                regressions.append(f"{stage} stage mean {ratio:.2f}x the baseline")
+    if results["docs_per_second"] and baseline["docs_per_second"]:
+        ratio = baseline["docs_per_second"] / results["docs_per_second"]
+        if ratio > 1 + max_regression:
+            regressions.append(f"throughput {1 / ratio:.2f}x the baseline")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ingestion stages locally against stand-in services")
+    parser.add_argument(
+        "--documents",
+        type=int,
+        default=20,
+        help="Documents in the corpus (default: 20)"
+    )
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=parse_mix("memo=5,report=3,spreadsheet=1,scan=1"),
+        help=f"Weighted document kinds of {', '.join(KINDS)} (default: memo=5,report=3,spreadsheet=1,scan=1)"
+    )
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=1.0,
+        help="Multiplier of the page counts of every kind (default: 1)"
+    )
+    parser.add_argument(
+        "--page-kb",
+        type=int,
+        default=50,
+        help="Size of the source document per page in KB (default: 50)"
+    )
+    parser.add_argument(
+        "--docling-latency",
+        type=float,
+        default=0.05,
+        help="Seconds the fake docling serve takes per request (default: 0.05)"
+    )
+    parser.add_argument(
+        "--docling-page-latency",
+        type=float,
+        default=0.02,
+        help="Additional seconds per page, scaled by the document kind (default: 0.02)"
+    )
+    parser.add_argument(
+        "--embed-model-id",
+        default="sentence-transformers/all-MiniLM-L6-v2",
+        help="Tokenizer of the chunker, model id or local path (default: sentence-transformers/all-MiniLM-L6-v2)"
+    )
+    parser.add_argument(
+        "--chunk-max-tokens",
+        type=int,
+        default=0,
+        help="Chunk size in tokens, 0 uses the tokenizer maximum (default: 0)"
+    )
+    parser.add_argument(
+        "--presigned",
+        action="store_true",
+        help="Let the docling stand-in fetch every document through a presigned URL instead of uploading it"
+    )
+    parser.add_argument(
+        "--batch-conversion",
+        action="store_true",
+        help="Run the batch conversion stage on the corpus before the documents' own stages"
+    )
+    parser.add_argument(
+        "--storage-worker",
+        action="store_true",
+        help="Store the documents with an in-process storage_worker.py instead of in the storage stage"
+    )
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        default=1,
+        help="Documents ingested first and left out of the results, e.g. for the tokenizer download (default: 1)"
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Seed of the synthetic corpus (default: 0)"
+    )
+    parser.add_argument(
+        "--s3-url",
+        help="Use this S3 endpoint (e.g. MinIO) instead of starting moto, credentials from aws_access_key_id/aws_secret_access_key"
+    )
+    parser.add_argument(
+        "--milvus-host",
+        help="Use this Milvus instead of starting milvus-lite"
+    )
+    parser.add_argument(
+        "--milvus-port",
+        type=int,
+        default=19530,
+        help="Port of --milvus-host (default: 19530)"
+    )
+    parser.add_argument(
+        "--save",
+        help="Write the results as JSON to this file"
+    )
+    parser.add_argument(
+        "--baseline",
+        help="Fail when a stage or the throughput regressed against these saved results"
+    )
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.5,
+        help="Allowed slowdown against the baseline (default: 0.5, i.e. 50%%)"
+    )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Show the output of the stages"
+    )
+
+    args = parser.parse_args()
+
+    if not args.verbose:
+        # Client libraries warn about their own deprecations on every call
+        warnings.simplefilter("ignore", DeprecationWarning)
+        warnings.simplefilter("ignore", FutureWarning)
+
+    if not os.path.exists(DOCLING_CONFIG_PATH):
+        os.makedirs(os.path.dirname(DOCLING_CONFIG_PATH), exist_ok=True)
+        shutil.copyfile(DOCLING_CONFIG_FILE, DOCLING_CONFIG_PATH)
+    print(f"Conversion options from {DOCLING_CONFIG_PATH}")
+
+    print(f"Generating {args.documents} documents ({args.warmup} warm up)...")
+    corpus = generate_corpus(args)
+
+    workdir = tempfile.mkdtemp(prefix="ingestion-benchmark-")
+    stop_s3 = lambda: None
+    docling_server = None
+    worker_server = None
+    sampler = RssSampler()
+    try:
+        s3_url, stop_s3 = start_s3(args)
+        docling_server, docling_url = start_fake_docling(corpus, args.docling_latency)
+        milvus_host, milvus_port = start_milvus(args, workdir)
+
+        # A fresh bucket, and with it a fresh Milvus collection, per benchmark
+        bucket = f"ingestion-benchmark-{uuid.uuid4().hex[:8]}"
+        os.environ.update({
+            "s3_url": s3_url,
+            "aws_access_key_id": os.environ.get("aws_access_key_id", "benchmark"),
+            "aws_secret_access_key": os.environ.get("aws_secret_access_key", "benchmark"),
+            "aws_region": os.environ.get("aws_region", "us-east-1"),
+            "INGESTION_MANIFEST_BUCKET": f"{bucket}-manifest",
+            "DOCLING_API_URL": docling_url,
+            "DOCLING_PRESIGNED_MIN_BYTES": "0" if args.presigned else "",
+            "MILVUS_HOST": milvus_host,
+            "MILVUS_PORT": milvus_port,
+            # Set empty so a local .env cannot enable them
+            "DOCLING_ADMISSION_URL": "",
+            "OTEL_EXPORTER_OTLP_ENDPOINT": "",
+        })
+
+        import boto3
+
+        s3_client = boto3.client(
+            "s3",
+            endpoint_url=s3_url,
+            aws_access_key_id=os.environ["aws_access_key_id"],
+            aws_secret_access_key=os.environ["aws_secret_access_key"],
+            region_name=os.environ["aws_region"],
+        )
+        s3_client.create_bucket(Bucket=bucket)
+        s3_client.create_bucket(Bucket=os.environ["INGESTION_MANIFEST_BUCKET"])
+        for document in corpus:
+            s3_client.put_object(Bucket=bucket, Key=document["name"], Body=document["content"])
+        print(f"✓ Uploaded the corpus to s3://{bucket} at {s3_url}, Milvus at {milvus_host}:{milvus_port}")
+
+        if args.storage_worker:
+            import storage_worker
+
+            worker = storage_worker.StorageWorker(milvus_host, milvus_port, os.environ["INGESTION_MANIFEST_BUCKET"])
+            worker.start()
+            worker_server = ThreadingHTTPServer(("127.0.0.1", 0), storage_worker.make_handler(worker))
+            threading.Thread(target=worker_server.serve_forever, daemon=True).start()
+            os.environ["STORAGE_WORKER_URL"] = f"http://127.0.0.1:{worker_server.server_address[1]}"
+            print(f"✓ Storage worker at {os.environ['STORAGE_WORKER_URL']}")
+
+        sampler.start()
+        for document in corpus[:args.warmup]:
+            _, succeeded = ingest(document, bucket, args, sampler, workdir)
+            print(f"{'✓' if succeeded else '✗'} warm up {document['name']}")
+
+        corpus = corpus[args.warmup:]
+        timings = []
+        failed = []
+        started = time.perf_counter()
+        batch_seconds = None
+        if args.batch_conversion:
+            converted, batch_seconds = run_stage(
+                kubeflow_pipeline.batch_conversion_stage.python_func, args.verbose,
+                ingestion_document_s3_locations=[f"s3://{bucket}/{document['name']}" for document in corpus],
+                profile_stacks=LocalArtifact(os.path.join(workdir, "batch-stacks")),
+                profile_summary=LocalArtifact(os.path.join(workdir, "batch-summary")),
+            )
+            print(f"{'✓' if converted is not None else '✗'} batch conversion of {converted or 0} documents "
+                  f"{batch_seconds:.3f}s")
+        for index, document in enumerate(corpus, 1):
+            timing, succeeded = ingest(document, bucket, args, sampler, workdir)
+            timings.append(timing)
+            if not succeeded:
+                failed.append(document["name"])
+            line = "  ".join(f"{stage} {seconds:.3f}s" for stage, (seconds, _) in timing.items())
+            print(f"{'✓' if succeeded else '✗'} {document['name']} {document['pages']} pages  {line} "
+                  f"({index}/{len(corpus)})")
+        wall_seconds = time.perf_counter() - started
+    finally:
+        sampler.stop()
+        if docling_server:
+            docling_server.shutdown()
+        if worker_server:
+            worker_server.shutdown()
+        stop_s3()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    import resource
+
+    # ru_maxrss is in KiB on Linux
+    peak_rss = max(sampler.peak, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+    results = summarize(args, corpus, timings, failed, wall_seconds, peak_rss, batch_seconds)
+    print_results(results)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"✓ Results saved to {args.save}")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.max_regression)
+        for regression in regressions:
+            print(f"✗ {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"✓ Nothing more than {args.max_regression:.0%} slower than {args.baseline}")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
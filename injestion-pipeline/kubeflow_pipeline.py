@@ -3,32 +3,281 @@ Document Ingestion Kubeflow Pipeline
 Ingestion Stage: Read document from S3, parse metadata, generate MD5 hash
 Conversion Stage: Convert document to DoclingDocument using docling serve API
 Storage Stage: Chunk DoclingDocument and store chunks in Milvus database
+
+Conversion and storage are cached by KFP. Conversion is keyed on the document
+metadata, which carries file_md5_hash and conversion_options_hash, and storage
+on the resulting DoclingDocument artifact plus the chunker/embedding config.
+Nothing is passed through a run-scoped PVC, so re-running the pipeline on
+unchanged content reuses the previous outputs.
 """
-from typing import Dict
+from typing import Dict, List, NamedTuple
 from kfp import dsl
 from kfp import compiler
 from kfp import kubernetes
+from kfp.dsl import Artifact, Input, Markdown, Output
+
+# Number of documents of a batched run that are processed concurrently
+BATCH_PARALLELISM = 8
+
+# Image of docling serve, local conversions use the same docling version.
+# Pinned to a release, keep it in step with docling/docling-resources.yaml
+DOCLING_IMAGE = "ghcr.io/docling-project/docling-serve-cpu:v1.37.0"
 
-@dsl.component(base_image="registry.redhat.io/ubi10/python-312-minimal", packages_to_install=["boto3","dotenv"])
+@dsl.component(
+    base_image="registry.redhat.io/ubi10/python-312-minimal",
+    packages_to_install=["boto3", "dotenv", "opentelemetry-sdk", "opentelemetry-exporter-otlp-proto-http"],
+)
 def ingestion_stage(
     ingestion_document_s3_location: str,
     document_metadata: Dict[str, str],
-) -> Dict[str, str]:  
-       
-    """Ingestion Stage: Read document from S3 and process metadata"""
+    profile_stacks: Output[Artifact],
+    profile_summary: Output[Markdown],
+    profile_stage: bool = False,
+) -> NamedTuple("IngestionOutputs", [("document_metadata", Dict[str, str]), ("conversion_route", str)]):
+    """Ingestion Stage: Read document from S3 and process metadata
+
+    conversion_route is "local" for formats converted without docling serve,
+    "docling-serve" otherwise.
+    """
+    import re
     import sys
     import boto3
     import os
+    import json
+    import time
     import hashlib
+    from collections import namedtuple
     from urllib.parse import urlparse
     from dotenv import load_dotenv
     from pathlib import Path
+    from opentelemetry import context as otel_context, metrics, propagate, trace
 
     CONFIG_SECRETS_LOCATION = "/tmp/ingestion-config/"
-    TASK_STORAGE="/storage/"
+    DOCLING_CONFIG_LOCATION = "/tmp/docling-config/docling-config.json"
     S3_BUCKET_NAME="s3_bucket_name"
+    S3_OBJECT_KEY="s3_object_key"
     DOCUMENT_NAME="document_name"
     FILE_MD5_HASH="file_md5_hash"
+    S3_ETAG="s3_etag"
+    CONVERSION_OPTIONS_HASH="conversion_options_hash"
+    READ_CHUNK_SIZE=8 * 1024 * 1024
+    PROGRESS_STATES=["ingested", "converted", "stored"]
+    # User metadata an uploader may set to the hex MD5 of the content
+    CONTENT_MD5_METADATA_KEYS=["md5", "content-md5"]
+    # Flexible checksums S3 returns with ChecksumMode ENABLED, full object or composite.
+    # CRC32 and CRC32C are left out, 32 bits collide too easily to identify content
+    S3_CHECKSUMS=["ChecksumCRC64NVME", "ChecksumSHA1", "ChecksumSHA256"]
+    # Formats docling converts without layout or OCR models, and the start of
+    # their content: DOCX is a zip archive, the others are text
+    LOCAL_CONVERSION_FORMATS={
+        "docx": b"PK\x03\x04", "md": None, "markdown": None, "html": None, "htm": None, "xhtml": None,
+        "csv": None, "adoc": None, "asciidoc": None,
+    }
+    TELEMETRY_SCOPE="rag_ingestion"
+    TRACE_CONTEXT_KEYS=["traceparent", "tracestate"]
+    PROFILE_INTERVAL=0.01
+    PROFILE_TOP_FRAMES=25
+
+    def start_stage_span(stage, carrier):
+        """Start the stage span, exporting to OTEL_EXPORTER_OTLP_ENDPOINT when it is set
+
+        The span continues the trace whose W3C context the carrier holds,
+        without an endpoint the tracer and meter are no-ops.
+        """
+        if os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT"):
+            from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            from opentelemetry.sdk.metrics import MeterProvider
+            from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+            import uuid
+
+            # Every pod reports its own cumulative counters, the instance keeps their series apart
+            resource = Resource.create({
+                "service.name": os.environ.get("OTEL_SERVICE_NAME", "rag-ingestion"),
+                "service.instance.id": os.environ.get("HOSTNAME") or str(uuid.uuid4()),
+            })
+            tracer_provider = TracerProvider(resource=resource)
+            tracer_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+            trace.set_tracer_provider(tracer_provider)
+            metrics.set_meter_provider(MeterProvider(
+                resource=resource,
+                metric_readers=[PeriodicExportingMetricReader(OTLPMetricExporter())],
+            ))
+        span = trace.get_tracer(TELEMETRY_SCOPE).start_span(stage, context=propagate.extract(carrier or {}))
+        otel_context.attach(trace.set_span_in_context(span))
+        return trace.get_tracer(TELEMETRY_SCOPE), metrics.get_meter(TELEMETRY_SCOPE), span
+
+    def end_stage_span(stage, span, meter, started, outcome="success", error=None):
+        """Record the stage outcome and flush telemetry before the pod exits"""
+        if error is not None:
+            outcome = "failed"
+            span.record_exception(error)
+            span.set_status(trace.Status(trace.StatusCode.ERROR, f"{type(error).__name__}: {error}"))
+        attributes = {"stage": stage, "outcome": outcome}
+        meter.create_counter(
+            "ingestion_documents", unit="{document}", description="Documents processed by an ingestion stage"
+        ).add(1, attributes)
+        meter.create_histogram(
+            "ingestion_stage_duration", unit="s", description="Duration of an ingestion stage"
+        ).record(time.monotonic() - started, attributes)
+        span.end()
+        for provider in (trace.get_tracer_provider(), metrics.get_meter_provider()):
+            if hasattr(provider, "shutdown"):
+                provider.shutdown()
+
+    def start_profiling(enabled):
+        """Sample the stage's stack and RSS every PROFILE_INTERVAL seconds when enabled"""
+        if not enabled:
+            return None
+        import threading
+
+        profile = {"stacks": {}, "peak_rss": 0, "peak_stack": "", "started": time.monotonic(), "stop": threading.Event()}
+        thread_id = threading.get_ident()
+        page_size = os.sysconf("SC_PAGE_SIZE")
+
+        def sample():
+            while not profile["stop"].wait(PROFILE_INTERVAL):
+                frame = sys._current_frames().get(thread_id)
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack = ";".join(reversed(frames))
+                profile["stacks"][stack] = profile["stacks"].get(stack, 0) + 1
+                with open("/proc/self/statm") as statm:
+                    rss = int(statm.read().split()[1]) * page_size
+                if rss > profile["peak_rss"]:
+                    profile["peak_rss"], profile["peak_stack"] = rss, stack
+
+        profile["sampler"] = threading.Thread(target=sample, daemon=True)
+        profile["sampler"].start()
+        return profile
+
+    def write_profile(stage, profile, profile_stacks, profile_summary):
+        """Write the sampled stacks in folded format for flamegraph tools, and a summary for the run UI"""
+        if profile is None:
+            open(profile_stacks.path, "w").close()
+            with open(profile_summary.path, "w") as f:
+                f.write(f"Profiling of {stage} is disabled, enable it with the profile_stages parameter\n")
+            return
+        import resource
+
+        profile["stop"].set()
+        profile["sampler"].join()
+        wall_seconds = time.monotonic() - profile["started"]
+        # ru_maxrss is in KiB on Linux and covers the whole pod process
+        peak_rss = max(profile["peak_rss"], resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+        stacks = profile["stacks"]
+        total = sum(stacks.values()) or 1
+
+        with open(profile_stacks.path, "w") as f:
+            for stack, count in sorted(stacks.items()):
+                f.write(f"{stack} {count}\n")
+        profile_stacks.metadata["format"] = "folded"
+        profile_stacks.metadata["samples"] = total
+        profile_stacks.metadata["wall_seconds"] = round(wall_seconds, 3)
+        profile_stacks.metadata["peak_rss_mib"] = round(peak_rss / 2**20, 1)
+
+        self_samples = {}
+        total_samples = {}
+        for stack, count in stacks.items():
+            frames = stack.split(";")
+            self_samples[frames[-1]] = self_samples.get(frames[-1], 0) + count
+            for frame in set(frames):
+                total_samples[frame] = total_samples.get(frame, 0) + count
+
+        lines = [
+            f"# {stage} profile",
+            "",
+            f"- Wall time: {wall_seconds:.2f} s, {total} samples every {PROFILE_INTERVAL * 1000:.0f} ms",
+            f"- Peak RSS: {peak_rss / 2**20:.1f} MiB",
+            "",
+            "Open the profile_stacks artifact in speedscope or flamegraph.pl for a flamegraph.",
+        ]
+        for title, samples in (("Self", self_samples), ("Total", total_samples)):
+            lines += ["", f"## Top frames by {title.lower()} samples", "", "| Samples | % | Frame |", "|---:|---:|---|"]
+            for frame, count in sorted(samples.items(), key=lambda item: -item[1])[:PROFILE_TOP_FRAMES]:
+                lines.append(f"| {count} | {100 * count / total:.1f} | `{frame}` |")
+        lines += ["", "## Stack at the highest sampled RSS", "", "```"]
+        lines += profile["peak_stack"].split(";")
+        lines.append("```")
+        with open(profile_summary.path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def conversion_route(document_name, head):
+        """Route lightweight formats to local conversion, checking the content matches the extension"""
+        if os.environ.get("DOCLING_LOCAL_CONVERSION", "true").lower() != "true":
+            return "docling-serve"
+        extension = document_name.rsplit(".", 1)[-1].lower() if "." in document_name else ""
+        if extension not in LOCAL_CONVERSION_FORMATS:
+            return "docling-serve"
+        magic = LOCAL_CONVERSION_FORMATS[extension]
+        if magic is not None:
+            return "local" if head.startswith(magic) else "docling-serve"
+        # Text formats are UTF-8 without NUL bytes, the head may cut a character at its end
+        if b"\x00" in head:
+            return "docling-serve"
+        try:
+            head.decode("utf-8")
+        except UnicodeDecodeError as e:
+            if e.start < len(head) - 3:
+                return "docling-serve"
+        return "local"
+
+    def content_identities(object_head):
+        """Identities of the object's content from its S3 metadata that are not its MD5
+
+        Multipart ETags are the MD5 of the part MD5s and the checksums use
+        other algorithms, the manifest maps them to the MD5 once it is known.
+        Only identities of at least 64 bits are used, see S3_CHECKSUMS.
+        """
+        etag = object_head["ETag"].strip('"')
+        identities = [] if re.fullmatch(r"[0-9a-f]{32}", etag) else [f"etag:{etag}"]
+        identities += [f"{name}:{object_head[name]}" for name in S3_CHECKSUMS if object_head.get(name)]
+        return identities
+
+    def identity_key(identity):
+        return f"identities/{hashlib.sha256(identity.encode('utf-8')).hexdigest()}.json"
+
+    def read_manifest(s3_client, manifest_bucket, key):
+        try:
+            return json.loads(s3_client.get_object(Bucket=manifest_bucket, Key=key)["Body"].read())
+        except s3_client.exceptions.NoSuchKey:
+            return None
+
+    def known_md5(s3_client, manifest_bucket, bucket_name, object_head):
+        """MD5 of the object from its S3 metadata when the ingestion manifest already has that content
+
+        A single part ETag is the MD5 unless the object is encrypted, and an
+        uploader may store the MD5 in the user metadata. Other identities are
+        looked up in the manifest. Every candidate only counts when the
+        manifest has a record of that MD5 with the same length, so a wrong
+        guess falls back to hashing. Returns (md5_hash, source, progress),
+        (None, None, None) when the metadata is inconclusive.
+        """
+        candidates = []
+        etag = object_head["ETag"].strip('"')
+        if re.fullmatch(r"[0-9a-f]{32}", etag):
+            candidates.append((etag, "etag"))
+        for key in CONTENT_MD5_METADATA_KEYS:
+            value = object_head.get("Metadata", {}).get(key, "").lower()
+            if re.fullmatch(r"[0-9a-f]{32}", value):
+                candidates.append((value, "metadata"))
+        for identity in content_identities(object_head):
+            record = read_manifest(s3_client, manifest_bucket, identity_key(identity))
+            if record is not None:
+                candidates.append((record[FILE_MD5_HASH], identity.split(":")[0]))
+
+        for md5_hash, source in candidates:
+            progress = read_manifest(s3_client, manifest_bucket, f"{bucket_name}/{md5_hash}.json")
+            if progress is not None and progress.get("content_length") == object_head["ContentLength"]:
+                return md5_hash, source, progress
+        return None, None, None
 
     dotenv_path = Path(CONFIG_SECRETS_LOCATION+'.env')
     load_dotenv(dotenv_path=dotenv_path)
@@ -37,6 +286,12 @@ def ingestion_stage(
     aws_access_key_id = os.environ.get("aws_access_key_id")
     aws_secret_access_key = os.environ.get("aws_secret_access_key")
     region = os.environ.get("aws_region", "us-east-1")
+    manifest_bucket = os.environ.get("INGESTION_MANIFEST_BUCKET", "ingestion-manifest")
+
+    stage_started = time.monotonic()
+    tracer, meter, stage_span = start_stage_span("ingestion_stage", document_metadata)
+    profile = start_profiling(profile_stage)
+    stage_span.set_attribute("s3.location", ingestion_document_s3_location)
 
     try:
         # Parse S3 location
@@ -70,8 +325,26 @@ def ingestion_stage(
             document_metadata = {}
 
         document_metadata[S3_BUCKET_NAME]= bucket_name
+        document_metadata[S3_OBJECT_KEY]= object_key
         document_metadata[DOCUMENT_NAME]=document_name
 
+        # The metadata is part of the cache key of the later stages, they read
+        # the trace context from the progress record instead
+        for key in TRACE_CONTEXT_KEYS:
+            document_metadata.pop(key, None)
+
+        # Hash the conversion options so that a docling-client-config change
+        # invalidates the cached conversion output
+        with open(DOCLING_CONFIG_LOCATION, "r") as f:
+            conversion_options = json.load(f)
+
+        conversion_options_hash = hashlib.sha256(
+            json.dumps(conversion_options, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        ).hexdigest()
+        print(f"Conversion options hash: {conversion_options_hash}")
+
+        document_metadata[CONVERSION_OPTIONS_HASH]= conversion_options_hash
+
         # Read file from S3
         print("Connecting to S3 and reading file...")
 
@@ -92,161 +365,1302 @@ def ingestion_stage(
             use_ssl=False
         )
 
-        response = s3_client.get_object(Bucket=bucket_name, Key=object_key)
-        file_content = response["Body"].read()
+        # Identify content the manifest already knows from the object metadata,
+        # before downloading anything
+        with tracer.start_as_current_span("s3.head_object", attributes={"s3.bucket": bucket_name, "s3.key": object_key}):
+            object_head = s3_client.head_object(Bucket=bucket_name, Key=object_key, ChecksumMode="ENABLED")
+        md5_hash, md5_source, known_progress = None, None, None
+        if os.environ.get("INGESTION_METADATA_DEDUP", "true").lower() == "true":
+            md5_hash, md5_source, known_progress = known_md5(s3_client, manifest_bucket, bucket_name, object_head)
+        meter.create_counter(
+            "ingestion_dedup_lookups", unit="{document}", description="Documents identified from their S3 metadata"
+        ).add(1, {"result": "hit" if md5_hash else "miss", "source": md5_source or "none"})
+
+        if md5_hash is not None:
+            content_length = object_head["ContentLength"]
+            etag = object_head["ETag"].strip('"')
+            print(f"Content already in the ingestion manifest, identified by its {md5_source}, skipping the download")
+            if (
+                known_progress.get("state") in ("converted", "stored")
+                and known_progress.get(CONVERSION_OPTIONS_HASH) == conversion_options_hash
+            ):
+                # Either conversion stage resumes from the checkpoint
+                route = "docling-serve"
+            else:
+                with tracer.start_as_current_span("s3.get_object", attributes={"s3.bucket": bucket_name, "s3.key": object_key}):
+                    head = s3_client.get_object(Bucket=bucket_name, Key=object_key, Range="bytes=0-4095")["Body"].read()
+                route = conversion_route(document_name, head)
+        else:
+            with tracer.start_as_current_span("s3.get_object", attributes={"s3.bucket": bucket_name, "s3.key": object_key}):
+                response = s3_client.get_object(Bucket=bucket_name, Key=object_key)
+
+            # Generate MD5 hash of file contents, streaming so large documents
+            # are never buffered in memory. The span includes reading the body.
+            with tracer.start_as_current_span("hash") as span:
+                md5 = hashlib.md5()
+                content_length = 0
+                head = b""
+                for chunk in response["Body"].iter_chunks(chunk_size=READ_CHUNK_SIZE):
+                    md5.update(chunk)
+                    content_length += len(chunk)
+                    if not head:
+                        head = chunk[:4096]
+                md5_hash = md5.hexdigest()
+                span.set_attribute("document.bytes", content_length)
+            meter.create_counter("ingestion_bytes", unit="By", description="Document bytes read from S3").add(
+                content_length, {"stage": "ingestion"}
+            )
+            etag = response["ETag"].strip('"')
+
+            print(f"Successfully read {content_length} bytes from S3")
+            print(f"Content type: {response.get('ContentType', 'unknown')}")
 
-        print(f"Successfully read {len(file_content)} bytes from S3")
-        print(f"Content type: {response.get('ContentType', 'unknown')}")
+            # Let the next HEAD of this content find its MD5, unless the object
+            # changed between the HEAD and the download
+            if etag == object_head["ETag"].strip('"'):
+                for identity in content_identities(object_head):
+                    s3_client.put_object(
+                        Bucket=manifest_bucket,
+                        Key=identity_key(identity),
+                        Body=json.dumps({FILE_MD5_HASH: md5_hash, "content_length": content_length}).encode("utf-8"),
+                        ContentType="application/json",
+                    )
 
-        # Generate MD5 hash of file contents
+            route = conversion_route(document_name, head)
 
-        md5_hash = hashlib.md5(file_content).hexdigest()
         print(f"MD5 hash: {md5_hash}")
 
         # Add MD5 hash to metadata
         document_metadata[FILE_MD5_HASH]= md5_hash
 
-        print(f"Final metadata: {document_metadata}")
-
-        destination_file = TASK_STORAGE+md5_hash+".raw"
-        # Write file to Kubeflow-managed output path for next stage
-        print(f"Writing file to output path: {destination_file}")
-
-        with open(TASK_STORAGE+md5_hash, "wb") as file:
-            file.write(file_content)
-
-        print(
-            f"File written successfully to {destination_file} ({len(file_content)} bytes)"
+        stage_span.set_attribute("conversion.route", route)
+        print(f"Conversion route: {route}")
+
+        # Record progress in the ingestion manifest, never moving a document back
+        progress_key = f"{bucket_name}/{md5_hash}.json"
+        try:
+            progress = json.loads(s3_client.get_object(Bucket=manifest_bucket, Key=progress_key)["Body"].read())
+        except s3_client.exceptions.NoSuchKey:
+            progress = {}
+        if progress.get("state") in PROGRESS_STATES:
+            print(f"Document already {progress['state']} ({progress.get('vector_count', 0)} vectors), later stages resume from there")
+        else:
+            progress["state"] = "ingested"
+        progress.update({
+            "s3_location": ingestion_document_s3_location,
+            "document_name": document_name,
+            FILE_MD5_HASH: md5_hash,
+            # The object hashed, so that docling serve can be pointed at the
+            # same content later. Kept out of the metadata, which is part of
+            # the KFP cache key, as the same bytes uploaded with another part
+            # size get another ETag.
+            S3_ETAG: etag,
+            "content_length": content_length,
+            "updated_at": time.time(),
+        })
+        # Later stages of this run continue its trace, nothing is kept with tracing off
+        trace_context = {}
+        propagate.inject(trace_context)
+        if trace_context:
+            progress["trace_context"] = trace_context
+        else:
+            progress.pop("trace_context", None)
+        s3_client.put_object(
+            Bucket=manifest_bucket,
+            Key=progress_key,
+            Body=json.dumps(progress).encode("utf-8"),
+            ContentType="application/json",
         )
+
+        print(f"Final metadata: {document_metadata}")
         print("Ingestion stage complete")
-        return document_metadata
+        write_profile("ingestion_stage", profile, profile_stacks, profile_summary)
+        end_stage_span("ingestion", stage_span, meter, stage_started)
+        IngestionOutputs = namedtuple("IngestionOutputs", ["document_metadata", "conversion_route"])
+        return IngestionOutputs(document_metadata, route)
 
     except ValueError as ve:
         print(f"ERROR: Invalid input - {ve}", file=sys.stderr)
+        write_profile("ingestion_stage", profile, profile_stacks, profile_summary)
+        end_stage_span("ingestion", stage_span, meter, stage_started, error=ve)
         sys.exit(1)
     except Exception as e:
         print(
             f"ERROR: Failed to read document from S3 - {type(e).__name__}: {e}",
             file=sys.stderr,
         )
+        write_profile("ingestion_stage", profile, profile_stacks, profile_summary)
+        end_stage_span("ingestion", stage_span, meter, stage_started, error=e)
         sys.exit(1)
 
 
 @dsl.component(
-    base_image="registry.redhat.io/ubi10/python-312-minimal", packages_to_install=["httpx", "docling-core","dotenv"]
+    base_image="registry.redhat.io/ubi10/python-312-minimal",
+    packages_to_install=[
+        "boto3", "httpx", "docling-core", "dotenv", "pypdfium2",
+        "opentelemetry-sdk", "opentelemetry-exporter-otlp-proto-http",
+    ],
 )
 def conversion_stage(
-    input_document_metadata: Dict[str, str]
+    input_document_metadata: Dict[str, str],
+    docling_document: Output[Artifact],
+    profile_stacks: Output[Artifact],
+    profile_summary: Output[Markdown],
+    profile_stage: bool = False,
+    conversion_route: str = "docling-serve",
 ) -> Dict[str, str]:
-    """Conversion Stage: Convert document to DoclingDocument using docling serve API"""
+    """Conversion Stage: Convert document to DoclingDocument using docling serve API
+
+    With conversion_route "local" the document is converted in-process
+    instead, which needs docling installed (local_conversion_stage).
+    """
     import os
+    import re
     import sys
+    import time
     import asyncio
+    import contextlib
+    import boto3
+    import hashlib
     import httpx
     import json
     from dotenv import load_dotenv
     from pathlib import Path
     from docling_core.types.doc.document import DoclingDocument
+    from opentelemetry import context as otel_context, metrics, propagate, trace
 
     CONFIG_SECRETS_LOCATION = "/tmp/ingestion-config/"
     DOCLING_CONFIG_LOCATION = "/tmp/docling-config/docling-config.json"
-    TASK_STORAGE="/storage/"
+    S3_BUCKET_NAME="s3_bucket_name"
+    S3_OBJECT_KEY="s3_object_key"
     DOCUMENT_NAME="document_name"
     FILE_MD5_HASH="file_md5_hash"
+    S3_ETAG="s3_etag"
+    CONVERSION_OPTIONS_HASH="conversion_options_hash"
+    ADMISSION_POLL_SECONDS=30
+    # Pages with fewer characters of embedded text are treated as scanned
+    OCR_MIN_PAGE_CHARS=32
+    TELEMETRY_SCOPE="rag_ingestion"
+    PROFILE_INTERVAL=0.01
+    PROFILE_TOP_FRAMES=25
+
+    def start_stage_span(stage, carrier):
+        """Start the stage span, exporting to OTEL_EXPORTER_OTLP_ENDPOINT when it is set
+
+        The span continues the trace whose W3C context the carrier holds,
+        without an endpoint the tracer and meter are no-ops.
+        """
+        if os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT"):
+            from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            from opentelemetry.sdk.metrics import MeterProvider
+            from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+            import uuid
+
+            # Every pod reports its own cumulative counters, the instance keeps their series apart
+            resource = Resource.create({
+                "service.name": os.environ.get("OTEL_SERVICE_NAME", "rag-ingestion"),
+                "service.instance.id": os.environ.get("HOSTNAME") or str(uuid.uuid4()),
+            })
+            tracer_provider = TracerProvider(resource=resource)
+            tracer_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+            trace.set_tracer_provider(tracer_provider)
+            metrics.set_meter_provider(MeterProvider(
+                resource=resource,
+                metric_readers=[PeriodicExportingMetricReader(OTLPMetricExporter())],
+            ))
+        span = trace.get_tracer(TELEMETRY_SCOPE).start_span(stage, context=propagate.extract(carrier or {}))
+        otel_context.attach(trace.set_span_in_context(span))
+        return trace.get_tracer(TELEMETRY_SCOPE), metrics.get_meter(TELEMETRY_SCOPE), span
+
+    def manifest_trace_context(metadata):
+        """W3C context of the document's trace, from the progress record the ingestion stage wrote
+
+        It is not in the metadata, which is part of the KFP cache key.
+        """
+        if not os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT") or FILE_MD5_HASH not in metadata:
+            return {}
+        import boto3
 
-    async def convert_document():
-        print("Starting conversion stage")
-        dotenv_path = Path(CONFIG_SECRETS_LOCATION+'.env')
-        load_dotenv(dotenv_path=dotenv_path)
-
-        with open(DOCLING_CONFIG_LOCATION, "r") as f:
-            conversion_options = json.load(f)
-
-        print(f"Conversion options : {conversion_options}")
-
-        source_file = TASK_STORAGE+input_document_metadata[FILE_MD5_HASH]
-
-        # Verify the file exists and read it
-        if not os.path.exists(source_file):
-            raise FileNotFoundError(f"Document file not found at {source_file}")
-
-
-        # Read file content
-        with open(source_file, "rb") as f:
-            ingested_content = f.read()
-            print(
-                f"Successfully read {len(ingested_content)} bytes from Kubeflow artifact storage"
+        s3_client = boto3.client(
+            "s3",
+            endpoint_url=os.environ.get("s3_url"),
+            aws_access_key_id=os.environ.get("aws_access_key_id"),
+            aws_secret_access_key=os.environ.get("aws_secret_access_key"),
+            region_name=os.environ.get("aws_region", "us-east-1"),
+            use_ssl=False
+        )
+        manifest_bucket = os.environ.get("INGESTION_MANIFEST_BUCKET", "ingestion-manifest")
+        progress_key = f"{metadata[S3_BUCKET_NAME]}/{metadata[FILE_MD5_HASH]}.json"
+        try:
+            progress = json.loads(s3_client.get_object(Bucket=manifest_bucket, Key=progress_key)["Body"].read())
+        except Exception as e:
+            print(f"WARNING: No trace context from the ingestion manifest - {type(e).__name__}: {e}", file=sys.stderr)
+            return {}
+        return progress.get("trace_context", {})
+
+    def end_stage_span(stage, span, meter, started, outcome="success", error=None):
+        """Record the stage outcome and flush telemetry before the pod exits"""
+        if error is not None:
+            outcome = "failed"
+            span.record_exception(error)
+            span.set_status(trace.Status(trace.StatusCode.ERROR, f"{type(error).__name__}: {error}"))
+        attributes = {"stage": stage, "outcome": outcome}
+        meter.create_counter(
+            "ingestion_documents", unit="{document}", description="Documents processed by an ingestion stage"
+        ).add(1, attributes)
+        meter.create_histogram(
+            "ingestion_stage_duration", unit="s", description="Duration of an ingestion stage"
+        ).record(time.monotonic() - started, attributes)
+        span.end()
+        for provider in (trace.get_tracer_provider(), metrics.get_meter_provider()):
+            if hasattr(provider, "shutdown"):
+                provider.shutdown()
+
+    def start_profiling(enabled):
+        """Sample the stage's stack and RSS every PROFILE_INTERVAL seconds when enabled"""
+        if not enabled:
+            return None
+        import threading
+
+        profile = {"stacks": {}, "peak_rss": 0, "peak_stack": "", "started": time.monotonic(), "stop": threading.Event()}
+        thread_id = threading.get_ident()
+        page_size = os.sysconf("SC_PAGE_SIZE")
+
+        def sample():
+            while not profile["stop"].wait(PROFILE_INTERVAL):
+                frame = sys._current_frames().get(thread_id)
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack = ";".join(reversed(frames))
+                profile["stacks"][stack] = profile["stacks"].get(stack, 0) + 1
+                with open("/proc/self/statm") as statm:
+                    rss = int(statm.read().split()[1]) * page_size
+                if rss > profile["peak_rss"]:
+                    profile["peak_rss"], profile["peak_stack"] = rss, stack
+
+        profile["sampler"] = threading.Thread(target=sample, daemon=True)
+        profile["sampler"].start()
+        return profile
+
+    def write_profile(stage, profile, profile_stacks, profile_summary):
+        """Write the sampled stacks in folded format for flamegraph tools, and a summary for the run UI"""
+        if profile is None:
+            open(profile_stacks.path, "w").close()
+            with open(profile_summary.path, "w") as f:
+                f.write(f"Profiling of {stage} is disabled, enable it with the profile_stages parameter\n")
+            return
+        import resource
+
+        profile["stop"].set()
+        profile["sampler"].join()
+        wall_seconds = time.monotonic() - profile["started"]
+        # ru_maxrss is in KiB on Linux and covers the whole pod process
+        peak_rss = max(profile["peak_rss"], resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+        stacks = profile["stacks"]
+        total = sum(stacks.values()) or 1
+
+        with open(profile_stacks.path, "w") as f:
+            for stack, count in sorted(stacks.items()):
+                f.write(f"{stack} {count}\n")
+        profile_stacks.metadata["format"] = "folded"
+        profile_stacks.metadata["samples"] = total
+        profile_stacks.metadata["wall_seconds"] = round(wall_seconds, 3)
+        profile_stacks.metadata["peak_rss_mib"] = round(peak_rss / 2**20, 1)
+
+        self_samples = {}
+        total_samples = {}
+        for stack, count in stacks.items():
+            frames = stack.split(";")
+            self_samples[frames[-1]] = self_samples.get(frames[-1], 0) + count
+            for frame in set(frames):
+                total_samples[frame] = total_samples.get(frame, 0) + count
+
+        lines = [
+            f"# {stage} profile",
+            "",
+            f"- Wall time: {wall_seconds:.2f} s, {total} samples every {PROFILE_INTERVAL * 1000:.0f} ms",
+            f"- Peak RSS: {peak_rss / 2**20:.1f} MiB",
+            "",
+            "Open the profile_stacks artifact in speedscope or flamegraph.pl for a flamegraph.",
+        ]
+        for title, samples in (("Self", self_samples), ("Total", total_samples)):
+            lines += ["", f"## Top frames by {title.lower()} samples", "", "| Samples | % | Frame |", "|---:|---:|---|"]
+            for frame, count in sorted(samples.items(), key=lambda item: -item[1])[:PROFILE_TOP_FRAMES]:
+                lines.append(f"| {count} | {100 * count / total:.1f} | `{frame}` |")
+        lines += ["", "## Stack at the highest sampled RSS", "", "```"]
+        lines += profile["peak_stack"].split(";")
+        lines.append("```")
+        with open(profile_summary.path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+    @contextlib.asynccontextmanager
+    async def docling_admission(admission_url, document_name, size_bytes, pages):
+        """Hold a lease from the docling admission service (docling_admission.py) while converting
+
+        pages 0 lets the service fall back to the file size.
+        """
+        if not admission_url:
+            yield
+            return
+
+        admission_timeout = int(os.environ.get("DOCLING_ADMISSION_TIMEOUT", 1800))
+        async with httpx.AsyncClient(base_url=admission_url, timeout=ADMISSION_POLL_SECONDS + 30) as admission_client:
+            deadline = time.monotonic() + admission_timeout
+            ticket = None
+            with tracer.start_as_current_span("docling.admission", attributes={"document.pages": pages}):
+                while True:
+                    if ticket is None:
+                        response = await admission_client.post("/tickets", json={
+                            "pages": pages,
+                            "size_bytes": size_bytes,
+                            "name": document_name,
+                        })
+                        response.raise_for_status()
+                        ticket = response.json()
+                        print(f"Queued for docling admission, {pages} pages {size_bytes} bytes, cost {ticket['cost']}")
+
+                    response = await admission_client.post(
+                        f"/tickets/{ticket['ticket_id']}/wait", json={"timeout": ADMISSION_POLL_SECONDS}
+                    )
+                    if response.status_code == 404:
+                        # Ticket expired, e.g. the admission service restarted
+                        ticket = None
+                        continue
+                    response.raise_for_status()
+                    if response.json()["granted"]:
+                        break
+                    if time.monotonic() > deadline:
+                        await admission_client.delete(f"/tickets/{ticket['ticket_id']}")
+                        raise TimeoutError(f"Not admitted to docling serve within {admission_timeout}s")
+                    print(f"Waiting for docling admission, queue position {response.json()['position']}")
+
+            print("Admitted to docling serve")
+
+            async def renew_lease():
+                while True:
+                    await asyncio.sleep(ticket["lease_ttl"] / 3)
+                    try:
+                        await admission_client.post(f"/tickets/{ticket['ticket_id']}/renew")
+                    except httpx.HTTPError as e:
+                        print(f"WARNING: Failed to renew docling admission lease - {e}", file=sys.stderr)
+
+            renewal = asyncio.create_task(renew_lease())
+            try:
+                yield
+            finally:
+                renewal.cancel()
+                await admission_client.delete(f"/tickets/{ticket['ticket_id']}")
+
+    def pdf_pages_without_text(content):
+        """Numbers of the PDF pages without an embedded text layer, None if pypdfium2 cannot read the PDF
+
+        pypdfium2 is also the pdf_backend docling parses the text layer with.
+        """
+        import pypdfium2 as pdfium
+
+        try:
+            pdf = pdfium.PdfDocument(content)
+        except pdfium.PdfiumError as e:
+            print(f"Could not inspect the PDF text layer, keeping OCR: {e}")
+            return None
+        try:
+            pages = []
+            for index in range(len(pdf)):
+                page = pdf[index]
+                textpage = page.get_textpage()
+                if len(textpage.get_text_range().strip()) < OCR_MIN_PAGE_CHARS:
+                    pages.append(index + 1)
+                textpage.close()
+                page.close()
+            return pages
+        finally:
+            pdf.close()
+
+    def choose_ocr(document_name, ingested_content, conversion_options):
+        """Turn OCR off for PDFs whose every page has a text layer
+
+        Born-digital PDFs would otherwise run the OCR engine in all configured
+        languages for text docling already reads from the PDF. The decision only
+        depends on the content, so the conversion checkpoint and cache keys
+        stay valid.
+        """
+        adaptive_ocr = os.environ.get("DOCLING_ADAPTIVE_OCR", "true").lower() == "true"
+        if (
+            not adaptive_ocr
+            or not conversion_options.get("do_ocr")
+            or conversion_options.get("force_ocr")
+            or not ingested_content.startswith(b"%PDF")
+        ):
+            return conversion_options
+
+        with tracer.start_as_current_span("pdf.text_layer") as span:
+            pages_without_text = pdf_pages_without_text(ingested_content)
+            if pages_without_text is not None:
+                span.set_attribute("pdf.pages_without_text", len(pages_without_text))
+        do_ocr = pages_without_text != []
+        meter.create_counter(
+            "ingestion_ocr_decisions", unit="{document}", description="PDFs converted with or without OCR"
+        ).add(1, {"do_ocr": do_ocr})
+        if do_ocr:
+            if pages_without_text:
+                print(f"OCR enabled, pages without a text layer in {document_name}: {pages_without_text}")
+            return conversion_options
+        print(f"OCR disabled, every page of {document_name} has a text layer")
+        return {**conversion_options, "do_ocr": False}
+
+    def read_document(s3_client):
+        """Read the document from S3 and check it is the content the ingestion stage hashed"""
+        # Read the document straight from S3, the ingestion stage only identifies it
+        with tracer.start_as_current_span("s3.get_object", attributes={
+            "s3.bucket": input_document_metadata[S3_BUCKET_NAME],
+            "s3.key": input_document_metadata[S3_OBJECT_KEY],
+        }):
+            response = s3_client.get_object(
+                Bucket=input_document_metadata[S3_BUCKET_NAME],
+                Key=input_document_metadata[S3_OBJECT_KEY],
             )
+            ingested_content = response["Body"].read()
+        print(f"Successfully read {len(ingested_content)} bytes from S3")
+        meter.create_counter("ingestion_bytes", unit="By", description="Document bytes read from S3").add(
+            len(ingested_content), {"stage": "conversion"}
+        )
 
-        document_metadata = input_document_metadata
-
+        with tracer.start_as_current_span("hash", attributes={"document.bytes": len(ingested_content)}):
+            md5_hash = hashlib.md5(ingested_content).hexdigest()
+        if md5_hash != input_document_metadata[FILE_MD5_HASH]:
+            raise ValueError(
+                "S3 object changed since the ingestion stage ran, "
+                f"expected MD5 {input_document_metadata[FILE_MD5_HASH]} got {md5_hash}"
+            )
+        return ingested_content
+
+    def presigned_source(s3_client):
+        """URL docling serve can read the document from, None to upload the content instead
+
+        Documents of at least DOCLING_PRESIGNED_MIN_BYTES are fetched by docling
+        serve itself, so they are neither read into this pod nor sent as a
+        multipart body. Returns (url, size).
+        """
+        presigned_min_bytes = os.environ.get("DOCLING_PRESIGNED_MIN_BYTES")
+        if not presigned_min_bytes:
+            return None
+
+        with tracer.start_as_current_span("s3.head_object", attributes={
+            "s3.bucket": input_document_metadata[S3_BUCKET_NAME],
+            "s3.key": input_document_metadata[S3_OBJECT_KEY],
+        }):
+            head = s3_client.head_object(
+                Bucket=input_document_metadata[S3_BUCKET_NAME],
+                Key=input_document_metadata[S3_OBJECT_KEY],
+            )
+        if head["ContentLength"] < int(presigned_min_bytes):
+            return None
+        # The ETag stands in for the MD5 check of the uploaded content, it is
+        # the MD5 for single part uploads and changes with the content
+        # otherwise. The ingestion stage recorded the one it hashed in the
+        # progress record, as the metadata is part of the KFP cache key.
+        manifest_bucket = os.environ.get("INGESTION_MANIFEST_BUCKET", "ingestion-manifest")
+        progress_key = f"{input_document_metadata[S3_BUCKET_NAME]}/{input_document_metadata[FILE_MD5_HASH]}.json"
+        try:
+            progress = json.loads(s3_client.get_object(Bucket=manifest_bucket, Key=progress_key)["Body"].read())
+        except s3_client.exceptions.NoSuchKey:
+            progress = {}
+        etag = head["ETag"].strip('"')
+        if etag != progress.get(S3_ETAG):
+            # Changed, or another object of the same content ingested since,
+            # uploading checks the MD5 instead
+            print(f"ETag {etag} is not the one hashed ({progress.get(S3_ETAG)}), uploading the document")
+            return None
+
+        # docling serve may reach S3 through another address than this pod
+        presign_client = boto3.client(
+            "s3",
+            endpoint_url=os.environ.get("DOCLING_S3_URL") or os.environ.get("s3_url"),
+            aws_access_key_id=os.environ.get("aws_access_key_id"),
+            aws_secret_access_key=os.environ.get("aws_secret_access_key"),
+            region_name=os.environ.get("aws_region", "us-east-1"),
+            use_ssl=False
+        )
+        params = {"Bucket": input_document_metadata[S3_BUCKET_NAME], "Key": input_document_metadata[S3_OBJECT_KEY]}
+        if head.get("VersionId"):
+            # Pin the version checked above on versioned buckets
+            params["VersionId"] = head["VersionId"]
+        # Valid for the whole admission wait and conversion
+        expires_in = int(os.environ.get("DOCLING_TIMEOUT", 600)) + int(os.environ.get("DOCLING_ADMISSION_TIMEOUT", 1800))
+        url = presign_client.generate_presigned_url("get_object", Params=params, ExpiresIn=expires_in)
+        print(f"docling serve reads the {head['ContentLength']} bytes document from S3 with a presigned URL")
+        return url, head["ContentLength"]
+
+    def convert_locally(ingested_content):
+        """Convert a lightweight format in-process with docling's declarative backends"""
+        from io import BytesIO
+        from docling.datamodel.base_models import ConversionStatus, DocumentStream, InputFormat
+        from docling.document_converter import DocumentConverter
+
+        document_name = input_document_metadata.get(DOCUMENT_NAME)
+        # Only formats that need no layout or OCR models
+        converter = DocumentConverter(allowed_formats=[
+            InputFormat.DOCX, InputFormat.HTML, InputFormat.MD, InputFormat.CSV, InputFormat.ASCIIDOC,
+        ])
+        with tracer.start_as_current_span("docling.convert_local") as span:
+            started = time.monotonic()
+            result = converter.convert(DocumentStream(name=document_name, stream=BytesIO(ingested_content)))
+            processing_time = time.monotonic() - started
+            span.set_attribute("docling.processing_time", processing_time)
+            span.set_attribute("docling.status", result.status.value)
+        meter.create_histogram(
+            "ingestion_docling_processing_time", unit="s", description="Conversion time reported by docling serve"
+        ).record(processing_time, {"status": result.status.value, "route": "local"})
+        if result.status != ConversionStatus.SUCCESS:
+            raise Exception(f"Docling failed to convert document locally {result.status.value}: {result.errors}")
+
+        # Through JSON like the docling serve response, so that both routes are
+        # validated against the docling-core of this pipeline
+        with tracer.start_as_current_span("docling.validate"):
+            doclingdoc_json = DoclingDocument.model_validate_json(result.document.model_dump_json())
+        print(f"Successfully converted document locally in {processing_time:.2f}s")
+        return doclingdoc_json
+
+    async def convert_with_docling(conversion_options, ingested_content=None, source=None):
+        """Convert the document with docling serve, uploading ingested_content or from the (url, size) source"""
         # Get docling serve API endpoint from environment variable
         docling_api_url = os.environ.get(
             "DOCLING_API_URL", "http://docling-serve.docling.svc.cluster.local:5001/v1/convert/file"
         )
         docling_timeout = os.environ.get("DOCLING_TIMEOUT",600)
+        admission_url = os.environ.get("DOCLING_ADMISSION_URL")
+        if source is not None:
+            docling_api_url = os.environ.get("DOCLING_SOURCE_API_URL") or re.sub(r"/file$", "/source", docling_api_url)
         print(f"Calling docling serve API at: {docling_api_url}  Timeout {docling_timeout}")
 
-        document_name = document_metadata.get(DOCUMENT_NAME)
+        document_name = input_document_metadata.get(DOCUMENT_NAME)
+        if source is None:
+            conversion_options = choose_ocr(document_name, ingested_content, conversion_options)
+            size_bytes = len(ingested_content)
+            # Cheap page count so the admission service can schedule shortest job first
+            pages = 0
+            if ingested_content.startswith(b"%PDF"):
+                pages = len(re.findall(rb"/Type\s*/Page\b", ingested_content))
+        else:
+            # Adaptive OCR and the page count need the content, which is not read
+            size_bytes = source[1]
+            pages = 0
 
         async with httpx.AsyncClient(timeout=int(docling_timeout)) as client:
-            files = {"files": (document_name, ingested_content,"application/json")}
-            
-            response = await client.post(docling_api_url, files=files, data=conversion_options)
-
-            if response.status_code != 200:
-                raise Exception(f"Docling API returned status code {response.status_code}: {response.text}")      
-
-            doc_status=response.json()["status"]
-            processing_time=response.json()["processing_time"]
+            async with docling_admission(admission_url, document_name, size_bytes, pages):
+                with tracer.start_as_current_span("docling.convert", attributes={
+                    "docling.source": "upload" if source is None else "presigned_url",
+                }) as span:
+                    if source is None:
+                        files = {"files": (document_name, ingested_content,"application/json")}
+                        response = await client.post(docling_api_url, files=files, data=conversion_options)
+                    else:
+                        response = await client.post(docling_api_url, json={
+                            "options": conversion_options,
+                            "sources": [{"kind": "http", "url": source[0]}],
+                        })
+                    span.set_attribute("http.status_code", response.status_code)
+
+                    if response.status_code != 200:
+                        raise Exception(f"Docling API returned status code {response.status_code}: {response.text}")      
+
+                    doc_status=response.json()["status"]
+                    processing_time=response.json()["processing_time"]
+                    # Time docling spent converting, the rest of the span is transfer and queueing
+                    span.set_attribute("docling.processing_time", processing_time)
+                    span.set_attribute("docling.status", doc_status)
+            meter.create_histogram(
+                "ingestion_docling_processing_time", unit="s", description="Conversion time reported by docling serve"
+            ).record(processing_time, {"status": doc_status, "route": "docling-serve"})
             if doc_status!="success":
                 raise Exception(f"Docling failed to process document {doc_status}")
 
             response_obj = response.json()["document"]["json_content"]
-            try:
-                doclingdoc_json = DoclingDocument.model_validate_json(json.dumps(response_obj))
-            except Exception as e:
-                raise Exception(f"Invalid DoclingDocument, returned JSON payload failed validation. {e}")
+            with tracer.start_as_current_span("docling.validate"):
+                try:
+                    doclingdoc_json = DoclingDocument.model_validate_json(json.dumps(response_obj))
+                except Exception as e:
+                    raise Exception(f"Invalid DoclingDocument, returned JSON payload failed validation. {e}")
+            meter.create_counter("ingestion_pages", unit="{page}", description="Pages converted by docling serve").add(
+                len(doclingdoc_json.pages), {"stage": "conversion"}
+            )
 
             print(f"Successfully processed document in {processing_time} {doclingdoc_json}")
 
-        destination_file = source_file+".json"
+        return doclingdoc_json
 
-        # Serialize DoclingDocument to JSON for stage 3
-        with open(destination_file, "w", encoding="utf-8") as f:
+    async def convert_document():
+        print("Starting conversion stage")
+        with open(DOCLING_CONFIG_LOCATION, "r") as f:
+            conversion_options = json.load(f)
+
+        print(f"Conversion options : {conversion_options}")
+
+        # The cache key was computed from the options seen by the ingestion stage
+        conversion_options_hash = hashlib.sha256(
+            json.dumps(conversion_options, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        ).hexdigest()
+        if conversion_options_hash != input_document_metadata[CONVERSION_OPTIONS_HASH]:
+            raise ValueError(
+                "docling-client-config changed since the ingestion stage ran, "
+                f"expected options hash {input_document_metadata[CONVERSION_OPTIONS_HASH]} got {conversion_options_hash}"
+            )
+
+        s3_client = boto3.client(
+            "s3",
+            endpoint_url=os.environ.get("s3_url"),
+            aws_access_key_id=os.environ.get("aws_access_key_id"),
+            aws_secret_access_key=os.environ.get("aws_secret_access_key"),
+            region_name=os.environ.get("aws_region", "us-east-1"),
+            use_ssl=False
+        )
+        manifest_bucket = os.environ.get("INGESTION_MANIFEST_BUCKET", "ingestion-manifest")
+
+        document_metadata = input_document_metadata
+        md5_hash = document_metadata[FILE_MD5_HASH]
+
+        # A previous run may already have converted this content with these options
+        checkpoint_key = f"conversions/{md5_hash}-{conversion_options_hash}.json"
+        try:
+            checkpoint = s3_client.get_object(Bucket=manifest_bucket, Key=checkpoint_key)["Body"].read()
+            doclingdoc_json = DoclingDocument.model_validate_json(checkpoint)
+            print(f"Resuming from converted DoclingDocument s3://{manifest_bucket}/{checkpoint_key}")
+        except s3_client.exceptions.NoSuchKey:
+            source = presigned_source(s3_client) if conversion_route != "local" else None
+            if source is not None:
+                doclingdoc_json = await convert_with_docling(conversion_options, source=source)
+            else:
+                ingested_content = read_document(s3_client)
+                if conversion_route == "local":
+                    doclingdoc_json = convert_locally(ingested_content)
+                else:
+                    doclingdoc_json = await convert_with_docling(conversion_options, ingested_content=ingested_content)
+            s3_client.put_object(
+                Bucket=manifest_bucket,
+                Key=checkpoint_key,
+                Body=doclingdoc_json.model_dump_json().encode("utf-8"),
+                ContentType="application/json",
+            )
+
+        # Serialize DoclingDocument to the KFP artifact store for stage 3, unlike
+        # a run-scoped PVC this survives the run and is reused on a cache hit
+        with open(docling_document.path, "w", encoding="utf-8") as f:
             # Export document to JSON
             doc_json = doclingdoc_json.model_dump_json(indent=2)
             f.write(doc_json)
+        docling_document.metadata[FILE_MD5_HASH] = md5_hash
+        docling_document.metadata[CONVERSION_OPTIONS_HASH] = conversion_options_hash
         print("DoclingDocument written successfully")
 
+        # Record progress, a document stored from these options stays stored
+        progress_key = f"{document_metadata[S3_BUCKET_NAME]}/{md5_hash}.json"
+        try:
+            progress = json.loads(s3_client.get_object(Bucket=manifest_bucket, Key=progress_key)["Body"].read())
+        except s3_client.exceptions.NoSuchKey:
+            progress = {FILE_MD5_HASH: md5_hash}
+        if progress.get("state") != "stored" or progress.get(CONVERSION_OPTIONS_HASH) != conversion_options_hash:
+            progress["state"] = "converted"
+        progress[CONVERSION_OPTIONS_HASH] = conversion_options_hash
+        progress["updated_at"] = time.time()
+        s3_client.put_object(
+            Bucket=manifest_bucket,
+            Key=progress_key,
+            Body=json.dumps(progress).encode("utf-8"),
+            ContentType="application/json",
+        )
+
         print("Conversion stage complete, moving to stage 3")
 
         return document_metadata
 
+    dotenv_path = Path(CONFIG_SECRETS_LOCATION+'.env')
+    load_dotenv(dotenv_path=dotenv_path)
+
+    stage_started = time.monotonic()
+    tracer, meter, stage_span = start_stage_span("conversion_stage", manifest_trace_context(input_document_metadata))
+    profile = start_profiling(profile_stage)
+    stage_span.set_attribute("document.name", input_document_metadata.get(DOCUMENT_NAME, ""))
+    stage_span.set_attribute("conversion.route", conversion_route)
+
     try:
         res = asyncio.run(convert_document())
+        write_profile("conversion_stage", profile, profile_stacks, profile_summary)
+        end_stage_span("conversion", stage_span, meter, stage_started)
         return res
-    except FileNotFoundError as fnf:
-        print(f"ERROR: {fnf}", file=sys.stderr)
+    except ValueError as ve:
+        print(f"ERROR: Invalid input - {ve}", file=sys.stderr)
+        write_profile("conversion_stage", profile, profile_stacks, profile_summary)
+        end_stage_span("conversion", stage_span, meter, stage_started, error=ve)
         sys.exit(1)
     except httpx.HTTPError as http_err:
         print(f"ERROR: Failed to call docling API - {http_err}", file=sys.stderr)
+        write_profile("conversion_stage", profile, profile_stacks, profile_summary)
+        end_stage_span("conversion", stage_span, meter, stage_started, error=http_err)
         sys.exit(1)
     except Exception as e:
         print(f"ERROR: Conversion failed - {type(e).__name__}: {e}", file=sys.stderr)
+        write_profile("conversion_stage", profile, profile_stacks, profile_summary)
+        end_stage_span("conversion", stage_span, meter, stage_started, error=e)
         sys.exit(1)
 
 
+# The conversion stage on the docling serve image, which has docling and its
+# docling-core installed, for the formats it converts in-process
+local_conversion_stage = dsl.component(
+    base_image=DOCLING_IMAGE,
+    packages_to_install=["boto3", "dotenv", "opentelemetry-sdk", "opentelemetry-exporter-otlp-proto-http"],
+)(conversion_stage.python_func)
+
+
+@dsl.component(
+    base_image="registry.redhat.io/ubi10/python-312-minimal",
+    packages_to_install=[
+        "boto3", "httpx", "docling-core", "dotenv", "pypdfium2",
+        "opentelemetry-sdk", "opentelemetry-exporter-otlp-proto-http",
+    ],
+)
+def batch_conversion_stage(
+    ingestion_document_s3_locations: List[str],
+    profile_stacks: Output[Artifact],
+    profile_summary: Output[Markdown],
+    profile_stage: bool = False,
+) -> int:
+    """Batch Conversion Stage: Convert the small documents of a batch with few docling serve requests
+
+    Packs small documents without a conversion checkpoint into
+    multi-document requests and writes their checkpoints, each document's
+    conversion stage then resumes from its checkpoint. Documents that fail
+    here are converted on their own by their conversion stage. Returns the
+    number of documents converted.
+    """
+    import io
+    import os
+    import re
+    import sys
+    import time
+    import asyncio
+    import contextlib
+    import zipfile
+    import boto3
+    import hashlib
+    import httpx
+    import json
+    from urllib.parse import urlparse
+    from botocore.exceptions import ClientError
+    from dotenv import load_dotenv
+    from pathlib import Path
+    from docling_core.types.doc.document import DoclingDocument
+    from opentelemetry import context as otel_context, metrics, propagate, trace
+
+    CONFIG_SECRETS_LOCATION = "/tmp/ingestion-config/"
+    DOCLING_CONFIG_LOCATION = "/tmp/docling-config/docling-config.json"
+    ADMISSION_POLL_SECONDS=30
+    # Pages with fewer characters of embedded text are treated as scanned
+    OCR_MIN_PAGE_CHARS=32
+    # Converted in-process by the local conversion stage, see ingestion_stage
+    LOCAL_CONVERSION_FORMATS=["docx", "md", "markdown", "html", "htm", "xhtml", "csv", "adoc", "asciidoc"]
+    TELEMETRY_SCOPE="rag_ingestion"
+    PROFILE_INTERVAL=0.01
+    PROFILE_TOP_FRAMES=25
+
+    def start_stage_span(stage, carrier):
+        """Start the stage span, exporting to OTEL_EXPORTER_OTLP_ENDPOINT when it is set
+
+        The span continues the trace whose W3C context the carrier holds,
+        without an endpoint the tracer and meter are no-ops.
+        """
+        if os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT"):
+            from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            from opentelemetry.sdk.metrics import MeterProvider
+            from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+            import uuid
+
+            # Every pod reports its own cumulative counters, the instance keeps their series apart
+            resource = Resource.create({
+                "service.name": os.environ.get("OTEL_SERVICE_NAME", "rag-ingestion"),
+                "service.instance.id": os.environ.get("HOSTNAME") or str(uuid.uuid4()),
+            })
+            tracer_provider = TracerProvider(resource=resource)
+            tracer_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+            trace.set_tracer_provider(tracer_provider)
+            metrics.set_meter_provider(MeterProvider(
+                resource=resource,
+                metric_readers=[PeriodicExportingMetricReader(OTLPMetricExporter())],
+            ))
+        span = trace.get_tracer(TELEMETRY_SCOPE).start_span(stage, context=propagate.extract(carrier or {}))
+        otel_context.attach(trace.set_span_in_context(span))
+        return trace.get_tracer(TELEMETRY_SCOPE), metrics.get_meter(TELEMETRY_SCOPE), span
+
+    def end_stage_span(stage, span, meter, started, outcome="success", error=None):
+        """Record the stage outcome and flush telemetry before the pod exits"""
+        if error is not None:
+            outcome = "failed"
+            span.record_exception(error)
+            span.set_status(trace.Status(trace.StatusCode.ERROR, f"{type(error).__name__}: {error}"))
+        attributes = {"stage": stage, "outcome": outcome}
+        meter.create_counter(
+            "ingestion_documents", unit="{document}", description="Documents processed by an ingestion stage"
+        ).add(1, attributes)
+        meter.create_histogram(
+            "ingestion_stage_duration", unit="s", description="Duration of an ingestion stage"
+        ).record(time.monotonic() - started, attributes)
+        span.end()
+        for provider in (trace.get_tracer_provider(), metrics.get_meter_provider()):
+            if hasattr(provider, "shutdown"):
+                provider.shutdown()
+
+    def start_profiling(enabled):
+        """Sample the stage's stack and RSS every PROFILE_INTERVAL seconds when enabled"""
+        if not enabled:
+            return None
+        import threading
+
+        profile = {"stacks": {}, "peak_rss": 0, "peak_stack": "", "started": time.monotonic(), "stop": threading.Event()}
+        thread_id = threading.get_ident()
+        page_size = os.sysconf("SC_PAGE_SIZE")
+
+        def sample():
+            while not profile["stop"].wait(PROFILE_INTERVAL):
+                frame = sys._current_frames().get(thread_id)
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack = ";".join(reversed(frames))
+                profile["stacks"][stack] = profile["stacks"].get(stack, 0) + 1
+                with open("/proc/self/statm") as statm:
+                    rss = int(statm.read().split()[1]) * page_size
+                if rss > profile["peak_rss"]:
+                    profile["peak_rss"], profile["peak_stack"] = rss, stack
+
+        profile["sampler"] = threading.Thread(target=sample, daemon=True)
+        profile["sampler"].start()
+        return profile
+
+    def write_profile(stage, profile, profile_stacks, profile_summary):
+        """Write the sampled stacks in folded format for flamegraph tools, and a summary for the run UI"""
+        if profile is None:
+            open(profile_stacks.path, "w").close()
+            with open(profile_summary.path, "w") as f:
+                f.write(f"Profiling of {stage} is disabled, enable it with the profile_stages parameter\n")
+            return
+        import resource
+
+        profile["stop"].set()
+        profile["sampler"].join()
+        wall_seconds = time.monotonic() - profile["started"]
+        # ru_maxrss is in KiB on Linux and covers the whole pod process
+        peak_rss = max(profile["peak_rss"], resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+        stacks = profile["stacks"]
+        total = sum(stacks.values()) or 1
+
+        with open(profile_stacks.path, "w") as f:
+            for stack, count in sorted(stacks.items()):
+                f.write(f"{stack} {count}\n")
+        profile_stacks.metadata["format"] = "folded"
+        profile_stacks.metadata["samples"] = total
+        profile_stacks.metadata["wall_seconds"] = round(wall_seconds, 3)
+        profile_stacks.metadata["peak_rss_mib"] = round(peak_rss / 2**20, 1)
+
+        self_samples = {}
+        total_samples = {}
+        for stack, count in stacks.items():
+            frames = stack.split(";")
+            self_samples[frames[-1]] = self_samples.get(frames[-1], 0) + count
+            for frame in set(frames):
+                total_samples[frame] = total_samples.get(frame, 0) + count
+
+        lines = [
+            f"# {stage} profile",
+            "",
+            f"- Wall time: {wall_seconds:.2f} s, {total} samples every {PROFILE_INTERVAL * 1000:.0f} ms",
+            f"- Peak RSS: {peak_rss / 2**20:.1f} MiB",
+            "",
+            "Open the profile_stacks artifact in speedscope or flamegraph.pl for a flamegraph.",
+        ]
+        for title, samples in (("Self", self_samples), ("Total", total_samples)):
+            lines += ["", f"## Top frames by {title.lower()} samples", "", "| Samples | % | Frame |", "|---:|---:|---|"]
+            for frame, count in sorted(samples.items(), key=lambda item: -item[1])[:PROFILE_TOP_FRAMES]:
+                lines.append(f"| {count} | {100 * count / total:.1f} | `{frame}` |")
+        lines += ["", "## Stack at the highest sampled RSS", "", "```"]
+        lines += profile["peak_stack"].split(";")
+        lines.append("```")
+        with open(profile_summary.path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+    @contextlib.asynccontextmanager
+    async def docling_admission(admission_url, document_name, size_bytes, pages):
+        """Hold a lease from the docling admission service (docling_admission.py) while converting
+
+        pages 0 lets the service fall back to the file size.
+        """
+        if not admission_url:
+            yield
+            return
+
+        admission_timeout = int(os.environ.get("DOCLING_ADMISSION_TIMEOUT", 1800))
+        async with httpx.AsyncClient(base_url=admission_url, timeout=ADMISSION_POLL_SECONDS + 30) as admission_client:
+            deadline = time.monotonic() + admission_timeout
+            ticket = None
+            with tracer.start_as_current_span("docling.admission", attributes={"document.pages": pages}):
+                while True:
+                    if ticket is None:
+                        response = await admission_client.post("/tickets", json={
+                            "pages": pages,
+                            "size_bytes": size_bytes,
+                            "name": document_name,
+                        })
+                        response.raise_for_status()
+                        ticket = response.json()
+                        print(f"Queued for docling admission, {pages} pages {size_bytes} bytes, cost {ticket['cost']}")
+
+                    response = await admission_client.post(
+                        f"/tickets/{ticket['ticket_id']}/wait", json={"timeout": ADMISSION_POLL_SECONDS}
+                    )
+                    if response.status_code == 404:
+                        # Ticket expired, e.g. the admission service restarted
+                        ticket = None
+                        continue
+                    response.raise_for_status()
+                    if response.json()["granted"]:
+                        break
+                    if time.monotonic() > deadline:
+                        await admission_client.delete(f"/tickets/{ticket['ticket_id']}")
+                        raise TimeoutError(f"Not admitted to docling serve within {admission_timeout}s")
+                    print(f"Waiting for docling admission, queue position {response.json()['position']}")
+
+            print("Admitted to docling serve")
+
+            async def renew_lease():
+                while True:
+                    await asyncio.sleep(ticket["lease_ttl"] / 3)
+                    try:
+                        await admission_client.post(f"/tickets/{ticket['ticket_id']}/renew")
+                    except httpx.HTTPError as e:
+                        print(f"WARNING: Failed to renew docling admission lease - {e}", file=sys.stderr)
+
+            renewal = asyncio.create_task(renew_lease())
+            try:
+                yield
+            finally:
+                renewal.cancel()
+                await admission_client.delete(f"/tickets/{ticket['ticket_id']}")
+
+    def pdf_pages_without_text(content):
+        """Numbers of the PDF pages without an embedded text layer, None if pypdfium2 cannot read the PDF
+
+        pypdfium2 is also the pdf_backend docling parses the text layer with.
+        """
+        import pypdfium2 as pdfium
+
+        try:
+            pdf = pdfium.PdfDocument(content)
+        except pdfium.PdfiumError as e:
+            print(f"Could not inspect the PDF text layer, keeping OCR: {e}")
+            return None
+        try:
+            pages = []
+            for index in range(len(pdf)):
+                page = pdf[index]
+                textpage = page.get_textpage()
+                if len(textpage.get_text_range().strip()) < OCR_MIN_PAGE_CHARS:
+                    pages.append(index + 1)
+                textpage.close()
+                page.close()
+            return pages
+        finally:
+            pdf.close()
+
+    def choose_ocr(document_name, ingested_content, conversion_options):
+        """Turn OCR off for PDFs whose every page has a text layer
+
+        Born-digital PDFs would otherwise run the OCR engine in all configured
+        languages for text docling already reads from the PDF. The decision only
+        depends on the content, so the conversion checkpoint and cache keys
+        stay valid.
+        """
+        adaptive_ocr = os.environ.get("DOCLING_ADAPTIVE_OCR", "true").lower() == "true"
+        if (
+            not adaptive_ocr
+            or not conversion_options.get("do_ocr")
+            or conversion_options.get("force_ocr")
+            or not ingested_content.startswith(b"%PDF")
+        ):
+            return conversion_options
+
+        with tracer.start_as_current_span("pdf.text_layer") as span:
+            pages_without_text = pdf_pages_without_text(ingested_content)
+            if pages_without_text is not None:
+                span.set_attribute("pdf.pages_without_text", len(pages_without_text))
+        do_ocr = pages_without_text != []
+        meter.create_counter(
+            "ingestion_ocr_decisions", unit="{document}", description="PDFs converted with or without OCR"
+        ).add(1, {"do_ocr": do_ocr})
+        if do_ocr:
+            if pages_without_text:
+                print(f"OCR enabled, pages without a text layer in {document_name}: {pages_without_text}")
+            return conversion_options
+        print(f"OCR disabled, every page of {document_name} has a text layer")
+        return {**conversion_options, "do_ocr": False}
+
+    def select_documents(s3_client, manifest_bucket, conversion_options, conversion_options_hash):
+        """Small documents of the batch that have no conversion checkpoint yet, with their conversion options
+
+        The content is kept for the request, every document is at most
+        DOCLING_BATCH_DOCUMENT_MAX_BYTES. A document that cannot be read is
+        skipped and left to its own conversion stage.
+        """
+        document_max_bytes = int(os.environ.get("DOCLING_BATCH_DOCUMENT_MAX_BYTES", 1024 * 1024))
+        local_conversion = os.environ.get("DOCLING_LOCAL_CONVERSION", "true").lower() == "true"
+        documents = []
+        seen = set()
+        for location in ingestion_document_s3_locations:
+            parsed_url = urlparse(location)
+            bucket_name = parsed_url.netloc
+            object_key = parsed_url.path.lstrip("/")
+            # Invalid locations are reported by their ingestion stage
+            if parsed_url.scheme != "s3" or not bucket_name or not object_key:
+                continue
+            document_name = object_key.split("/")[-1]
+            extension = document_name.rsplit(".", 1)[-1].lower() if "." in document_name else ""
+            if local_conversion and extension in LOCAL_CONVERSION_FORMATS:
+                continue
+            try:
+                head = s3_client.head_object(Bucket=bucket_name, Key=object_key)
+                if head["ContentLength"] > document_max_bytes:
+                    continue
+
+                content = s3_client.get_object(Bucket=bucket_name, Key=object_key)["Body"].read()
+                md5_hash = hashlib.md5(content).hexdigest()
+                if md5_hash in seen:
+                    continue
+                seen.add(md5_hash)
+                checkpoint_key = f"conversions/{md5_hash}-{conversion_options_hash}.json"
+                try:
+                    s3_client.head_object(Bucket=manifest_bucket, Key=checkpoint_key)
+                    continue
+                except ClientError as e:
+                    if e.response["Error"]["Code"] not in ("404", "NoSuchKey"):
+                        raise
+                options = choose_ocr(document_name, content, conversion_options)
+            except Exception as e:
+                print(f"Skipping {location}, its conversion stage converts it: {type(e).__name__}: {e}")
+                continue
+            documents.append({
+                "name": document_name,
+                "content": content,
+                "size": len(content),
+                "checkpoint_key": checkpoint_key,
+                "options": options,
+                # Cheap page count so the admission service can schedule shortest job first
+                "pages": len(re.findall(rb"/Type\s*/Page\b", content)) if content.startswith(b"%PDF") else 0,
+            })
+        return documents
+
+    def pack_requests(documents):
+        """Group the documents into requests within the byte and document budgets
+
+        Documents share a request only with the same conversion options, after
+        adaptive OCR, and with different file name stems since docling serve
+        names its outputs after them.
+        """
+        max_documents = int(os.environ.get("DOCLING_BATCH_MAX_DOCUMENTS", 20))
+        max_bytes = int(os.environ.get("DOCLING_BATCH_MAX_BYTES", 8 * 1024 * 1024))
+        requests = []
+        for document in documents:
+            stem = Path(document["name"]).stem
+            for request in requests:
+                if (
+                    request["options"] == document["options"]
+                    and len(request["documents"]) < max_documents
+                    and request["bytes"] + document["size"] <= max_bytes
+                    and stem not in request["stems"]
+                ):
+                    break
+            else:
+                request = {"options": document["options"], "documents": [], "bytes": 0, "stems": set()}
+                requests.append(request)
+            request["documents"].append(document)
+            request["bytes"] += document["size"]
+            request["stems"].add(stem)
+        return requests
+
+    async def convert_request(client, s3_client, manifest_bucket, request):
+        """Convert one multi-document request and checkpoint every document docling serve converted"""
+        docling_api_url = os.environ.get(
+            "DOCLING_API_URL", "http://docling-serve.docling.svc.cluster.local:5001/v1/convert/file"
+        )
+        admission_url = os.environ.get("DOCLING_ADMISSION_URL")
+        documents = request["documents"]
+        files = [("files", (document["name"], document["content"], "application/json")) for document in documents]
+        size_bytes = sum(document["size"] for document in documents)
+        pages = sum(document["pages"] for document in documents)
+
+        async with docling_admission(admission_url, f"{len(documents)} documents", size_bytes, pages):
+            with tracer.start_as_current_span("docling.convert_batch", attributes={
+                "docling.documents": len(documents),
+                "document.bytes": size_bytes,
+            }) as span:
+                # Several documents always come back as a zip archive of their outputs
+                response = await client.post(
+                    docling_api_url, files=files, data={**request["options"], "target_type": "zip"}
+                )
+                span.set_attribute("http.status_code", response.status_code)
+        if response.status_code != 200:
+            raise Exception(f"Docling API returned status code {response.status_code}: {response.text}")
+
+        outputs = {}
+        with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+            for member in archive.namelist():
+                if member.endswith(".json"):
+                    outputs[Path(member).stem] = archive.read(member)
+
+        converted = 0
+        for document in documents:
+            output = outputs.get(Path(document["name"]).stem)
+            if output is None:
+                print(f"Docling did not convert {document['name']} in the batch, its conversion stage retries it")
+                continue
+            try:
+                doclingdoc_json = DoclingDocument.model_validate_json(output)
+            except Exception as e:
+                print(f"Invalid DoclingDocument for {document['name']}, its conversion stage retries it. {e}")
+                continue
+            s3_client.put_object(
+                Bucket=manifest_bucket,
+                Key=document["checkpoint_key"],
+                Body=doclingdoc_json.model_dump_json().encode("utf-8"),
+                ContentType="application/json",
+            )
+            meter.create_counter("ingestion_pages", unit="{page}", description="Pages converted by docling serve").add(
+                len(doclingdoc_json.pages), {"stage": "batch_conversion"}
+            )
+            converted += 1
+        print(f"Converted {converted} of {len(documents)} documents in one request")
+        return converted
+
+    async def convert_batches():
+        print("Starting batch conversion stage")
+        if int(os.environ.get("DOCLING_BATCH_MAX_DOCUMENTS", 20)) < 2:
+            print("Batched conversion is disabled")
+            return 0
+        with open(DOCLING_CONFIG_LOCATION, "r") as f:
+            conversion_options = json.load(f)
+        # The same hash the ingestion stage puts in the metadata
+        conversion_options_hash = hashlib.sha256(
+            json.dumps(conversion_options, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        ).hexdigest()
+
+        s3_client = boto3.client(
+            "s3",
+            endpoint_url=os.environ.get("s3_url"),
+            aws_access_key_id=os.environ.get("aws_access_key_id"),
+            aws_secret_access_key=os.environ.get("aws_secret_access_key"),
+            region_name=os.environ.get("aws_region", "us-east-1"),
+            use_ssl=False
+        )
+        manifest_bucket = os.environ.get("INGESTION_MANIFEST_BUCKET", "ingestion-manifest")
+
+        with tracer.start_as_current_span("select") as span:
+            documents = select_documents(s3_client, manifest_bucket, conversion_options, conversion_options_hash)
+            span.set_attribute("docling.documents", len(documents))
+        # A document alone in its request is left to its conversion stage
+        requests = [request for request in pack_requests(documents) if len(request["documents"]) > 1]
+        batched = sum(len(request["documents"]) for request in requests)
+        print(f"{batched} of {len(ingestion_document_s3_locations)} documents in {len(requests)} batched requests")
+        if not requests:
+            return 0
+
+        docling_timeout = int(os.environ.get("DOCLING_TIMEOUT", 600))
+        batch_timeout = int(os.environ.get("DOCLING_BATCH_TIMEOUT", docling_timeout))
+        concurrency = asyncio.Semaphore(int(os.environ.get("DOCLING_BATCH_CONCURRENCY", 2)))
+        batched_documents = meter.create_counter(
+            "ingestion_batched_documents", unit="{document}", description="Documents sent in multi-document requests"
+        )
+
+        async with httpx.AsyncClient(timeout=docling_timeout) as client:
+            async def convert(request):
+                async with concurrency:
+                    try:
+                        converted = await convert_request(client, s3_client, manifest_bucket, request)
+                    except Exception as e:
+                        # Left to the documents' own conversion stages
+                        print(f"WARNING: Batched request of {len(request['documents'])} documents failed - "
+                              f"{type(e).__name__}: {e}", file=sys.stderr)
+                        converted = 0
+                batched_documents.add(converted, {"outcome": "converted"})
+                batched_documents.add(len(request["documents"]) - converted, {"outcome": "failed"})
+                return converted
+
+            tasks = [asyncio.create_task(convert(request)) for request in requests]
+            done, pending = await asyncio.wait(tasks, timeout=batch_timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                print(f"WARNING: {len(pending)} batched requests did not finish within {batch_timeout}s", file=sys.stderr)
+            converted = sum(task.result() for task in done)
+
+        print(f"Batch conversion stage complete, {converted} documents converted")
+        return converted
+
+    dotenv_path = Path(CONFIG_SECRETS_LOCATION+'.env')
+    load_dotenv(dotenv_path=dotenv_path)
+
+    stage_started = time.monotonic()
+    tracer, meter, stage_span = start_stage_span("batch_conversion_stage", {})
+    profile = start_profiling(profile_stage)
+    stage_span.set_attribute("batch.documents", len(ingestion_document_s3_locations))
+
+    try:
+        res = asyncio.run(convert_batches())
+        write_profile("batch_conversion_stage", profile, profile_stacks, profile_summary)
+        end_stage_span("batch_conversion", stage_span, meter, stage_started)
+        return res
+    except Exception as e:
+        # Best effort: every per-document task runs after this stage and converts on its own
+        print(f"WARNING: Batch conversion failed, documents are converted one by one - {type(e).__name__}: {e}",
+              file=sys.stderr)
+        write_profile("batch_conversion_stage", profile, profile_stacks, profile_summary)
+        end_stage_span("batch_conversion", stage_span, meter, stage_started, error=e)
+        return 0
+
+
 @dsl.component(
-    base_image="registry.redhat.io/ubi10/python-312-minimal", packages_to_install=["docling-core", "pymilvus","transformers","numpy","tree-sitter","docling-core[chunking]"]
+    base_image="registry.redhat.io/ubi10/python-312-minimal",
+    packages_to_install=[
+        "boto3", "docling-core", "pymilvus", "transformers", "numpy", "tree-sitter", "docling-core[chunking]",
+        "opentelemetry-sdk", "opentelemetry-exporter-otlp-proto-http",
+    ],
 )
 def storage_stage(
-    input_document_metadata: Dict[str, str]
+    input_document_metadata: Dict[str, str],
+    docling_document: Input[Artifact],
+    embed_model_id: str,
+    chunk_max_tokens: int,
+    profile_stacks: Output[Artifact],
+    profile_summary: Output[Markdown],
+    profile_stage: bool = False,
 ):
     """Storage Stage: Chunk DoclingDocument and write to Milvus"""
     import os
     import sys
     import json
+    import time
+    import boto3
     from docling_core.types.doc.document import DoclingDocument
     from docling_core.transforms.chunker.hybrid_chunker import HybridChunker
     from dotenv import load_dotenv
@@ -257,6 +1671,8 @@ def storage_stage(
         FieldSchema,
         CollectionSchema,
         DataType,
+        Function,
+        FunctionType,
         utility,
     )
     # from docling_core.transforms.chunker.hybrid_chunker import HybridChunker
@@ -264,13 +1680,175 @@ def storage_stage(
     from docling_core.transforms.chunker.tokenizer.huggingface import HuggingFaceTokenizer
     from transformers import AutoTokenizer
     import numpy as np  
+    from opentelemetry import context as otel_context, metrics, propagate, trace
 
 
     CONFIG_SECRETS_LOCATION = "/tmp/ingestion-config/"
-    TASK_STORAGE="/storage/"
     S3_BUCKET_NAME="s3_bucket_name"
     DOCUMENT_NAME="document_name"
     FILE_MD5_HASH="file_md5_hash"
+    CONVERSION_OPTIONS_HASH="conversion_options_hash"
+    TELEMETRY_SCOPE="rag_ingestion"
+    PROFILE_INTERVAL=0.01
+    PROFILE_TOP_FRAMES=25
+    # Propagated through the metadata for tracing, not stored with the chunks
+
+    def start_stage_span(stage, carrier):
+        """Start the stage span, exporting to OTEL_EXPORTER_OTLP_ENDPOINT when it is set
+
+        The span continues the trace whose W3C context the carrier holds,
+        without an endpoint the tracer and meter are no-ops.
+        """
+        if os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT"):
+            from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            from opentelemetry.sdk.metrics import MeterProvider
+            from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+            import uuid
+
+            # Every pod reports its own cumulative counters, the instance keeps their series apart
+            resource = Resource.create({
+                "service.name": os.environ.get("OTEL_SERVICE_NAME", "rag-ingestion"),
+                "service.instance.id": os.environ.get("HOSTNAME") or str(uuid.uuid4()),
+            })
+            tracer_provider = TracerProvider(resource=resource)
+            tracer_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+            trace.set_tracer_provider(tracer_provider)
+            metrics.set_meter_provider(MeterProvider(
+                resource=resource,
+                metric_readers=[PeriodicExportingMetricReader(OTLPMetricExporter())],
+            ))
+        span = trace.get_tracer(TELEMETRY_SCOPE).start_span(stage, context=propagate.extract(carrier or {}))
+        otel_context.attach(trace.set_span_in_context(span))
+        return trace.get_tracer(TELEMETRY_SCOPE), metrics.get_meter(TELEMETRY_SCOPE), span
+
+    def manifest_trace_context(metadata):
+        """W3C context of the document's trace, from the progress record the ingestion stage wrote
+
+        It is not in the metadata, which is part of the KFP cache key.
+        """
+        if not os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT") or FILE_MD5_HASH not in metadata:
+            return {}
+        import boto3
+
+        s3_client = boto3.client(
+            "s3",
+            endpoint_url=os.environ.get("s3_url"),
+            aws_access_key_id=os.environ.get("aws_access_key_id"),
+            aws_secret_access_key=os.environ.get("aws_secret_access_key"),
+            region_name=os.environ.get("aws_region", "us-east-1"),
+            use_ssl=False
+        )
+        manifest_bucket = os.environ.get("INGESTION_MANIFEST_BUCKET", "ingestion-manifest")
+        progress_key = f"{metadata[S3_BUCKET_NAME]}/{metadata[FILE_MD5_HASH]}.json"
+        try:
+            progress = json.loads(s3_client.get_object(Bucket=manifest_bucket, Key=progress_key)["Body"].read())
+        except Exception as e:
+            print(f"WARNING: No trace context from the ingestion manifest - {type(e).__name__}: {e}", file=sys.stderr)
+            return {}
+        return progress.get("trace_context", {})
+
+    def end_stage_span(stage, span, meter, started, outcome="success", error=None):
+        """Record the stage outcome and flush telemetry before the pod exits"""
+        if error is not None:
+            outcome = "failed"
+            span.record_exception(error)
+            span.set_status(trace.Status(trace.StatusCode.ERROR, f"{type(error).__name__}: {error}"))
+        attributes = {"stage": stage, "outcome": outcome}
+        meter.create_counter(
+            "ingestion_documents", unit="{document}", description="Documents processed by an ingestion stage"
+        ).add(1, attributes)
+        meter.create_histogram(
+            "ingestion_stage_duration", unit="s", description="Duration of an ingestion stage"
+        ).record(time.monotonic() - started, attributes)
+        span.end()
+        for provider in (trace.get_tracer_provider(), metrics.get_meter_provider()):
+            if hasattr(provider, "shutdown"):
+                provider.shutdown()
+
+    def start_profiling(enabled):
+        """Sample the stage's stack and RSS every PROFILE_INTERVAL seconds when enabled"""
+        if not enabled:
+            return None
+        import threading
+
+        profile = {"stacks": {}, "peak_rss": 0, "peak_stack": "", "started": time.monotonic(), "stop": threading.Event()}
+        thread_id = threading.get_ident()
+        page_size = os.sysconf("SC_PAGE_SIZE")
+
+        def sample():
+            while not profile["stop"].wait(PROFILE_INTERVAL):
+                frame = sys._current_frames().get(thread_id)
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack = ";".join(reversed(frames))
+                profile["stacks"][stack] = profile["stacks"].get(stack, 0) + 1
+                with open("/proc/self/statm") as statm:
+                    rss = int(statm.read().split()[1]) * page_size
+                if rss > profile["peak_rss"]:
+                    profile["peak_rss"], profile["peak_stack"] = rss, stack
+
+        profile["sampler"] = threading.Thread(target=sample, daemon=True)
+        profile["sampler"].start()
+        return profile
+
+    def write_profile(stage, profile, profile_stacks, profile_summary):
+        """Write the sampled stacks in folded format for flamegraph tools, and a summary for the run UI"""
+        if profile is None:
+            open(profile_stacks.path, "w").close()
+            with open(profile_summary.path, "w") as f:
+                f.write(f"Profiling of {stage} is disabled, enable it with the profile_stages parameter\n")
+            return
+        import resource
+
+        profile["stop"].set()
+        profile["sampler"].join()
+        wall_seconds = time.monotonic() - profile["started"]
+        # ru_maxrss is in KiB on Linux and covers the whole pod process
+        peak_rss = max(profile["peak_rss"], resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+        stacks = profile["stacks"]
+        total = sum(stacks.values()) or 1
+
+        with open(profile_stacks.path, "w") as f:
+            for stack, count in sorted(stacks.items()):
+                f.write(f"{stack} {count}\n")
+        profile_stacks.metadata["format"] = "folded"
+        profile_stacks.metadata["samples"] = total
+        profile_stacks.metadata["wall_seconds"] = round(wall_seconds, 3)
+        profile_stacks.metadata["peak_rss_mib"] = round(peak_rss / 2**20, 1)
+
+        self_samples = {}
+        total_samples = {}
+        for stack, count in stacks.items():
+            frames = stack.split(";")
+            self_samples[frames[-1]] = self_samples.get(frames[-1], 0) + count
+            for frame in set(frames):
+                total_samples[frame] = total_samples.get(frame, 0) + count
+
+        lines = [
+            f"# {stage} profile",
+            "",
+            f"- Wall time: {wall_seconds:.2f} s, {total} samples every {PROFILE_INTERVAL * 1000:.0f} ms",
+            f"- Peak RSS: {peak_rss / 2**20:.1f} MiB",
+            "",
+            "Open the profile_stacks artifact in speedscope or flamegraph.pl for a flamegraph.",
+        ]
+        for title, samples in (("Self", self_samples), ("Total", total_samples)):
+            lines += ["", f"## Top frames by {title.lower()} samples", "", "| Samples | % | Frame |", "|---:|---:|---|"]
+            for frame, count in sorted(samples.items(), key=lambda item: -item[1])[:PROFILE_TOP_FRAMES]:
+                lines.append(f"| {count} | {100 * count / total:.1f} | `{frame}` |")
+        lines += ["", "## Stack at the highest sampled RSS", "", "```"]
+        lines += profile["peak_stack"].split(";")
+        lines.append("```")
+        with open(profile_summary.path, "w") as f:
+            f.write("\n".join(lines) + "\n")
 
     print("Starting storage stage")        
     dotenv_path = Path(CONFIG_SECRETS_LOCATION+'.env')
@@ -278,10 +1856,17 @@ def storage_stage(
 
     milvus_host = os.environ.get("MILVUS_HOST", "my-release-milvus.milvus.svc.cluster.local")
     milvus_port = os.environ.get("MILVUS_PORT", "19530")
+    manifest_bucket = os.environ.get("INGESTION_MANIFEST_BUCKET", "ingestion-manifest")
+    milvus_bm25 = os.environ.get("MILVUS_BM25", "true").lower() == "true"
+
+    stage_started = time.monotonic()
+    tracer, meter, stage_span = start_stage_span("storage_stage", manifest_trace_context(input_document_metadata))
+    profile = start_profiling(profile_stage)
+    stage_span.set_attribute("document.name", input_document_metadata.get(DOCUMENT_NAME, ""))
 
     try:
-        # Read metadata from previous stage
-        source_file = TASK_STORAGE+input_document_metadata[FILE_MD5_HASH]+'.json'
+        # Read DoclingDocument artifact from previous stage
+        source_file = docling_document.path
 
         # Verify the file exists and read it
         if not os.path.exists(source_file):
@@ -298,7 +1883,8 @@ def storage_stage(
         document_metadata = input_document_metadata
 
         # Deserialize JSON to DoclingDocument
-        docling_document = DoclingDocument.model_validate_json(ingested_content)
+        with tracer.start_as_current_span("docling.validate", attributes={"document.bytes": len(ingested_content)}):
+            docling_document = DoclingDocument.model_validate_json(ingested_content)
 
         print("Successfully loaded DoclingDocument")
         print(
@@ -330,7 +1916,7 @@ def storage_stage(
                     name="id", dtype=DataType.INT64, is_primary=True, auto_id=True
                 ),
                 FieldSchema(
-                    name="chunk_text", dtype=DataType.VARCHAR, max_length=65535
+                    name="chunk_text", dtype=DataType.VARCHAR, max_length=65535, enable_analyzer=milvus_bm25
                 ),
                 FieldSchema(
                     name="document_name", dtype=DataType.VARCHAR, max_length=512
@@ -343,8 +1929,18 @@ def storage_stage(
                     name="chunk_vector", dtype=DataType.FLOAT_VECTOR, dim=4096
                 ),
             ]
+            functions = []
+            if milvus_bm25:
+                # Milvus computes the BM25 term weights of chunk_text on insert, for hybrid search
+                fields.append(FieldSchema(name="chunk_sparse", dtype=DataType.SPARSE_FLOAT_VECTOR))
+                functions.append(Function(
+                    name="chunk_text_bm25",
+                    function_type=FunctionType.BM25,
+                    input_field_names=["chunk_text"],
+                    output_field_names=["chunk_sparse"],
+                ))
             schema = CollectionSchema(
-                fields=fields, description=f"Document chunks from {collection_name}"
+                fields=fields, functions=functions, description=f"Document chunks from {collection_name}"
             )
             collection = Collection(name=collection_name, schema=schema)
             print(f"Collection {collection_name} created successfully")
@@ -352,10 +1948,78 @@ def storage_stage(
             print(f"Using existing collection: {collection_name}")
             collection = Collection(name=collection_name)
 
-        EMBED_MODEL_ID = "sentence-transformers/all-MiniLM-L6-v2"
+        # Filtering on document rows needs a loaded, and therefore indexed, collection
+        indexed_fields = {index.field_name for index in collection.indexes}
+        if "chunk_vector" not in indexed_fields:
+            collection.create_index(
+                field_name="chunk_vector",
+                index_params={"index_type": "AUTOINDEX", "metric_type": "COSINE"},
+            )
+        if "chunk_sparse" not in indexed_fields and any(field.name == "chunk_sparse" for field in collection.schema.fields):
+            collection.create_index(
+                field_name="chunk_sparse",
+                index_params={"index_type": "SPARSE_INVERTED_INDEX", "metric_type": "BM25"},
+            )
+        collection.load()
+        # reindex_collection.py may have changed the vector size or precision
+        vector_field = next(field for field in collection.schema.fields if field.name == "chunk_vector")
+        vector_dtype = np.float16 if vector_field.dtype == DataType.FLOAT16_VECTOR else np.float32
 
+        # Progress of this document in the ingestion manifest
+        s3_client = boto3.client(
+            "s3",
+            endpoint_url=os.environ.get("s3_url"),
+            aws_access_key_id=os.environ.get("aws_access_key_id"),
+            aws_secret_access_key=os.environ.get("aws_secret_access_key"),
+            region_name=os.environ.get("aws_region", "us-east-1"),
+            use_ssl=False
+        )
+        md5_hash = document_metadata[FILE_MD5_HASH]
+        progress_key = f"{document_metadata[S3_BUCKET_NAME]}/{md5_hash}.json"
+        try:
+            progress = json.loads(s3_client.get_object(Bucket=manifest_bucket, Key=progress_key)["Body"].read())
+        except s3_client.exceptions.NoSuchKey:
+            progress = {FILE_MD5_HASH: md5_hash}
+
+        storage_config = {
+            CONVERSION_OPTIONS_HASH: document_metadata.get(CONVERSION_OPTIONS_HASH),
+            "embed_model_id": embed_model_id,
+            "chunk_max_tokens": chunk_max_tokens,
+        }
+
+        # Rows of this document, the MD5 hash is part of metadata_json. Milvus
+        # string literals take escaped quotes and backslashes but no \u escapes,
+        # so other characters stay as they are
+        document_filter = (
+            f"document_name == {json.dumps(docling_document.origin.filename, ensure_ascii=False)} "
+            f'and metadata_json like "%{md5_hash}%"'
+        )
+        stored_count = collection.query(expr=document_filter, output_fields=["count(*)"])[0]["count(*)"]
+
+        if (
+            progress.get("state") == "stored"
+            and progress.get("storage_config") == storage_config
+            and progress.get("vector_count") == stored_count
+        ):
+            print(f"Document already stored with {stored_count} vectors, skipping")
+            connections.disconnect("default")
+            write_profile("storage_stage", profile, profile_stacks, profile_summary)
+            end_stage_span("storage", stage_span, meter, stage_started, outcome="skipped")
+            return
+
+        if stored_count:
+            # Left over from an interrupted or outdated run, replace them
+            print(f"Deleting {stored_count} existing chunks of this document")
+            collection.delete(expr=document_filter)
+
+        print(f"Chunking with tokenizer {embed_model_id} max tokens {chunk_max_tokens or 'model default'}")
+
+        tokenizer_kwargs = {}
+        if chunk_max_tokens > 0:
+            tokenizer_kwargs["max_tokens"] = chunk_max_tokens
         tokenizer = HuggingFaceTokenizer(
-            tokenizer=AutoTokenizer.from_pretrained(EMBED_MODEL_ID),
+            tokenizer=AutoTokenizer.from_pretrained(embed_model_id),
+            **tokenizer_kwargs,
         )
         chunker = HybridChunker(tokenizer=tokenizer)
 
@@ -367,16 +2031,25 @@ def storage_stage(
         chunk_indices = []
         metadata_jsons = []
         chunk_vectors=[]
+        metadata_json = json.dumps(document_metadata)
 
-        for idx, chunk in enumerate(chunk_iter):
-            enriched_text = chunker.contextualize(chunk=chunk)
-            chunk_texts.append(enriched_text)
-            document_names.append(docling_document.origin.filename)
-            chunk_indices.append(idx)
-            metadata_jsons.append(json.dumps(document_metadata))
-            chunk_vectors.append(np.random.rand(4096).astype(np.float32))
+        with tracer.start_as_current_span("chunk") as span:
+            for idx, chunk in enumerate(chunk_iter):
+                enriched_text = chunker.contextualize(chunk=chunk)
+                chunk_texts.append(enriched_text)
+                document_names.append(docling_document.origin.filename)
+                chunk_indices.append(idx)
+                metadata_jsons.append(metadata_json)
+            span.set_attribute("chunk.count", len(chunk_texts))
 
         chunk_count = len(chunk_texts)
+        meter.create_counter("ingestion_chunks", unit="{chunk}", description="Chunks produced from documents").add(
+            chunk_count, {"stage": "storage"}
+        )
+
+        with tracer.start_as_current_span("embed", attributes={"embed.model": embed_model_id, "chunk.count": chunk_count}):
+            for _ in range(chunk_count):
+                chunk_vectors.append(np.random.rand(vector_field.params["dim"]).astype(vector_dtype))
 
         # Insert chunks into Milvus
         print(
@@ -385,19 +2058,42 @@ def storage_stage(
 
         entities = [chunk_texts, document_names, chunk_indices, metadata_jsons,chunk_vectors]
 
-        insert_result = collection.insert(entities)
-        collection.flush()
+        with tracer.start_as_current_span("milvus.insert", attributes={"milvus.collection": collection_name}):
+            insert_result = collection.insert(entities)
+        with tracer.start_as_current_span("milvus.flush", attributes={"milvus.collection": collection_name}):
+            collection.flush()
+        meter.create_counter("ingestion_vectors", unit="{vector}", description="Vectors inserted into Milvus").add(
+            chunk_count, {"stage": "storage", "collection": collection_name}
+        )
         print(f"Num entities {collection.num_entities}")
 
         print(f"Successfully inserted {chunk_count} chunks into Milvus")
         print(f"Insert result: {insert_result}")
 
+        progress.update({
+            "state": "stored",
+            "storage_config": storage_config,
+            "vector_count": chunk_count,
+            "collection_name": collection_name,
+            "updated_at": time.time(),
+        })
+        s3_client.put_object(
+            Bucket=manifest_bucket,
+            Key=progress_key,
+            Body=json.dumps(progress).encode("utf-8"),
+            ContentType="application/json",
+        )
+
         # Disconnect from Milvus
         connections.disconnect("default")
         print("Disconnected from Milvus")
+        write_profile("storage_stage", profile, profile_stacks, profile_summary)
+        end_stage_span("storage", stage_span, meter, stage_started)
 
     except FileNotFoundError as fnf:
         print(f"ERROR: {fnf}", file=sys.stderr)
+        write_profile("storage_stage", profile, profile_stacks, profile_summary)
+        end_stage_span("storage", stage_span, meter, stage_started, error=fnf)
         sys.exit(1)
     except Exception as e:
         print(
@@ -407,102 +2103,489 @@ def storage_stage(
         import traceback
 
         traceback.print_exc()
+        write_profile("storage_stage", profile, profile_stacks, profile_summary)
+        end_stage_span("storage", stage_span, meter, stage_started, error=e)
         sys.exit(1)
 
     print("\n" + "=" * 80)
     print("Pipeline complete")
 
 
-@dsl.pipeline(
-    name="rag_ingest",
-    description="Document ingestion pipeline: S3 ingestion, docling conversion, and Milvus storage",
+@dsl.component(
+    base_image="registry.redhat.io/ubi10/python-312-minimal",
+    packages_to_install=["boto3", "httpx", "dotenv", "opentelemetry-sdk", "opentelemetry-exporter-otlp-proto-http"],
 )
-def doc_ingestion_pl(
-    document_metadata: Dict[str, str] = {},
-    ingestion_document_s3_location: str = "s3://doc-ingestion/",
-): 
+def storage_worker_stage(
+    input_document_metadata: Dict[str, str],
+    docling_document: Input[Artifact],
+    embed_model_id: str,
+    chunk_max_tokens: int,
+    profile_stacks: Output[Artifact],
+    profile_summary: Output[Markdown],
+    profile_stage: bool = False,
+):
+    """Storage Stage on the storage worker: Hand the DoclingDocument to storage_worker.py and wait until it is stored
+
+    The worker keeps the tokenizer, chunker and Milvus connection warm
+    between documents, this stage only enqueues the job.
+    """
+    import os
+    import sys
+    import json
+    import time
+    import httpx
+    from dotenv import load_dotenv
+    from pathlib import Path
+    from opentelemetry import context as otel_context, metrics, propagate, trace
+
+    CONFIG_SECRETS_LOCATION = "/tmp/ingestion-config/"
+    S3_BUCKET_NAME="s3_bucket_name"
+    DOCUMENT_NAME="document_name"
+    FILE_MD5_HASH="file_md5_hash"
+    WORKER_POLL_SECONDS=30
+    TELEMETRY_SCOPE="rag_ingestion"
+    PROFILE_INTERVAL=0.01
+    PROFILE_TOP_FRAMES=25
+
+    def start_stage_span(stage, carrier):
+        """Start the stage span, exporting to OTEL_EXPORTER_OTLP_ENDPOINT when it is set
+
+        The span continues the trace whose W3C context the carrier holds,
+        without an endpoint the tracer and meter are no-ops.
+        """
+        if os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT"):
+            from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            from opentelemetry.sdk.metrics import MeterProvider
+            from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+            import uuid
+
+            # Every pod reports its own cumulative counters, the instance keeps their series apart
+            resource = Resource.create({
+                "service.name": os.environ.get("OTEL_SERVICE_NAME", "rag-ingestion"),
+                "service.instance.id": os.environ.get("HOSTNAME") or str(uuid.uuid4()),
+            })
+            tracer_provider = TracerProvider(resource=resource)
+            tracer_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+            trace.set_tracer_provider(tracer_provider)
+            metrics.set_meter_provider(MeterProvider(
+                resource=resource,
+                metric_readers=[PeriodicExportingMetricReader(OTLPMetricExporter())],
+            ))
+        span = trace.get_tracer(TELEMETRY_SCOPE).start_span(stage, context=propagate.extract(carrier or {}))
+        otel_context.attach(trace.set_span_in_context(span))
+        return trace.get_tracer(TELEMETRY_SCOPE), metrics.get_meter(TELEMETRY_SCOPE), span
+
+    def manifest_trace_context(metadata):
+        """W3C context of the document's trace, from the progress record the ingestion stage wrote
+
+        It is not in the metadata, which is part of the KFP cache key.
+        """
+        if not os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT") or FILE_MD5_HASH not in metadata:
+            return {}
+        import boto3
+
+        s3_client = boto3.client(
+            "s3",
+            endpoint_url=os.environ.get("s3_url"),
+            aws_access_key_id=os.environ.get("aws_access_key_id"),
+            aws_secret_access_key=os.environ.get("aws_secret_access_key"),
+            region_name=os.environ.get("aws_region", "us-east-1"),
+            use_ssl=False
+        )
+        manifest_bucket = os.environ.get("INGESTION_MANIFEST_BUCKET", "ingestion-manifest")
+        progress_key = f"{metadata[S3_BUCKET_NAME]}/{metadata[FILE_MD5_HASH]}.json"
+        try:
+            progress = json.loads(s3_client.get_object(Bucket=manifest_bucket, Key=progress_key)["Body"].read())
+        except Exception as e:
+            print(f"WARNING: No trace context from the ingestion manifest - {type(e).__name__}: {e}", file=sys.stderr)
+            return {}
+        return progress.get("trace_context", {})
+
+    def end_stage_span(stage, span, meter, started, outcome="success", error=None):
+        """Record the stage outcome and flush telemetry before the pod exits"""
+        if error is not None:
+            outcome = "failed"
+            span.record_exception(error)
+            span.set_status(trace.Status(trace.StatusCode.ERROR, f"{type(error).__name__}: {error}"))
+        attributes = {"stage": stage, "outcome": outcome}
+        meter.create_counter(
+            "ingestion_documents", unit="{document}", description="Documents processed by an ingestion stage"
+        ).add(1, attributes)
+        meter.create_histogram(
+            "ingestion_stage_duration", unit="s", description="Duration of an ingestion stage"
+        ).record(time.monotonic() - started, attributes)
+        span.end()
+        for provider in (trace.get_tracer_provider(), metrics.get_meter_provider()):
+            if hasattr(provider, "shutdown"):
+                provider.shutdown()
+
+    def start_profiling(enabled):
+        """Sample the stage's stack and RSS every PROFILE_INTERVAL seconds when enabled"""
+        if not enabled:
+            return None
+        import threading
+
+        profile = {"stacks": {}, "peak_rss": 0, "peak_stack": "", "started": time.monotonic(), "stop": threading.Event()}
+        thread_id = threading.get_ident()
+        page_size = os.sysconf("SC_PAGE_SIZE")
+
+        def sample():
+            while not profile["stop"].wait(PROFILE_INTERVAL):
+                frame = sys._current_frames().get(thread_id)
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack = ";".join(reversed(frames))
+                profile["stacks"][stack] = profile["stacks"].get(stack, 0) + 1
+                with open("/proc/self/statm") as statm:
+                    rss = int(statm.read().split()[1]) * page_size
+                if rss > profile["peak_rss"]:
+                    profile["peak_rss"], profile["peak_stack"] = rss, stack
+
+        profile["sampler"] = threading.Thread(target=sample, daemon=True)
+        profile["sampler"].start()
+        return profile
+
+    def write_profile(stage, profile, profile_stacks, profile_summary):
+        """Write the sampled stacks in folded format for flamegraph tools, and a summary for the run UI"""
+        if profile is None:
+            open(profile_stacks.path, "w").close()
+            with open(profile_summary.path, "w") as f:
+                f.write(f"Profiling of {stage} is disabled, enable it with the profile_stages parameter\n")
+            return
+        import resource
+
+        profile["stop"].set()
+        profile["sampler"].join()
+        wall_seconds = time.monotonic() - profile["started"]
+        # ru_maxrss is in KiB on Linux and covers the whole pod process
+        peak_rss = max(profile["peak_rss"], resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+        stacks = profile["stacks"]
+        total = sum(stacks.values()) or 1
+
+        with open(profile_stacks.path, "w") as f:
+            for stack, count in sorted(stacks.items()):
+                f.write(f"{stack} {count}\n")
+        profile_stacks.metadata["format"] = "folded"
+        profile_stacks.metadata["samples"] = total
+        profile_stacks.metadata["wall_seconds"] = round(wall_seconds, 3)
+        profile_stacks.metadata["peak_rss_mib"] = round(peak_rss / 2**20, 1)
+
+        self_samples = {}
+        total_samples = {}
+        for stack, count in stacks.items():
+            frames = stack.split(";")
+            self_samples[frames[-1]] = self_samples.get(frames[-1], 0) + count
+            for frame in set(frames):
+                total_samples[frame] = total_samples.get(frame, 0) + count
+
+        lines = [
+            f"# {stage} profile",
+            "",
+            f"- Wall time: {wall_seconds:.2f} s, {total} samples every {PROFILE_INTERVAL * 1000:.0f} ms",
+            f"- Peak RSS: {peak_rss / 2**20:.1f} MiB",
+            "",
+            "Open the profile_stacks artifact in speedscope or flamegraph.pl for a flamegraph.",
+        ]
+        for title, samples in (("Self", self_samples), ("Total", total_samples)):
+            lines += ["", f"## Top frames by {title.lower()} samples", "", "| Samples | % | Frame |", "|---:|---:|---|"]
+            for frame, count in sorted(samples.items(), key=lambda item: -item[1])[:PROFILE_TOP_FRAMES]:
+                lines.append(f"| {count} | {100 * count / total:.1f} | `{frame}` |")
+        lines += ["", "## Stack at the highest sampled RSS", "", "```"]
+        lines += profile["peak_stack"].split(";")
+        lines.append("```")
+        with open(profile_summary.path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def store_with_worker():
+        worker_url = os.environ.get("STORAGE_WORKER_URL")
+        if not worker_url:
+            raise ValueError("STORAGE_WORKER_URL is not set, it is needed with the storage_worker parameter")
+        worker_timeout = int(os.environ.get("STORAGE_WORKER_TIMEOUT", 1800))
+
+        source_file = docling_document.path
+        if not os.path.exists(source_file):
+            raise FileNotFoundError(f"Document file not found at {source_file}")
+        with open(source_file, "r", encoding="utf-8") as f:
+            doclingdoc_json = f.read()
+        print(f"Successfully read {len(doclingdoc_json)} bytes from Kubeflow artifact storage")
+
+        # The worker's spans continue this stage's trace
+        headers = {}
+        propagate.inject(headers)
+        with httpx.Client(base_url=worker_url, timeout=WORKER_POLL_SECONDS + 30) as client:
+            with tracer.start_as_current_span("storage_worker.enqueue"):
+                response = client.post("/jobs", headers=headers, json={
+                    "document_metadata": input_document_metadata,
+                    "docling_document": doclingdoc_json,
+                    "embed_model_id": embed_model_id,
+                    "chunk_max_tokens": chunk_max_tokens,
+                })
+                response.raise_for_status()
+            job = response.json()
+            print(f"Queued storage job {job['job_id']} at position {job['position']} on {worker_url}")
+
+            deadline = time.monotonic() + worker_timeout
+            with tracer.start_as_current_span("storage_worker.wait"):
+                while True:
+                    response = client.post(f"/jobs/{job['job_id']}/wait", json={"timeout": WORKER_POLL_SECONDS})
+                    if response.status_code == 404:
+                        raise Exception("Storage worker lost the job, e.g. it restarted")
+                    response.raise_for_status()
+                    result = response.json()
+                    if result["state"] in ("stored", "skipped", "failed"):
+                        break
+                    if time.monotonic() > deadline:
+                        raise TimeoutError(f"Not stored by the storage worker within {worker_timeout}s")
+                    print(f"Storage job {result['state']}")
+
+        if result["state"] == "failed":
+            raise Exception(f"Storage worker failed to store the document - {result['error']}")
+        print(f"Document {result['state']}, {result['result']['vector_count']} vectors "
+              f"in collection {result['result']['collection_name']}")
+        return result["state"]
+
+    print("Starting storage stage on the storage worker")
+    dotenv_path = Path(CONFIG_SECRETS_LOCATION+'.env')
+    load_dotenv(dotenv_path=dotenv_path)
+
+    stage_started = time.monotonic()
+    tracer, meter, stage_span = start_stage_span("storage_stage", manifest_trace_context(input_document_metadata))
+    profile = start_profiling(profile_stage)
+    stage_span.set_attribute("document.name", input_document_metadata.get(DOCUMENT_NAME, ""))
+
+    try:
+        state = store_with_worker()
+        write_profile("storage_stage", profile, profile_stacks, profile_summary)
+        end_stage_span("storage", stage_span, meter, stage_started, outcome="skipped" if state == "skipped" else "success")
+    except ValueError as ve:
+        print(f"ERROR: Invalid input - {ve}", file=sys.stderr)
+        write_profile("storage_stage", profile, profile_stacks, profile_summary)
+        end_stage_span("storage", stage_span, meter, stage_started, error=ve)
+        sys.exit(1)
+    except httpx.HTTPError as http_err:
+        print(f"ERROR: Failed to call the storage worker - {http_err}", file=sys.stderr)
+        write_profile("storage_stage", profile, profile_stacks, profile_summary)
+        end_stage_span("storage", stage_span, meter, stage_started, error=http_err)
+        sys.exit(1)
+    except Exception as e:
+        print(f"ERROR: Failed to process document - {type(e).__name__}: {e}", file=sys.stderr)
+        write_profile("storage_stage", profile, profile_stacks, profile_summary)
+        end_stage_span("storage", stage_span, meter, stage_started, error=e)
+        sys.exit(1)
+
+    print("\n" + "=" * 80)
+    print("Pipeline complete")
+
+
+def add_document_tasks(
+    ingestion_document_s3_location,
+    document_metadata,
+    embed_model_id,
+    chunk_max_tokens,
+    profile_stages,
+    storage_worker=False,
+    batch_conversion_task=None,
+):
+    """Add the ingestion, conversion and storage tasks for one document to the current pipeline
+
+    The tasks wait for batch_conversion_task when given, so that the
+    conversion resumes from the checkpoints it wrote.
+    """
     import os
     CONFIG_SECRETS_LOCATION = "/tmp/ingestion-config/"
+    DOCLING_CONFIG_LOCATION = "/tmp/docling-config/"
 
     conversion_timeout = os.environ.get("DOCLING_TIMEOUT", 600)
-    # pvc1 = kubernetes.CreatePVC(
-    #     pvc_name_suffix='-ingest',
-    #     access_modes=['ReadWriteOnce'],
-    #     size='5Gi',
-    #     storage_class_name="gp3-csi"
-    # )
-    pvc1 = kubernetes.CreatePVC(
-        # can also use pvc_name instead of pvc_name_suffix to use a pre-existing PVC
-        pvc_name_suffix='-my-pvc',
-        access_modes=['ReadWriteOnce'],
-        size='5Gi',
-        storage_class_name='gp3-csi',
-    )
-   
-    """Define the document ingestion pipeline"""
-    # Ingestion Stage: Read from S3 and write to Kubeflow artifact storage
+    admission_timeout = os.environ.get("DOCLING_ADMISSION_TIMEOUT", 1800)
+
+    # Ingestion Stage: Identify the document in S3 by content hash. Never cached,
+    # the S3 location alone says nothing about the content behind it.
     ingestion_stage_task = ingestion_stage(
         ingestion_document_s3_location=ingestion_document_s3_location,
         document_metadata=document_metadata,
+        profile_stage=profile_stages,
+    ).set_caching_options(False)
+    if batch_conversion_task is not None:
+        ingestion_stage_task.after(batch_conversion_task)
+
+    # Conversion Stage: Convert document to DoclingDocument (keyed on file_md5_hash and conversion_options_hash).
+    # Lightweight formats are converted in the task, everything else by docling serve.
+    with dsl.If(ingestion_stage_task.outputs["conversion_route"] == "local", name="convert-locally"):
+        local_conversion_stage_task = local_conversion_stage(
+            input_document_metadata=ingestion_stage_task.outputs["document_metadata"],
+            profile_stage=profile_stages,
+            conversion_route="local",
+        ).set_caching_options(True)
+    with dsl.Else(name="convert-with-docling-serve"):
+        conversion_stage_task = conversion_stage(
+            input_document_metadata=ingestion_stage_task.outputs["document_metadata"],
+            profile_stage=profile_stages,
+        ).set_caching_options(True)
+
+
+    # Storage Stage: Chunk and store DoclingDocument (keyed on the cached DoclingDocument artifact and chunker/embedding config)
+    storage_inputs = dict(
+        input_document_metadata=dsl.OneOf(
+            local_conversion_stage_task.outputs["Output"], conversion_stage_task.outputs["Output"]
+        ),
+        docling_document=dsl.OneOf(
+            local_conversion_stage_task.outputs["docling_document"], conversion_stage_task.outputs["docling_document"]
+        ),
+        embed_model_id=embed_model_id,
+        chunk_max_tokens=chunk_max_tokens,
+        profile_stage=profile_stages,
     )
+    # Either on the warm storage worker or with the whole setup in the task
+    with dsl.If(storage_worker == True, name="store-with-worker"):
+        storage_worker_stage_task = storage_worker_stage(**storage_inputs).set_caching_options(True)
+        # A full queue or a restarted worker fails the task, the retry resumes from the manifest
+        storage_worker_stage_task.set_retry(num_retries=3, backoff_duration="60s", backoff_factor=2)
+    with dsl.Else(name="store-in-task"):
+        storage_stage_task = storage_stage(**storage_inputs).set_caching_options(True)
 
-    # Conversion Stage: Convert document to DoclingDocument (receives file and metadata from ingestion stage)
-    conversion_stage_task = conversion_stage(
-        input_document_metadata=ingestion_stage_task.output,
-    ).after(ingestion_stage_task)
+    kubernetes.use_secret_as_volume(
+        ingestion_stage_task,
+        secret_name="ingestion-config-secret",
+        mount_path=CONFIG_SECRETS_LOCATION,
+        optional=False,
+    )
 
+    for task in (conversion_stage_task, local_conversion_stage_task):
+        kubernetes.use_secret_as_volume(
+            task,
+            secret_name="ingestion-config-secret",
+            mount_path=CONFIG_SECRETS_LOCATION,
+            optional=False,
+        )
 
-    # Storage Stage: Chunk and store DoclingDocument 
-    storage_stage_task = storage_stage(
-        input_document_metadata=conversion_stage_task.output,
-    ).after(conversion_stage_task)
+    for task in (storage_stage_task, storage_worker_stage_task):
+        kubernetes.use_secret_as_volume(
+            task,
+            secret_name="ingestion-config-secret",
+            mount_path=CONFIG_SECRETS_LOCATION,
+            optional=False,
+        )
 
-    kubernetes.mount_pvc(
+    kubernetes.use_config_map_as_volume(
         ingestion_stage_task,
-        pvc_name=pvc1.outputs['name'],
-        mount_path='/storage',
-    )
- 
-    kubernetes.mount_pvc(
-        conversion_stage_task,
-        pvc_name=pvc1.outputs['name'],
-        mount_path='/storage',
+        config_map_name="docling-client-config",
+        mount_path=DOCLING_CONFIG_LOCATION,
+        optional=False 
     )
 
-    kubernetes.mount_pvc(
-        storage_stage_task,
-        pvc_name=pvc1.outputs['name'],
-        mount_path='/storage',
+    for task in (conversion_stage_task, local_conversion_stage_task):
+        kubernetes.use_config_map_as_volume(
+            task,
+            config_map_name="docling-client-config",
+            mount_path=DOCLING_CONFIG_LOCATION,
+            optional=False 
+        )
+
+    # The stage may queue for docling admission before the conversion itself starts
+    kubernetes.set_timeout(conversion_stage_task,int(conversion_timeout)+int(admission_timeout))
+    kubernetes.set_timeout(local_conversion_stage_task,int(conversion_timeout))
+
+    return storage_stage_task
+
+
+@dsl.pipeline(
+    name="rag_ingest",
+    description="Document ingestion pipeline: S3 ingestion, docling conversion, and Milvus storage",
+)
+def doc_ingestion_pl(
+    document_metadata: Dict[str, str] = {},
+    ingestion_document_s3_location: str = "s3://doc-ingestion/",
+    embed_model_id: str = "sentence-transformers/all-MiniLM-L6-v2",
+    chunk_max_tokens: int = 0,
+    profile_stages: bool = False,
+    storage_worker: bool = False,
+): 
+    """Define the document ingestion pipeline"""
+    add_document_tasks(
+        ingestion_document_s3_location=ingestion_document_s3_location,
+        document_metadata=document_metadata,
+        embed_model_id=embed_model_id,
+        chunk_max_tokens=chunk_max_tokens,
+        profile_stages=profile_stages,
+        storage_worker=storage_worker,
     )
 
+
+@dsl.pipeline(
+    name="rag_ingest_batch",
+    description="Batched document ingestion pipeline: runs the ingestion, conversion and storage stages for each S3 location",
+)
+def doc_batch_ingestion_pl(
+    document_metadata: Dict[str, str] = {},
+    ingestion_document_s3_locations: List[str] = [],
+    embed_model_id: str = "sentence-transformers/all-MiniLM-L6-v2",
+    chunk_max_tokens: int = 0,
+    profile_stages: bool = False,
+    storage_worker: bool = False,
+):
+    """Define the batched document ingestion pipeline, one run covers a whole micro-batch of documents"""
+    import os
+    CONFIG_SECRETS_LOCATION = "/tmp/ingestion-config/"
+    DOCLING_CONFIG_LOCATION = "/tmp/docling-config/"
+
+    # Batch Conversion Stage: Convert the small documents with multi-document
+    # docling serve requests ahead of their own conversion stages
+    batch_conversion_stage_task = batch_conversion_stage(
+        ingestion_document_s3_locations=ingestion_document_s3_locations,
+        profile_stage=profile_stages,
+    ).set_caching_options(False)
+
     kubernetes.use_secret_as_volume(
-        ingestion_stage_task,
+        batch_conversion_stage_task,
         secret_name="ingestion-config-secret",
         mount_path=CONFIG_SECRETS_LOCATION,
         optional=False,
     )
 
     kubernetes.use_config_map_as_volume(
-        conversion_stage_task,
+        batch_conversion_stage_task,
         config_map_name="docling-client-config",
-        mount_path="/tmp/docling-config/",
+        mount_path=DOCLING_CONFIG_LOCATION,
         optional=False 
     )
 
-    kubernetes.set_timeout(conversion_stage_task,conversion_timeout)
-
-
-
-    kubernetes.DeletePVC(
-        pvc_name=pvc1.outputs['name']
-    ).after(storage_stage_task)
-    
+    # Requests still running after DOCLING_BATCH_TIMEOUT are abandoned, the
+    # rest of the timeout leaves time to read the documents
+    batch_timeout = os.environ.get("DOCLING_BATCH_TIMEOUT", os.environ.get("DOCLING_TIMEOUT", 600))
+    kubernetes.set_timeout(batch_conversion_stage_task,2*int(batch_timeout))
+
+    with dsl.ParallelFor(
+        items=ingestion_document_s3_locations,
+        parallelism=BATCH_PARALLELISM,
+    ) as ingestion_document_s3_location:
+        add_document_tasks(
+            ingestion_document_s3_location=ingestion_document_s3_location,
+            document_metadata=document_metadata,
+            embed_model_id=embed_model_id,
+            chunk_max_tokens=chunk_max_tokens,
+            profile_stages=profile_stages,
+            storage_worker=storage_worker,
+            batch_conversion_task=batch_conversion_stage_task,
+        )
 
 
 if __name__ == "__main__":
-    # Compile the pipeline to YAML
+    # Compile the pipelines to YAML
     compiler.Compiler().compile(
         pipeline_func=doc_ingestion_pl,
         package_path="doc_ingestion_pl.yaml",
     )
     print("Pipeline compiled successfully to 'doc_ingestion_pl.yaml'")
+    compiler.Compiler().compile(
+        pipeline_func=doc_batch_ingestion_pl,
+        package_path="doc_batch_ingestion_pl.yaml",
+    )
+    print("Pipeline compiled successfully to 'doc_batch_ingestion_pl.yaml'")
@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Re-embed a Milvus collection into a shadow collection and switch an alias to it
+
+Changing the embedding model or the vector precision of a collection the
+storage stage created would otherwise mean ingesting every document again,
+docling conversion included. This tool reuses the stored chunk_text instead:
+
+1. Scans the primary keys of the collection behind --collection and splits
+   them into --workers contiguous ranges.
+2. Each worker reads its range with query_iterator, embeds the chunk texts
+   in batches of --batch-size through the OpenAI /v1/embeddings API at
+   --embedding-url (e.g. embedding_batcher.py) and inserts them into a new
+   shadow collection, which has no index yet.
+3. Builds the index of the shadow collection and loads it.
+4. Copies the rows the storage stage added or deleted in the meantime,
+   switches the --collection alias to the shadow collection, and copies
+   what was written before the switch once more.
+
+Searches and the storage stage keep using --collection throughout, Milvus
+resolves it to the old collection until the alias is switched. The old
+collection is kept unless --drop-old is given.
+
+--collection must be an alias for the switch to be atomic. A collection
+the storage stage created is a plain collection, --adopt renames it and
+creates the alias in its place the first time, pause ingestion for that.
+
+The shadow collection also gets the storage stage's BM25 sparse field
+unless --no-bm25 is given, which is how collections created before it
+gain hybrid search.
+
+Without --embedding-url the vectors are placeholders like the storage
+stage's, which is only useful to change their size (--dim) or type.
+
+    python reindex_collection.py --collection my_bucket --adopt \\
+        --embedding-url http://embedding-batcher:8080 --embedding-model llama-nemotron-embed-1b-v2
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+VECTOR_FIELD = "chunk_vector"
+SPARSE_FIELD = "chunk_sparse"
+# Fields copied as stored, the primary key is generated again by the shadow collection
+COPIED_FIELDS = ["chunk_text", "document_name", "chunk_index", "metadata_json"]
+# Largest batch query_iterator accepts
+ID_SCAN_BATCH = 16384
+# Primary keys per "id in [...]" filter
+ID_FILTER_BATCH = 1000
+CATCH_UP_ROUNDS = 3
+EMBED_RETRIES = 3
+
+
+class Embedder:
+    """Embeds texts through /v1/embeddings, or returns placeholder vectors without a URL"""
+
+    def __init__(self, url, model, dim, vector_type, timeout=300.0):
+        import numpy as np
+
+        self.url = url.rstrip("/") if url else None
+        self.model = model
+        self.dim = dim
+        self.dtype = np.float16 if vector_type == "float16" else np.float32
+        self.timeout = timeout
+
+    def probe_dim(self):
+        """Embedding size of the model, from one request"""
+        return len(self._request(["dimension probe"])[0])
+
+    def embed(self, texts):
+        import numpy as np
+
+        if not self.url:
+            return [np.random.rand(self.dim).astype(self.dtype) for _ in texts]
+        vectors = self._request(texts)
+        if any(len(vector) != self.dim for vector in vectors):
+            raise ValueError(f"{self.url} returned embeddings that are not of size {self.dim}")
+        return [np.asarray(vector, dtype=self.dtype) for vector in vectors]
+
+    def _request(self, texts):
+        payload = {"input": texts}
+        if self.model:
+            payload["model"] = self.model
+        data = json.dumps(payload).encode("utf-8")
+        for attempt in range(EMBED_RETRIES + 1):
+            try:
+                request = Request(f"{self.url}/v1/embeddings", data=data, headers={"Content-Type": "application/json"})
+                with urlopen(request, timeout=self.timeout) as response:
+                    result = json.loads(response.read())
+                return [item["embedding"] for item in sorted(result["data"], key=lambda item: item["index"])]
+            except HTTPError as e:
+                if e.code < 500 or attempt == EMBED_RETRIES:
+                    raise
+            except URLError:
+                if attempt == EMBED_RETRIES:
+                    raise
+            time.sleep(2 ** attempt)
+
+
+def resolve(name):
+    """Returns (collection behind name, whether name is an alias)"""
+    from pymilvus import utility
+
+    collections = utility.list_collections()
+    if name in collections:
+        return name, False
+    for collection in collections:
+        if name in utility.list_aliases(collection):
+            return collection, True
+    raise ValueError(f"No collection or alias named {name}")
+
+
+def scan_ids(collection):
+    """Every primary key of the collection, sorted"""
+    iterator = collection.query_iterator(batch_size=ID_SCAN_BATCH, expr="id >= 0", output_fields=["id"])
+    ids = []
+    while True:
+        batch = iterator.next()
+        if not batch:
+            iterator.close()
+            break
+        ids.extend(row["id"] for row in batch)
+    return sorted(ids)
+
+
+def split_ranges(ids, parts):
+    """Split sorted ids into at most parts contiguous (first, last) ranges of equal size"""
+    if not ids:
+        return []
+    size = -(-len(ids) // parts)
+    return [(ids[start], ids[min(start + size, len(ids)) - 1]) for start in range(0, len(ids), size)]
+
+
+def create_shadow(source, name, dim, vector_type, bm25):
+    """Collection with the source's fields, a vector field of the new size and type and the BM25 sparse field"""
+    from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, Function, FunctionType
+
+    fields = []
+    for field in source.schema.fields:
+        if field.name == VECTOR_FIELD:
+            dtype = DataType.FLOAT16_VECTOR if vector_type == "float16" else DataType.FLOAT_VECTOR
+            fields.append(FieldSchema(name=VECTOR_FIELD, dtype=dtype, dim=dim))
+        elif field.name == "chunk_text":
+            fields.append(FieldSchema(
+                name="chunk_text", dtype=DataType.VARCHAR, max_length=field.params["max_length"], enable_analyzer=bm25
+            ))
+        elif field.name != SPARSE_FIELD:
+            fields.append(field)
+    functions = []
+    if bm25:
+        # The same as the storage stage creates, Milvus fills it on insert
+        fields.append(FieldSchema(name=SPARSE_FIELD, dtype=DataType.SPARSE_FLOAT_VECTOR))
+        functions.append(Function(
+            name="chunk_text_bm25",
+            function_type=FunctionType.BM25,
+            input_field_names=["chunk_text"],
+            output_field_names=[SPARSE_FIELD],
+        ))
+    schema = CollectionSchema(fields=fields, functions=functions, description=source.schema.description)
+    return Collection(name=name, schema=schema)
+
+
+class Copier:
+    """Copies rows of the source into the shadow collection and remembers where they went"""
+
+    def __init__(self, source, shadow, embedder, batch_size):
+        self.source = source
+        self.shadow = shadow
+        self.embedder = embedder
+        self.batch_size = batch_size
+        # Source primary key -> shadow primary key
+        self.copied = {}
+        self.lock = threading.Lock()
+        self.embed_seconds = 0.0
+
+    def copy_range(self, first, last):
+        iterator = self.source.query_iterator(
+            batch_size=self.batch_size,
+            expr=f"id >= {first} and id <= {last}",
+            output_fields=["id"] + COPIED_FIELDS,
+        )
+        while True:
+            rows = iterator.next()
+            if not rows:
+                iterator.close()
+                break
+            self.insert(rows)
+
+    def copy_ids(self, ids):
+        for start in range(0, len(ids), ID_FILTER_BATCH):
+            rows = self.source.query(
+                expr=f"id in {json.dumps(ids[start:start + ID_FILTER_BATCH])}",
+                output_fields=["id"] + COPIED_FIELDS,
+            )
+            for batch_start in range(0, len(rows), self.batch_size):
+                self.insert(rows[batch_start:batch_start + self.batch_size])
+
+    def insert(self, rows):
+        with self.lock:
+            rows = [row for row in rows if row["id"] not in self.copied]
+        if not rows:
+            return
+        started = time.perf_counter()
+        vectors = self.embedder.embed([row["chunk_text"] for row in rows])
+        embed_seconds = time.perf_counter() - started
+        entities = [[row[field] for row in rows] for field in COPIED_FIELDS] + [vectors]
+        result = self.shadow.insert(entities)
+        with self.lock:
+            self.embed_seconds += embed_seconds
+            self.copied.update(zip((row["id"] for row in rows), result.primary_keys))
+
+    def delete(self, source_ids):
+        with self.lock:
+            shadow_ids = [self.copied.pop(source_id) for source_id in source_ids if source_id in self.copied]
+        for start in range(0, len(shadow_ids), ID_FILTER_BATCH):
+            self.shadow.delete(expr=f"id in {json.dumps(shadow_ids[start:start + ID_FILTER_BATCH])}")
+
+    def catch_up(self):
+        """Copy rows added to the source since they were scanned and drop deleted ones, returns (added, deleted)"""
+        source_ids = set(scan_ids(self.source))
+        with self.lock:
+            added = sorted(source_ids - self.copied.keys())
+            deleted = sorted(self.copied.keys() - source_ids)
+        self.copy_ids(added)
+        self.delete(deleted)
+        return len(added), len(deleted)
+
+
+def count(collection):
+    return collection.query(expr="", output_fields=["count(*)"])[0]["count(*)"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-embed a Milvus collection into a shadow collection and switch an alias to it")
+    parser.add_argument(
+        "--collection",
+        required=True,
+        help="Alias the storage stage and searches use, normally the sanitized bucket name"
+    )
+    parser.add_argument(
+        "--adopt",
+        action="store_true",
+        help="--collection is a plain collection, rename it and create the alias in its place (pause ingestion)"
+    )
+    parser.add_argument(
+        "--embedding-url",
+        help="OpenAI compatible embedding server, without /v1 (default: placeholder vectors)"
+    )
+    parser.add_argument(
+        "--embedding-model",
+        help="Model name sent to --embedding-url"
+    )
+    parser.add_argument(
+        "--dim",
+        type=int,
+        help="Vector size of the shadow collection (default: the size --embedding-url returns, 4096 without it)"
+    )
+    parser.add_argument(
+        "--vector-type",
+        choices=["float32", "float16"],
+        default="float32",
+        help="Vector precision of the shadow collection (default: float32)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Ranges of the collection scanned, embedded and inserted at once (default: 4)"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=256,
+        help="Chunks per embedding request and insert (default: 256)"
+    )
+    parser.add_argument(
+        "--index-params",
+        default='{"index_type": "AUTOINDEX", "metric_type": "COSINE"}',
+        help="Index of the shadow collection as JSON (default: the storage stage's AUTOINDEX with COSINE)"
+    )
+    parser.add_argument(
+        "--no-bm25",
+        action="store_true",
+        help="Leave out the BM25 sparse field, e.g. for Milvus before 2.5"
+    )
+    parser.add_argument(
+        "--drop-old",
+        action="store_true",
+        help="Drop the old collection once the alias points to the shadow collection"
+    )
+    parser.add_argument(
+        "--milvus-host",
+        help="Milvus host (default: MILVUS_HOST from .env)"
+    )
+    parser.add_argument(
+        "--milvus-port",
+        help="Milvus port (default: MILVUS_PORT from .env)"
+    )
+
+    args = parser.parse_args()
+
+    from concurrent.futures import ThreadPoolExecutor
+    from dotenv import load_dotenv
+    from pymilvus import Collection, MilvusException, connections, utility
+
+    load_dotenv()
+    milvus_host = args.milvus_host or os.environ.get("MILVUS_HOST", "localhost")
+    milvus_port = args.milvus_port or os.environ.get("MILVUS_PORT", "19530")
+
+    try:
+        print(f"Connecting to Milvus at {milvus_host}:{milvus_port}")
+        connections.connect(alias="default", host=milvus_host, port=milvus_port)
+        source_name, is_alias = resolve(args.collection)
+        if not is_alias and not args.adopt:
+            print(f"✗ {args.collection} is a collection, not an alias. Pass --adopt to rename it and "
+                  f"serve the shadow collection through an alias named {args.collection}", file=sys.stderr)
+            sys.exit(1)
+        if is_alias and args.adopt:
+            print(f"✗ {args.collection} already is an alias of {source_name}, leave out --adopt", file=sys.stderr)
+            sys.exit(1)
+
+        embedder = Embedder(args.embedding_url, args.embedding_model, args.dim, args.vector_type)
+        if embedder.dim is None:
+            embedder.dim = embedder.probe_dim() if args.embedding_url else 4096
+        source = Collection(source_name)
+        source.load()
+
+        started = time.perf_counter()
+        ids = scan_ids(source)
+        print(f"✓ {len(ids)} chunks in {source_name}{f' (alias {args.collection})' if is_alias else ''}, "
+              f"scanned in {time.perf_counter() - started:.1f}s")
+
+        shadow_name = f"{args.collection}_{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}"
+        shadow = create_shadow(source, shadow_name, embedder.dim, args.vector_type, not args.no_bm25)
+        print(f"Created {shadow_name} with {args.vector_type} vectors of size {embedder.dim}"
+              f"{'' if args.no_bm25 else ' and BM25 sparse vectors'}")
+
+        copier = Copier(source, shadow, embedder, args.batch_size)
+        ranges = split_ranges(ids, args.workers)
+        copy_started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            for future in [executor.submit(copier.copy_range, first, last) for first, last in ranges]:
+                future.result()
+        shadow.flush()
+        copy_seconds = time.perf_counter() - copy_started
+        print(f"✓ Embedded and inserted {len(copier.copied)} chunks in {copy_seconds:.1f}s "
+              f"({len(copier.copied) / copy_seconds if copy_seconds else 0:.0f} chunks/s, "
+              f"{copier.embed_seconds:.1f}s embedding across {len(ranges)} workers)")
+
+        index_started = time.perf_counter()
+        shadow.create_index(field_name=VECTOR_FIELD, index_params=json.loads(args.index_params))
+        if not args.no_bm25:
+            shadow.create_index(
+                field_name=SPARSE_FIELD, index_params={"index_type": "SPARSE_INVERTED_INDEX", "metric_type": "BM25"}
+            )
+        shadow.load()
+        print(f"✓ Built the index and loaded {shadow_name} in {time.perf_counter() - index_started:.1f}s")
+
+        # The storage stage kept writing to the source, get close before switching
+        for _ in range(CATCH_UP_ROUNDS):
+            added, deleted = copier.catch_up()
+            print(f"Caught up with {added} added and {deleted} deleted chunks")
+            if not added and not deleted:
+                break
+
+        if is_alias:
+            utility.alter_alias(shadow_name, args.collection)
+            old_name = source_name
+        else:
+            old_name = f"{args.collection}_retired_{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}"
+            utility.rename_collection(source_name, old_name)
+            try:
+                utility.create_alias(shadow_name, args.collection)
+            except MilvusException as e:
+                print(f"✗ Renamed {source_name} to {old_name} but could not create the alias "
+                      f"{args.collection}, was a collection created under that name in between? {e}", file=sys.stderr)
+                sys.exit(1)
+        print(f"✓ {args.collection} now points to {shadow_name}")
+
+        # Writes that reached the old collection before the switch
+        copier.source = Collection(old_name)
+        # Renaming may have released it
+        copier.source.load()
+        added, deleted = copier.catch_up()
+        shadow.flush()
+        print(f"✓ Copied {added} added and {deleted} deleted chunks from before the switch")
+
+        source_count, shadow_count = count(copier.source), count(shadow)
+        if shadow_count < source_count:
+            print(f"✗ {shadow_name} has {shadow_count} chunks, {old_name} {source_count}, keeping {old_name}",
+                  file=sys.stderr)
+            sys.exit(1)
+        if args.drop_old:
+            utility.drop_collection(old_name)
+            print(f"✓ Dropped {old_name}")
+        else:
+            print(f"Kept {old_name}, drop it once the new embeddings are verified")
+
+        total_seconds = time.perf_counter() - started
+        print("\n" + "=" * 80)
+        print(f"Reindexed {shadow_count} chunks of {args.collection} in {total_seconds:.1f}s "
+              f"({shadow_count / total_seconds if total_seconds else 0:.0f} chunks/s)")
+    except (MilvusException, HTTPError, URLError, ValueError) as e:
+        print(f"✗ Reindex failed: {type(e).__name__}: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        connections.disconnect("default")
+
+
+if __name__ == "__main__":
+    main()
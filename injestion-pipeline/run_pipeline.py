@@ -1,12 +1,27 @@
 #!/usr/bin/env python3
 """
 Helper script to compile and optionally submit the Kubeflow pipeline
+
+Submits a single document with --s3-location, or bulk ingests every document
+of a manifest (--manifest) or S3 prefix (--s3-prefix). Bulk runs are
+submitted with a rate limit and a cap on in-flight runs, polled until they
+finish, retried on failure and summarised with throughput statistics.
 """
 
 import argparse
+import json
+import math
+import os
+import sys
+import time
+from collections import deque
+from urllib.parse import urlparse
 from kfp import compiler
 from kubeflow_pipeline import doc_ingestion_pl
 
+TERMINAL_STATES = {"SUCCEEDED", "SKIPPED", "FAILED", "CANCELED"}
+FAILED_STATES = {"FAILED", "CANCELED"}
+
 
 def compile_pipeline(output_path="document_ingestion_pipeline.yaml"):
     """Compile the pipeline to a YAML file"""
@@ -19,7 +34,7 @@ def compile_pipeline(output_path="document_ingestion_pipeline.yaml"):
     return output_path
 
 
-def submit_pipeline(host, pipeline_path):
+def submit_pipeline(host, pipeline_path, arguments=None):
     """Submit the pipeline to a Kubeflow instance"""
     try:
         from kfp import client
@@ -30,7 +45,7 @@ def submit_pipeline(host, pipeline_path):
         print(f"Submitting pipeline from {pipeline_path}...")
         run = kfp_client.create_run_from_pipeline_package(
             pipeline_file=pipeline_path,
-            arguments={},
+            arguments=arguments or {},
             run_name="document-ingestion-pipeline-run"
         )
 
@@ -46,6 +61,172 @@ def submit_pipeline(host, pipeline_path):
         print("  3. Proper authentication configured")
 
 
+def read_manifest(manifest_path):
+    """Read documents from a manifest
+
+    Each line is either an S3 URI or a JSON object with ``s3_location`` and
+    optional ``document_metadata``.
+    """
+    documents = []
+    with open(manifest_path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                entry = json.loads(line)
+                documents.append((entry["s3_location"], entry.get("document_metadata", {})))
+            else:
+                documents.append((line, {}))
+    return documents
+
+
+def list_s3_prefix(s3_prefix):
+    """List every object below an S3 prefix, credentials are read from .env"""
+    import boto3
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    parsed_url = urlparse(s3_prefix)
+    if parsed_url.scheme != "s3":
+        raise ValueError(f"Invalid S3 URI scheme: {parsed_url.scheme}. Expected 's3://'")
+
+    s3_client = boto3.client(
+        "s3",
+        endpoint_url=os.environ.get("s3_url"),
+        aws_access_key_id=os.environ.get("aws_access_key_id"),
+        aws_secret_access_key=os.environ.get("aws_secret_access_key"),
+        region_name=os.environ.get("aws_region", "us-east-1"),
+        use_ssl=False
+    )
+
+    documents = []
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=parsed_url.netloc, Prefix=parsed_url.path.lstrip("/")):
+        for obj in page.get("Contents", []):
+            if not obj["Key"].endswith("/"):
+                documents.append((f"s3://{parsed_url.netloc}/{obj['Key']}", {}))
+    return documents
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class RateLimiter:
+    """Allow at most `rate` calls per second"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_slot = time.monotonic()
+
+    def wait(self):
+        now = time.monotonic()
+        if self.next_slot > now:
+            time.sleep(self.next_slot - now)
+        self.next_slot = max(now, self.next_slot) + self.interval
+
+
+def run_duration(run, submitted_at):
+    """Run duration from the KFP timestamps, falling back to the locally observed time"""
+    if getattr(run, "created_at", None) and getattr(run, "finished_at", None):
+        duration = (run.finished_at - run.created_at).total_seconds()
+        if duration > 0:
+            return duration
+    return time.monotonic() - submitted_at
+
+
+def bulk_submit(host, pipeline_path, documents, base_metadata, max_in_flight=10,
+                submit_rate=1.0, poll_interval=10.0, max_retries=2, profile_stages=False,
+                storage_worker=False):
+    """Submit one run per document and track the runs until all of them finished
+
+    Runs are submitted while fewer than max_in_flight are active, at most
+    submit_rate per second, and each failed run is resubmitted up to
+    max_retries times. Returns the list of documents that never succeeded.
+    """
+    from kfp import client
+
+    print(f"Connecting to Kubeflow at {host}...")
+    kfp_client = client.Client(host=host)
+    limiter = RateLimiter(submit_rate)
+
+    pending = deque((s3_location, metadata, 0) for s3_location, metadata in documents)
+    in_flight = {}
+    durations = []
+    failed = []
+    succeeded = 0
+    started = time.monotonic()
+
+    print(f"Ingesting {len(documents)} documents, max {max_in_flight} in flight, {submit_rate} submissions/s")
+
+    while pending or in_flight:
+        while pending and len(in_flight) < max_in_flight:
+            s3_location, metadata, attempt = pending.popleft()
+            limiter.wait()
+            try:
+                run = kfp_client.create_run_from_pipeline_package(
+                    pipeline_file=pipeline_path,
+                    arguments={
+                        "ingestion_document_s3_location": s3_location,
+                        "document_metadata": {**base_metadata, **metadata},
+                        "profile_stages": profile_stages,
+                        "storage_worker": storage_worker,
+                    },
+                    run_name=f"document-ingestion-{os.path.basename(s3_location)}"
+                )
+            except Exception as e:
+                print(f"✗ Failed to submit {s3_location}: {e}", file=sys.stderr)
+                if attempt < max_retries:
+                    pending.append((s3_location, metadata, attempt + 1))
+                else:
+                    failed.append(s3_location)
+                continue
+            in_flight[run.run_id] = (s3_location, metadata, attempt, time.monotonic())
+
+        if in_flight:
+            time.sleep(poll_interval)
+
+        for run_id, (s3_location, metadata, attempt, submitted_at) in list(in_flight.items()):
+            try:
+                run = kfp_client.get_run(run_id)
+            except Exception as e:
+                print(f"✗ Failed to poll run {run_id}: {e}", file=sys.stderr)
+                continue
+            if run.state not in TERMINAL_STATES:
+                continue
+
+            del in_flight[run_id]
+            if run.state in FAILED_STATES:
+                if attempt < max_retries:
+                    print(f"↻ Run {run_id} for {s3_location} {run.state}, retrying ({attempt + 1}/{max_retries})")
+                    pending.append((s3_location, metadata, attempt + 1))
+                else:
+                    print(f"✗ Run {run_id} for {s3_location} {run.state}, giving up")
+                    failed.append(s3_location)
+                continue
+
+            succeeded += 1
+            durations.append(run_duration(run, submitted_at))
+            print(f"✓ {s3_location} {run.state} ({succeeded + len(failed)}/{len(documents)})")
+
+    elapsed_minutes = (time.monotonic() - started) / 60
+    print("\n" + "=" * 80)
+    print(f"Documents succeeded: {succeeded}  failed: {len(failed)}")
+    print(f"Throughput: {succeeded / elapsed_minutes if elapsed_minutes else 0:.2f} docs/min")
+    print(f"Run duration p50: {percentile(durations, 50):.1f}s  p95: {percentile(durations, 95):.1f}s")
+    for s3_location in failed:
+        print(f"  failed: {s3_location}")
+
+    return failed
+
+
 def main():
     parser = argparse.ArgumentParser(description="Compile and run Kubeflow pipeline")
     parser.add_argument(
@@ -63,18 +244,95 @@ def main():
         default="http://localhost:8080",
         help="Kubeflow host URL (default: http://localhost:8080)"
     )
+    parser.add_argument(
+        "--document-metadata",
+        default="{}",
+        help="JSON metadata passed to every document (default: {})"
+    )
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument(
+        "--s3-location",
+        help="S3 URI of a single document to ingest"
+    )
+    source.add_argument(
+        "--manifest",
+        help="File listing documents to ingest, one S3 URI or JSON object per line"
+    )
+    source.add_argument(
+        "--s3-prefix",
+        help="Ingest every object below this S3 prefix (e.g., s3://doc-ingestion/reports/)"
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=10,
+        help="Maximum number of runs active at once in bulk mode (default: 10)"
+    )
+    parser.add_argument(
+        "--submit-rate",
+        type=float,
+        default=1.0,
+        help="Maximum run submissions per second in bulk mode (default: 1)"
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=10.0,
+        help="Seconds between run status polls in bulk mode (default: 10)"
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=2,
+        help="Times a failed run is resubmitted in bulk mode (default: 2)"
+    )
+    parser.add_argument(
+        "--profile-stages",
+        action="store_true",
+        help="Profile every stage, the flamegraph stacks and a memory summary become run artifacts"
+    )
+    parser.add_argument(
+        "--storage-worker",
+        action="store_true",
+        help="Hand the storage of every document to the warm storage worker (storage_worker.py)"
+    )
 
     args = parser.parse_args()
 
-    # Always compile first
+    # Always compile first, bulk runs all reuse the same package
     pipeline_path = compile_pipeline(args.output)
 
-    # Submit if not compile-only mode
-    if not args.compile_only:
-        submit_pipeline(args.host, pipeline_path)
-    else:
+    if args.compile_only:
         print("\nTo submit the pipeline later, run:")
         print(f"  python run_pipeline.py --host <kubeflow-host>")
+        return
+
+    document_metadata = json.loads(args.document_metadata)
+
+    if args.manifest or args.s3_prefix:
+        documents = read_manifest(args.manifest) if args.manifest else list_s3_prefix(args.s3_prefix)
+        failed = bulk_submit(
+            args.host,
+            pipeline_path,
+            documents,
+            document_metadata,
+            max_in_flight=args.max_in_flight,
+            submit_rate=args.submit_rate,
+            poll_interval=args.poll_interval,
+            max_retries=args.max_retries,
+            profile_stages=args.profile_stages,
+            storage_worker=args.storage_worker,
+        )
+        sys.exit(1 if failed else 0)
+
+    arguments = {
+        "document_metadata": document_metadata,
+        "profile_stages": args.profile_stages,
+        "storage_worker": args.storage_worker,
+    }
+    if args.s3_location:
+        arguments["ingestion_document_s3_location"] = args.s3_location
+    submit_pipeline(args.host, pipeline_path, arguments)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,540 @@
+#!/usr/bin/env python3
+"""
+Warm storage worker for the ingestion pipeline
+
+The storage stage pays the same setup for every document: importing
+transformers, loading the tokenizer, building the HybridChunker,
+connecting to Milvus and checking the collection. This service does that
+once and keeps it. Pipelines run with storage_worker=True replace the
+storage stage with a thin client that enqueues the document's metadata
+and DoclingDocument here and waits for the result. --workers threads take
+jobs from the queue and chunk, embed and insert them like the storage
+stage, with the same ingestion manifest bookkeeping.
+
+Jobs live in memory. When the worker restarts, waiting stages get a 404
+and fail, KFP retries them and they resume from the ingestion manifest.
+Finished jobs are kept for --job-ttl seconds. A job for content of the
+same bucket that is already queued or running with the same conversion
+options, tokenizer and chunk size, e.g. from a retried stage, waits on
+that job instead of storing it twice.
+
+API:
+    POST /jobs              {"document_metadata": {...}, "docling_document": "<DoclingDocument JSON>",
+                             "embed_model_id": "...", "chunk_max_tokens": 0}  -> {"job_id": "...", "position": 3}
+    POST /jobs/<id>/wait    {"timeout": 30}  -> {"state": "queued|running|stored|skipped|failed", ...}
+    GET  /status
+"""
+
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+import traceback
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+CONFIG_SECRETS_LOCATION = "/tmp/ingestion-config/"
+S3_BUCKET_NAME = "s3_bucket_name"
+FILE_MD5_HASH = "file_md5_hash"
+CONVERSION_OPTIONS_HASH = "conversion_options_hash"
+TELEMETRY_SCOPE = "rag_ingestion"
+VECTOR_DIM = 4096
+MAX_WAIT_SECONDS = 60.0
+FINISHED_STATES = ["stored", "skipped", "failed"]
+
+
+class QueueFull(Exception):
+    pass
+
+
+class StorageWorker:
+    """Storage jobs queue with worker threads sharing one Milvus connection
+
+    Collections are checked, indexed and loaded once. Every thread keeps
+    its own chunkers, one per tokenizer and chunk size, since tokenizers
+    are not meant to be shared between threads.
+    """
+
+    def __init__(self, milvus_host, milvus_port, manifest_bucket, workers=2, max_queued=1000, job_ttl=3600.0):
+        self.milvus_host = milvus_host
+        self.milvus_port = milvus_port
+        self.manifest_bucket = manifest_bucket
+        self.workers = workers
+        self.max_queued = max_queued
+        self.job_ttl = job_ttl
+
+        self._cond = threading.Condition()
+        self._jobs = {}
+        self._active = {}
+        self._queue = queue.Queue()
+        self._collections = {}
+        self._collections_lock = threading.Lock()
+        self._local = threading.local()
+        self._stored = 0
+        self._failed = 0
+
+    def start(self):
+        """Connect to Milvus, S3 and the telemetry exporters, then start the worker threads"""
+        import boto3
+        from opentelemetry import metrics, trace
+        from pymilvus import connections
+
+        configure_telemetry()
+        self.tracer = trace.get_tracer(TELEMETRY_SCOPE)
+        meter = metrics.get_meter(TELEMETRY_SCOPE)
+        self.chunks_counter = meter.create_counter(
+            "ingestion_chunks", unit="{chunk}", description="Chunks produced from documents"
+        )
+        self.vectors_counter = meter.create_counter(
+            "ingestion_vectors", unit="{vector}", description="Vectors inserted into Milvus"
+        )
+        self.queue_wait = meter.create_histogram(
+            "ingestion_storage_queue_wait", unit="s", description="Time a storage job waited for a worker thread"
+        )
+
+        self.s3_client = boto3.client(
+            "s3",
+            endpoint_url=os.environ.get("s3_url"),
+            aws_access_key_id=os.environ.get("aws_access_key_id"),
+            aws_secret_access_key=os.environ.get("aws_secret_access_key"),
+            region_name=os.environ.get("aws_region", "us-east-1"),
+            use_ssl=False
+        )
+        print(f"Connecting to Milvus at {self.milvus_host}:{self.milvus_port}")
+        connections.connect(alias="default", host=self.milvus_host, port=self.milvus_port)
+        for _ in range(self.workers):
+            threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, request, context=None):
+        """Queue a storage job, returns (job_id, position)
+
+        The job of the same content, bucket, conversion options, tokenizer
+        and chunk size that is still queued or running is returned instead
+        of a new one, position 0 when it is running. Another bucket has its
+        own collection and manifest record, so it gets its own job.
+        """
+        now = time.monotonic()
+        document_metadata = request["document_metadata"]
+        key = (
+            document_metadata.get(FILE_MD5_HASH),
+            document_metadata.get(S3_BUCKET_NAME),
+            document_metadata.get(CONVERSION_OPTIONS_HASH),
+            request["embed_model_id"],
+            request.get("chunk_max_tokens", 0),
+        )
+        with self._cond:
+            self._expire(now)
+            job_id = self._active.get(key) if key[0] else None
+            if job_id is not None:
+                job = self._jobs[job_id]
+                print(f"{job['name']} is already {job['state']}, reusing job {job_id}")
+                if job["state"] == "running":
+                    return job_id, 0
+                return job_id, sum(
+                    1 for other in self._jobs.values()
+                    if other["state"] == "queued" and other["enqueued_at"] <= job["enqueued_at"]
+                )
+            if self._queue.qsize() >= self.max_queued:
+                raise QueueFull(f"{self._queue.qsize()} jobs queued")
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "state": "queued",
+                "request": request,
+                "context": context,
+                "name": request["document_metadata"].get("document_name", ""),
+                "key": key,
+                "enqueued_at": now,
+                "finished_at": None,
+            }
+            if key[0]:
+                self._active[key] = job_id
+            self._queue.put(job_id)
+            return job_id, self._queue.qsize()
+
+    def wait(self, job_id, timeout):
+        """Block until the job finished or timeout, returns its state or None if unknown"""
+        deadline = time.monotonic() + min(timeout, MAX_WAIT_SECONDS)
+        with self._cond:
+            while True:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    return None
+                now = time.monotonic()
+                if job["state"] in FINISHED_STATES or now >= deadline:
+                    reply = {"state": job["state"]}
+                    for key in ("result", "error"):
+                        if key in job:
+                            reply[key] = job[key]
+                    return reply
+                self._cond.wait(deadline - now)
+
+    def status(self):
+        with self._cond:
+            now = time.monotonic()
+            self._expire(now)
+            queued = [job for job in self._jobs.values() if job["state"] == "queued"]
+            return {
+                "workers": self.workers,
+                "queued": len(queued),
+                "running": sum(1 for job in self._jobs.values() if job["state"] == "running"),
+                "oldest_wait_seconds": max((now - job["enqueued_at"] for job in queued), default=0.0),
+                "stored": self._stored,
+                "failed": self._failed,
+                "collections": sorted(self._collections),
+            }
+
+    def _expire(self, now):
+        """Drop finished jobs older than the TTL, caller holds the lock"""
+        for job_id in [i for i, j in self._jobs.items() if j["finished_at"] and now - j["finished_at"] > self.job_ttl]:
+            del self._jobs[job_id]
+
+    def _run(self):
+        while True:
+            job_id = self._queue.get()
+            with self._cond:
+                job = self._jobs[job_id]
+                job["state"] = "running"
+                request = job.pop("request")
+            self.queue_wait.record(time.monotonic() - job["enqueued_at"])
+            try:
+                result = self._store(request, job["context"])
+                update = {"state": result.pop("state"), "result": result}
+            except Exception as e:
+                traceback.print_exc()
+                update = {"state": "failed", "error": f"{type(e).__name__}: {e}"}
+            with self._cond:
+                job.update(update, finished_at=time.monotonic())
+                if self._active.get(job["key"]) == job_id:
+                    del self._active[job["key"]]
+                if update["state"] == "failed":
+                    self._failed += 1
+                else:
+                    self._stored += 1
+                self._cond.notify_all()
+            print(f"{'✗' if update['state'] == 'failed' else '✓'} {job['name']} {update['state']} "
+                  f"{update.get('error', '')}")
+
+    def _chunker(self, embed_model_id, chunk_max_tokens):
+        """This thread's chunker for the tokenizer and chunk size"""
+        from docling_core.transforms.chunker.hybrid_chunker import HybridChunker
+        from docling_core.transforms.chunker.tokenizer.huggingface import HuggingFaceTokenizer
+        from transformers import AutoTokenizer
+
+        if not hasattr(self._local, "chunkers"):
+            self._local.chunkers = {}
+        chunkers = self._local.chunkers
+        key = (embed_model_id, chunk_max_tokens)
+        if key not in chunkers:
+            print(f"Loading tokenizer {embed_model_id} max tokens {chunk_max_tokens or 'model default'}")
+            tokenizer_kwargs = {}
+            if chunk_max_tokens > 0:
+                tokenizer_kwargs["max_tokens"] = chunk_max_tokens
+            tokenizer = HuggingFaceTokenizer(
+                tokenizer=AutoTokenizer.from_pretrained(embed_model_id),
+                **tokenizer_kwargs,
+            )
+            chunkers[key] = HybridChunker(tokenizer=tokenizer)
+        return chunkers[key]
+
+    def _collection(self, collection_name):
+        """Create, index and load the collection the first time it is used"""
+        from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, Function, FunctionType, utility
+
+        with self._collections_lock:
+            if collection_name in self._collections:
+                return self._collections[collection_name]
+            if not utility.has_collection(collection_name):
+                print(f"Creating new collection: {collection_name}")
+                milvus_bm25 = os.environ.get("MILVUS_BM25", "true").lower() == "true"
+                fields = [
+                    FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
+                    FieldSchema(name="chunk_text", dtype=DataType.VARCHAR, max_length=65535, enable_analyzer=milvus_bm25),
+                    FieldSchema(name="document_name", dtype=DataType.VARCHAR, max_length=512),
+                    FieldSchema(name="chunk_index", dtype=DataType.INT64),
+                    FieldSchema(name="metadata_json", dtype=DataType.VARCHAR, max_length=2048),
+                    FieldSchema(name="chunk_vector", dtype=DataType.FLOAT_VECTOR, dim=VECTOR_DIM),
+                ]
+                functions = []
+                if milvus_bm25:
+                    # Same BM25 sparse field as the storage stage
+                    fields.append(FieldSchema(name="chunk_sparse", dtype=DataType.SPARSE_FLOAT_VECTOR))
+                    functions.append(Function(
+                        name="chunk_text_bm25",
+                        function_type=FunctionType.BM25,
+                        input_field_names=["chunk_text"],
+                        output_field_names=["chunk_sparse"],
+                    ))
+                schema = CollectionSchema(
+                    fields=fields, functions=functions, description=f"Document chunks from {collection_name}"
+                )
+                collection = Collection(name=collection_name, schema=schema)
+            else:
+                collection = Collection(name=collection_name)
+            # Filtering on document rows needs a loaded, and therefore indexed, collection
+            indexed_fields = {index.field_name for index in collection.indexes}
+            if "chunk_vector" not in indexed_fields:
+                collection.create_index(
+                    field_name="chunk_vector",
+                    index_params={"index_type": "AUTOINDEX", "metric_type": "COSINE"},
+                )
+            if "chunk_sparse" not in indexed_fields and any(field.name == "chunk_sparse" for field in collection.schema.fields):
+                collection.create_index(
+                    field_name="chunk_sparse",
+                    index_params={"index_type": "SPARSE_INVERTED_INDEX", "metric_type": "BM25"},
+                )
+            collection.load()
+            self._collections[collection_name] = collection
+            return collection
+
+    def _store(self, request, context):
+        """Chunk, embed and insert one document, the storage stage's steps without the setup"""
+        import numpy as np
+        from docling_core.types.doc.document import DoclingDocument
+        from pymilvus import DataType
+
+        document_metadata = request["document_metadata"]
+        embed_model_id = request["embed_model_id"]
+        chunk_max_tokens = int(request.get("chunk_max_tokens", 0))
+
+        with self.tracer.start_as_current_span("storage_worker.store", context=context) as span:
+            with self.tracer.start_as_current_span("docling.validate"):
+                docling_document = DoclingDocument.model_validate_json(request["docling_document"])
+
+            collection_name = document_metadata.get(S3_BUCKET_NAME)
+            if not collection_name:
+                raise ValueError("s3_bucket_name not found in document_metadata")
+            collection_name = collection_name.replace("-", "_").replace(".", "_")
+            span.set_attribute("milvus.collection", collection_name)
+            try:
+                collection = self._collection(collection_name)
+                # reindex_collection.py may have changed the vector size or precision
+                vector_field = next(field for field in collection.schema.fields if field.name == "chunk_vector")
+                vector_dtype = np.float16 if vector_field.dtype == DataType.FLOAT16_VECTOR else np.float32
+                md5_hash = document_metadata[FILE_MD5_HASH]
+                progress_key = f"{document_metadata[S3_BUCKET_NAME]}/{md5_hash}.json"
+                try:
+                    progress = json.loads(
+                        self.s3_client.get_object(Bucket=self.manifest_bucket, Key=progress_key)["Body"].read()
+                    )
+                except self.s3_client.exceptions.NoSuchKey:
+                    progress = {FILE_MD5_HASH: md5_hash}
+
+                storage_config = {
+                    CONVERSION_OPTIONS_HASH: document_metadata.get(CONVERSION_OPTIONS_HASH),
+                    "embed_model_id": embed_model_id,
+                    "chunk_max_tokens": chunk_max_tokens,
+                }
+
+                # Rows of this document, the MD5 hash is part of metadata_json. Milvus
+                # string literals take escaped quotes and backslashes but no \u escapes,
+                # so other characters stay as they are
+                document_filter = (
+                    f"document_name == {json.dumps(docling_document.origin.filename, ensure_ascii=False)} "
+                    f'and metadata_json like "%{md5_hash}%"'
+                )
+                stored_count = collection.query(expr=document_filter, output_fields=["count(*)"])[0]["count(*)"]
+
+                if (
+                    progress.get("state") == "stored"
+                    and progress.get("storage_config") == storage_config
+                    and progress.get("vector_count") == stored_count
+                ):
+                    return {"state": "skipped", "vector_count": stored_count, "collection_name": collection_name}
+
+                if stored_count:
+                    # Left over from an interrupted or outdated run, replace them
+                    collection.delete(expr=document_filter)
+
+                chunker = self._chunker(embed_model_id, chunk_max_tokens)
+                metadata_json = json.dumps(document_metadata)
+                with self.tracer.start_as_current_span("chunk") as chunk_span:
+                    chunk_texts = [chunker.contextualize(chunk=chunk) for chunk in chunker.chunk(dl_doc=docling_document)]
+                    chunk_span.set_attribute("chunk.count", len(chunk_texts))
+                chunk_count = len(chunk_texts)
+                self.chunks_counter.add(chunk_count, {"stage": "storage"})
+
+                # Placeholder vectors, like the storage stage
+                with self.tracer.start_as_current_span("embed", attributes={"embed.model": embed_model_id, "chunk.count": chunk_count}):
+                    chunk_vectors = [
+                        np.random.rand(vector_field.params["dim"]).astype(vector_dtype) for _ in range(chunk_count)
+                    ]
+
+                entities = [
+                    chunk_texts,
+                    [docling_document.origin.filename] * chunk_count,
+                    list(range(chunk_count)),
+                    [metadata_json] * chunk_count,
+                    chunk_vectors,
+                ]
+                with self.tracer.start_as_current_span("milvus.insert", attributes={"milvus.collection": collection_name}):
+                    collection.insert(entities)
+                with self.tracer.start_as_current_span("milvus.flush", attributes={"milvus.collection": collection_name}):
+                    collection.flush()
+                self.vectors_counter.add(chunk_count, {"stage": "storage", "collection": collection_name})
+            except Exception:
+                # The collection may have been dropped or replaced, check it again next time
+                with self._collections_lock:
+                    self._collections.pop(collection_name, None)
+                raise
+
+            progress.update({
+                "state": "stored",
+                "storage_config": storage_config,
+                "vector_count": chunk_count,
+                "collection_name": collection_name,
+                "updated_at": time.time(),
+            })
+            self.s3_client.put_object(
+                Bucket=self.manifest_bucket,
+                Key=progress_key,
+                Body=json.dumps(progress).encode("utf-8"),
+                ContentType="application/json",
+            )
+            return {"state": "stored", "vector_count": chunk_count, "collection_name": collection_name}
+
+
+def configure_telemetry():
+    """Export traces and metrics to OTEL_EXPORTER_OTLP_ENDPOINT when it is set, like the pipeline stages"""
+    if not os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT"):
+        return
+    from opentelemetry import metrics, trace
+    from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+    # Every replica reports its own cumulative counters, the instance keeps their series apart
+    resource = Resource.create({
+        "service.name": os.environ.get("OTEL_SERVICE_NAME", "rag-ingestion"),
+        "service.instance.id": os.environ.get("HOSTNAME") or str(uuid.uuid4()),
+    })
+    tracer_provider = TracerProvider(resource=resource)
+    tracer_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(tracer_provider)
+    metrics.set_meter_provider(MeterProvider(
+        resource=resource,
+        metric_readers=[PeriodicExportingMetricReader(OTLPMetricExporter())],
+    ))
+
+
+def make_handler(worker):
+    from opentelemetry import propagate
+
+    class StorageWorkerHandler(BaseHTTPRequestHandler):
+        def _reply(self, status, body=None):
+            payload = json.dumps(body).encode("utf-8") if body is not None else b""
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _body(self):
+            length = int(self.headers.get("Content-Length", 0))
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_GET(self):
+            if self.path == "/status":
+                self._reply(200, worker.status())
+            else:
+                self._reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            parts = self.path.strip("/").split("/")
+            try:
+                body = self._body()
+            except json.JSONDecodeError:
+                self._reply(400, {"error": "invalid JSON"})
+                return
+
+            if parts == ["jobs"]:
+                missing = [key for key in ("document_metadata", "docling_document", "embed_model_id") if key not in body]
+                if missing:
+                    self._reply(400, {"error": f"missing {', '.join(missing)}"})
+                    return
+                try:
+                    # The job's spans continue the trace of the stage that sent it
+                    job_id, position = worker.submit(body, context=propagate.extract(dict(self.headers)))
+                except QueueFull as e:
+                    self._reply(503, {"error": f"queue full, {e}"})
+                    return
+                self._reply(201, {"job_id": job_id, "position": position})
+            elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "wait":
+                result = worker.wait(parts[1], float(body.get("timeout", 30)))
+                if result is None:
+                    self._reply(404, {"error": "unknown or expired job"})
+                else:
+                    self._reply(200, result)
+            else:
+                self._reply(404, {"error": "not found"})
+
+        def log_message(self, format, *args):
+            pass
+
+    return StorageWorkerHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm storage worker for the ingestion pipeline")
+    parser.add_argument(
+        "--listen",
+        default="0.0.0.0:8080",
+        help="Listen address (default: 0.0.0.0:8080)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=2,
+        help="Documents stored at once (default: 2)"
+    )
+    parser.add_argument(
+        "--max-queued",
+        type=int,
+        default=1000,
+        help="Queued jobs before new ones are refused (default: 1000)"
+    )
+    parser.add_argument(
+        "--job-ttl",
+        type=float,
+        default=3600.0,
+        help="Seconds finished jobs are kept for their stage (default: 3600)"
+    )
+    parser.add_argument(
+        "--env-file",
+        default=CONFIG_SECRETS_LOCATION + ".env",
+        help=f"Configuration shared with the pipeline stages (default: {CONFIG_SECRETS_LOCATION}.env)"
+    )
+
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+
+    load_dotenv(dotenv_path=Path(args.env_file))
+    worker = StorageWorker(
+        os.environ.get("MILVUS_HOST", "my-release-milvus.milvus.svc.cluster.local"),
+        os.environ.get("MILVUS_PORT", "19530"),
+        os.environ.get("INGESTION_MANIFEST_BUCKET", "ingestion-manifest"),
+        workers=args.workers,
+        max_queued=args.max_queued,
+        job_ttl=args.job_ttl,
+    )
+    worker.start()
+    host, port = args.listen.rsplit(":", 1)
+    server = ThreadingHTTPServer((host, int(port)), make_handler(worker))
+    print(f"Storing with {args.workers} workers, listening on {args.listen}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
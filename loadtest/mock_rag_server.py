@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Mock of the RAG endpoints for replay_load.py
+
+Answers the request shapes replay_load.py sends, with configurable latency,
+so the load test can be tried without a cluster:
+
+    rag-server   POST /v1/generate (always streamed), POST /v1/search
+    llama-stack  POST /v1/openai/v1/chat/completions, POST /v1/vector_stores/<id>/search
+    vLLM         POST /v1/chat/completions, GET /v1/models
+
+Chat responses stream --tokens tokens, the first after --ttft-ms and the
+others --itl-ms apart, or arrive as one JSON body when the request has
+"stream": false. Searches take --search-ms. At most --max-concurrent
+requests are served at once, the others queue, so latency grows with load
+like on a saturated GPU. --error-rate of the requests fail with a 500.
+
+    python mock_rag_server.py --listen 127.0.0.1:8081 --ttft-ms 150 --itl-ms 20
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ("the", "pump", "pressure", "valve", "error", "code", "manual", "section", "replace", "filter",
+         "within", "hours", "warranty", "part", "number", "check", "before", "service", "and", "reset")
+
+
+class MockServer(ThreadingHTTPServer):
+    # Load tests open many connections at once, the default backlog of 5 resets them
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+def make_handler(ttft, itl, tokens, search_latency, max_concurrent, error_rate, seed=0):
+    slots = threading.BoundedSemaphore(max_concurrent)
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+
+    def fails():
+        with rng_lock:
+            return rng.random() < error_rate
+
+    class MockHandler(BaseHTTPRequestHandler):
+        def _reply(self, status, body):
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _event(self, body):
+            self.wfile.write(b"data: " + (body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")) + b"\n\n")
+
+        def do_GET(self):
+            if self.path in ("/health", "/v1/health"):
+                self._reply(200, {"message": "Service is up."})
+            elif self.path == "/v1/models":
+                self._reply(200, {"object": "list", "data": [{"id": "mock", "object": "model"}]})
+            else:
+                self._reply(404, {"detail": "Not Found"})
+
+        def do_POST(self):
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            except json.JSONDecodeError:
+                self._reply(400, {"detail": "invalid JSON"})
+                return
+
+            path = self.path.rstrip("/")
+            if path == "/v1/generate":
+                chat, style = True, "rag-server"
+            elif path in ("/v1/chat/completions", "/v1/openai/v1/chat/completions"):
+                chat, style = True, "openai"
+            elif path == "/v1/search" or (path.startswith("/v1/vector_stores/") and path.endswith("/search")):
+                chat, style = False, "rag-server" if path == "/v1/search" else "openai"
+            else:
+                self._reply(404, {"detail": "Not Found"})
+                return
+            if chat and not body.get("messages"):
+                self._reply(422, {"detail": "messages is required"})
+                return
+
+            with slots:
+                if fails():
+                    self._reply(500, {"detail": "mock failure"})
+                elif not chat:
+                    time.sleep(search_latency)
+                    self._search(style, body)
+                elif style == "rag-server" or body.get("stream"):
+                    try:
+                        self._stream(style, body)
+                    except (BrokenPipeError, ConnectionResetError):
+                        # The client gave up, e.g. on its timeout
+                        self.close_connection = True
+                else:
+                    time.sleep(ttft + itl * (tokens - 1))
+                    self._reply(200, self._completion(body, " ".join(self._words())))
+
+        def _words(self):
+            with rng_lock:
+                return [rng.choice(WORDS) for _ in range(tokens)]
+
+        def _completion(self, body, content):
+            return {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "mock"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 10, "completion_tokens": tokens, "total_tokens": 10 + tokens},
+            }
+
+        def _stream(self, style, body):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            response_id = f"chatcmpl-{uuid.uuid4().hex}"
+            time.sleep(ttft)
+            for index, word in enumerate(self._words()):
+                if index:
+                    time.sleep(itl)
+                delta = {"role": "assistant", "content": word if index == 0 else " " + word}
+                choice = {"index": 0, "delta": delta, "finish_reason": None}
+                if style == "rag-server":
+                    choice["message"] = delta
+                self._event({"id": response_id, "object": "chat.completion.chunk", "model": body.get("model", "mock"),
+                             "choices": [choice]})
+            final = {"id": response_id, "object": "chat.completion.chunk", "model": body.get("model", "mock"),
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+            if style == "rag-server":
+                final["choices"][0]["message"] = {"role": "assistant", "content": ""}
+                final["citations"] = {"total_results": 0, "results": []}
+            self._event(final)
+            if style == "openai":
+                if body.get("stream_options", {}).get("include_usage"):
+                    self._event({"id": response_id, "object": "chat.completion.chunk", "choices": [],
+                                 "usage": {"prompt_tokens": 10, "completion_tokens": tokens, "total_tokens": 10 + tokens}})
+                self._event(b"[DONE]")
+            self.close_connection = True
+
+        def _search(self, style, body):
+            results = [{"document_name": f"doc-{i}.pdf", "content": " ".join(self._words()[:20]), "score": 1.0 - i / 10}
+                       for i in range(min(int(body.get("reranker_top_k", body.get("max_num_results", 5))), 10))]
+            if style == "rag-server":
+                self._reply(200, {"total_results": len(results), "results": results})
+            else:
+                self._reply(200, {"object": "vector_store.search_results.page", "search_query": body.get("query"),
+                                  "data": [{"file_id": r["document_name"], "filename": r["document_name"],
+                                            "score": r["score"], "content": [{"type": "text", "text": r["content"]}]}
+                                           for r in results],
+                                  "has_more": False})
+
+        def log_message(self, format, *args):
+            pass
+
+    return MockHandler
+
+
+def start(listen="127.0.0.1:0", **kwargs):
+    """Serve the mock from a background thread, returns (server, base URL)"""
+    host, port = listen.rsplit(":", 1)
+    server = MockServer((host, int(port)), make_handler(**kwargs))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock of the RAG endpoints for replay_load.py")
+    parser.add_argument(
+        "--listen",
+        default="127.0.0.1:8081",
+        help="Listen address (default: 127.0.0.1:8081)"
+    )
+    parser.add_argument(
+        "--ttft-ms",
+        type=float,
+        default=150.0,
+        help="Milliseconds before the first token (default: 150)"
+    )
+    parser.add_argument(
+        "--itl-ms",
+        type=float,
+        default=20.0,
+        help="Milliseconds between tokens (default: 20)"
+    )
+    parser.add_argument(
+        "--tokens",
+        type=int,
+        default=64,
+        help="Tokens per chat response (default: 64)"
+    )
+    parser.add_argument(
+        "--search-ms",
+        type=float,
+        default=80.0,
+        help="Milliseconds per search (default: 80)"
+    )
+    parser.add_argument(
+        "--max-concurrent",
+        type=int,
+        default=32,
+        help="Requests served at once, the others queue (default: 32)"
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of requests answered with a 500 (default: 0)"
+    )
+
+    args = parser.parse_args()
+
+    server, url = start(
+        args.listen,
+        ttft=args.ttft_ms / 1000,
+        itl=args.itl_ms / 1000,
+        tokens=args.tokens,
+        search_latency=args.search_ms / 1000,
+        max_concurrent=args.max_concurrent,
+        error_rate=args.error_rate,
+    )
+    print(f"Mock RAG endpoints on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,584 @@
+#!/usr/bin/env python3
+"""
+Replay a JSONL of chat and retrieval requests against the RAG endpoints
+
+Every line of the file is one request body. Lines with "messages" are chats,
+lines with "query" are searches, and both are turned into the request shape
+of --target:
+
+    rag-server   POST /v1/generate (streams),     POST /v1/search
+    llama-stack  POST /v1/openai/v1/chat/completions, POST /v1/vector_stores/<--collection>/search
+    vllm         POST /v1/chat/completions,       searches are skipped
+
+    {"messages": [{"role": "user", "content": "How do I reset the pump?"}]}
+    {"query": "pump reset procedure", "reranker_top_k": 5}
+    {"messages": [...], "max_tokens": 256, "_at": 12.5}
+
+Keys starting with "_" are not sent: "_kind" forces chat or search and
+"_at" is the offset in seconds of the request in a recorded trace.
+
+Load is either closed-loop, --concurrency callers sending back to back, or
+open-loop, requests arriving at --rate per second (--arrival poisson or
+constant) or at their recorded "_at" (--arrival recorded) whether or not
+earlier ones have finished. Open-loop latencies count from the scheduled
+arrival, so a saturated endpoint shows up as latency instead of being hidden
+by a slower send rate. The file is replayed in a loop until --requests or
+--duration is reached.
+
+Reported per kind: requests, errors by cause, throughput, TTFT, inter-token
+latency (ITL), end-to-end latency p50/p95/p99 and output tokens/s. TTFT and
+ITL are taken from the streamed chunks and need --stream, the rag-server
+always streams.
+
+    # Against a local mock, no cluster needed
+    python replay_load.py requests.example.jsonl --mock --concurrency 8 --requests 200
+
+    # 5 req/s Poisson arrivals against vLLM for 2 minutes
+    python replay_load.py requests.jsonl --target vllm --base-url http://localhost:8000 \\
+        --model nvidia/llama-3.3-nemotron-super-49b-v1.5 --rate 5 --duration 120 --save results.json
+"""
+
+import argparse
+import itertools
+import json
+import math
+import queue
+import random
+import socket
+import sys
+import threading
+import time
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+import mock_rag_server
+
+DEFAULT_URLS = {
+    "rag-server": "http://rag-server:8081",
+    "llama-stack": "http://llama-stack-service:8321",
+    "vllm": "http://localhost:8000",
+}
+CHAT_PATHS = {
+    "rag-server": "/v1/generate",
+    "llama-stack": "/v1/openai/v1/chat/completions",
+    "vllm": "/v1/chat/completions",
+}
+# Options of the rag-server that OpenAI-style endpoints do not know
+RAG_SERVER_KEYS = ("use_knowledge_base", "collection_names", "collection_name", "vdb_top_k", "reranker_top_k",
+                   "enable_reranker", "enable_citations", "enable_query_rewriting", "filter_expr")
+
+
+def load_requests(path):
+    """Read the JSONL file, returns a list of {"kind", "body", "at"}"""
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                body = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{number}: {e}") from e
+            kind = body.get("_kind") or ("chat" if "messages" in body else "search" if "query" in body else None)
+            if kind not in ("chat", "search"):
+                raise ValueError(f"{path}:{number}: needs \"messages\", \"query\" or \"_kind\"")
+            entries.append({
+                "kind": kind,
+                "body": {key: value for key, value in body.items() if not key.startswith("_")},
+                "at": body.get("_at"),
+            })
+    return entries
+
+
+def build_request(entry, args):
+    """Path and body of an entry for --target, None if the target has no such endpoint"""
+    body = dict(entry["body"])
+    if entry["kind"] == "search":
+        if args.target == "rag-server":
+            if args.collection:
+                body.setdefault("collection_names", [args.collection])
+            return "/v1/search", body
+        if args.target == "llama-stack" and args.collection:
+            if "reranker_top_k" in body:
+                body.setdefault("max_num_results", body.pop("reranker_top_k"))
+            body.pop("vdb_top_k", None)
+            return f"/v1/vector_stores/{args.collection}/search", body
+        return None
+
+    if args.target == "rag-server":
+        # The rag-server always streams, use_knowledge_base defaults to retrieval plus generation
+        if args.collection:
+            body.setdefault("collection_names", [args.collection])
+        body.pop("stream", None)
+    else:
+        for key in RAG_SERVER_KEYS:
+            body.pop(key, None)
+        if args.model:
+            body.setdefault("model", args.model)
+        body["stream"] = args.stream
+        if args.stream:
+            body["stream_options"] = {"include_usage": True}
+        else:
+            body.pop("stream_options", None)
+    if args.max_tokens:
+        body.setdefault("max_tokens", args.max_tokens)
+    return CHAT_PATHS[args.target], body
+
+
+def chunk_text(chunk):
+    """Generated text of a streamed chunk or a whole completion"""
+    text = ""
+    for choice in chunk.get("choices") or ():
+        part = (choice.get("delta") or {}).get("content") or (choice.get("message") or {}).get("content")
+        if part:
+            text += part
+    return text
+
+
+def send(url, body, stream, headers, timeout, scheduled):
+    """Send one request, returns a result dict with timings in seconds from the scheduled start"""
+    result = {"ok": False, "error": None, "status": None, "ttft": None, "itl": [], "e2e": None, "tokens": 0,
+              "delay": time.perf_counter() - scheduled}
+    request = Request(url, data=json.dumps(body).encode("utf-8"),
+                      headers={"Content-Type": "application/json", **headers})
+    try:
+        with urlopen(request, timeout=timeout) as response:
+            result["status"] = response.status
+            if stream and "text/event-stream" in response.headers.get("Content-Type", ""):
+                last = None
+                chunks = 0
+                for raw in response:
+                    line = raw.decode("utf-8").strip()
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    if chunk.get("usage"):
+                        result["tokens"] = chunk["usage"].get("completion_tokens") or result["tokens"]
+                    if not chunk_text(chunk):
+                        continue
+                    now = time.perf_counter()
+                    if last is None:
+                        result["ttft"] = now - scheduled
+                    else:
+                        result["itl"].append(now - last)
+                    last = now
+                    chunks += 1
+                # Servers without usage in the stream send about one token per chunk
+                result["tokens"] = result["tokens"] or chunks
+                if last is None:
+                    result["error"] = "stream"
+            else:
+                payload = json.loads(response.read() or b"{}")
+                usage = payload.get("usage") or {}
+                result["tokens"] = usage.get("completion_tokens") or 0
+    except HTTPError as e:
+        result["status"] = e.code
+        result["error"] = "http_5xx" if e.code >= 500 else "http_4xx"
+    except (socket.timeout, TimeoutError):
+        result["error"] = "timeout"
+    except URLError as e:
+        result["error"] = "timeout" if isinstance(e.reason, (socket.timeout, TimeoutError)) else "connection"
+    except (ConnectionError, OSError):
+        result["error"] = "connection"
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        result["error"] = "stream"
+    result["e2e"] = time.perf_counter() - scheduled
+    result["ok"] = result["error"] is None
+    return result
+
+
+def arrivals(entries, args, rng):
+    """Yield (offset seconds, entry) until --requests or --duration"""
+    if args.arrival == "recorded":
+        ordered = sorted(entries, key=lambda entry: entry["at"])
+        span = ordered[-1]["at"] - ordered[0]["at"]
+        # One mean gap between the end of the trace and the start of its next loop
+        period = span + (span / (len(ordered) - 1) if len(ordered) > 1 else 1.0)
+        source = ((loop * period + entry["at"] - ordered[0]["at"], entry)
+                  for loop in itertools.count() for entry in ordered)
+        offsets = ((offset / args.speedup, entry) for offset, entry in source)
+    else:
+        def generate():
+            offset = 0.0
+            for entry in itertools.cycle(entries):
+                yield offset, entry
+                offset += rng.expovariate(args.rate) if args.arrival == "poisson" else 1.0 / args.rate
+        offsets = generate()
+    for count, (offset, entry) in enumerate(offsets):
+        if (args.requests and count >= args.requests) or (args.duration and offset >= args.duration):
+            return
+        yield offset, entry
+
+
+def warmup(entries, args):
+    """Send the first --warmup requests one at a time, so connection setup is not in the numbers"""
+    headers = {"Authorization": f"Bearer {args.api_key}"} if args.api_key else {}
+    for entry in itertools.islice(itertools.cycle(entries), args.warmup):
+        path, body = build_request(entry, args)
+        send(args.base_url.rstrip("/") + path, body, True, headers, args.timeout, time.perf_counter())
+
+
+def run(entries, args):
+    """Drive the endpoint, returns (results with their kind, wall seconds)"""
+    results = []
+    lock = threading.Lock()
+    headers = {"Authorization": f"Bearer {args.api_key}"} if args.api_key else {}
+    rng = random.Random(args.seed)
+    base_url = args.base_url.rstrip("/")
+
+    def execute(entry, scheduled):
+        path, body = build_request(entry, args)
+        stream = entry["kind"] == "chat" and (args.target == "rag-server" or args.stream)
+        result = send(base_url + path, body, stream, headers, args.timeout, scheduled)
+        result["kind"] = entry["kind"]
+        with lock:
+            results.append(result)
+            if args.verbose and not result["ok"]:
+                print(f"  ✗ {entry['kind']} {path}: {result['error']} {result['status'] or ''}")
+
+    started = time.perf_counter()
+    if args.rate or args.arrival == "recorded":
+        # Open loop: a scheduler hands requests out at their arrival time, never waiting for replies
+        pending = queue.Queue()
+
+        def worker():
+            while True:
+                item = pending.get()
+                if item is None:
+                    return
+                execute(*item)
+
+        workers = [threading.Thread(target=worker, daemon=True) for _ in range(args.max_inflight)]
+        for thread in workers:
+            thread.start()
+        for offset, entry in arrivals(entries, args, rng):
+            delay = started + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pending.put((entry, started + offset))
+        for _ in workers:
+            pending.put(None)
+        for thread in workers:
+            thread.join()
+    else:
+        # Closed loop: every caller sends its next request when the previous one is done
+        source = iter(itertools.cycle(entries))
+        sent = itertools.count()
+        source_lock = threading.Lock()
+
+        def caller():
+            while True:
+                with source_lock:
+                    if args.requests and next(sent) >= args.requests:
+                        return
+                    if args.duration and time.perf_counter() - started >= args.duration:
+                        return
+                    entry = next(source)
+                execute(entry, time.perf_counter())
+
+        callers = [threading.Thread(target=caller) for _ in range(args.concurrency)]
+        for thread in callers:
+            thread.start()
+        for thread in callers:
+            thread.join()
+    return results, time.perf_counter() - started
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(pct / 100 * len(ordered))) - 1]
+
+
+def summarize(results, seconds):
+    """Summary of one group of results, latencies in milliseconds"""
+    ok = [r for r in results if r["ok"]]
+    errors = {}
+    for r in results:
+        if r["error"]:
+            errors[r["error"]] = errors.get(r["error"], 0) + 1
+
+    def stats(values):
+        return {f"p{pct}": round(percentile(values, pct) * 1000, 1) for pct in (50, 95, 99)}
+
+    ttfts = [r["ttft"] for r in ok if r["ttft"] is not None]
+    itls = [gap for r in ok for gap in r["itl"]]
+    tokens = sum(r["tokens"] for r in ok)
+    return {
+        "requests": len(results),
+        "errors": sum(errors.values()),
+        "error_rate": round(sum(errors.values()) / len(results), 4) if results else 0.0,
+        "errors_by_cause": errors,
+        "throughput_rps": round(len(ok) / seconds, 2) if seconds else 0.0,
+        "ttft_ms": stats(ttfts) if ttfts else None,
+        "itl_ms": stats(itls) if itls else None,
+        "e2e_ms": stats([r["e2e"] for r in ok]),
+        "output_tokens_per_s": round(tokens / seconds, 1) if seconds else 0.0,
+        "send_delay_p99_ms": round(percentile([r["delay"] for r in results], 99) * 1000, 1),
+    }
+
+
+def report(summary):
+    def triple(stats):
+        return "         -              " if not stats else \
+            f"{stats['p50']:>7.1f} {stats['p95']:>7.1f} {stats['p99']:>7.1f}"
+
+    print(f"{'':<8} {'requests':>8} {'err%':>7} {'req/s':>7} "
+          f"{'TTFT p50/p95/p99 ms':>23} {'ITL p50/p95/p99 ms':>23} {'E2E p50/p95/p99 ms':>23} {'tok/s':>8}")
+    for kind, s in summary.items():
+        if not s["requests"]:
+            continue
+        print(f"{kind:<8} {s['requests']:>8} {s['error_rate']:>7.1%} {s['throughput_rps']:>7.2f} "
+              f"{triple(s['ttft_ms'])} {triple(s['itl_ms'])} {triple(s['e2e_ms'])} {s['output_tokens_per_s']:>8.1f}")
+    for kind, s in summary.items():
+        if kind == "all":
+            continue
+        for cause, count in sorted(s["errors_by_cause"].items()):
+            print(f"  ✗ {kind}: {count} {cause}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a JSONL of chat and retrieval requests against the RAG endpoints")
+    parser.add_argument(
+        "requests_file",
+        help="JSONL file with one request body per line"
+    )
+    parser.add_argument(
+        "--target",
+        choices=sorted(CHAT_PATHS),
+        default="rag-server",
+        help="Endpoint flavour (default: rag-server)"
+    )
+    parser.add_argument(
+        "--base-url",
+        help="Base URL of the endpoint, without /v1 (default: the in-cluster service of --target)"
+    )
+    parser.add_argument(
+        "--model",
+        help="Model of the chat requests that do not name one (llama-stack, vllm)"
+    )
+    parser.add_argument(
+        "--collection",
+        help="Collection of the requests that do not name one, the vector store id on llama-stack"
+    )
+    parser.add_argument(
+        "--api-key",
+        help="Sent as Bearer token"
+    )
+    parser.add_argument(
+        "--max-tokens",
+        type=int,
+        help="max_tokens of the chat requests that do not set it"
+    )
+    parser.add_argument(
+        "--stream",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Stream chat responses, needed for TTFT and ITL (default: on, the rag-server always streams)"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Closed loop: callers sending back to back (default: 4)"
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        help="Open loop: requests per second, instead of --concurrency"
+    )
+    parser.add_argument(
+        "--arrival",
+        choices=["poisson", "constant", "recorded"],
+        default="poisson",
+        help="Open loop arrival times, recorded uses \"_at\" of the lines (default: poisson)"
+    )
+    parser.add_argument(
+        "--speedup",
+        type=float,
+        default=1.0,
+        help="Replay a recorded trace this many times faster (default: 1)"
+    )
+    parser.add_argument(
+        "--max-inflight",
+        type=int,
+        default=256,
+        help="Open loop: most requests in flight, later ones wait and it shows as latency (default: 256)"
+    )
+    parser.add_argument(
+        "--requests",
+        type=int,
+        help="Stop after this many requests (default: one pass over the file)"
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        help="Stop sending after this many seconds"
+    )
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        default=2,
+        help="Requests from the top of the file sent one at a time before the run and not counted (default: 2)"
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=300.0,
+        help="Seconds before a request counts as timed out (default: 300)"
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Seed of the Poisson arrivals (default: 0)"
+    )
+    parser.add_argument(
+        "--mock",
+        action="store_true",
+        help="Start mock_rag_server.py in-process and run against it"
+    )
+    parser.add_argument(
+        "--mock-ttft-ms",
+        type=float,
+        default=150.0,
+        help="--ttft-ms of the mock (default: 150)"
+    )
+    parser.add_argument(
+        "--mock-itl-ms",
+        type=float,
+        default=20.0,
+        help="--itl-ms of the mock (default: 20)"
+    )
+    parser.add_argument(
+        "--mock-tokens",
+        type=int,
+        default=64,
+        help="--tokens of the mock (default: 64)"
+    )
+    parser.add_argument(
+        "--mock-max-concurrent",
+        type=int,
+        default=32,
+        help="--max-concurrent of the mock (default: 32)"
+    )
+    parser.add_argument(
+        "--mock-error-rate",
+        type=float,
+        default=0.0,
+        help="--error-rate of the mock (default: 0)"
+    )
+    parser.add_argument(
+        "--max-error-rate",
+        type=float,
+        default=0.01,
+        help="Exit 1 when more requests than this fraction fail (default: 0.01)"
+    )
+    parser.add_argument(
+        "--save",
+        help="Write the summary and settings to this JSON file"
+    )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Print every failed request"
+    )
+
+    args = parser.parse_args()
+
+    if args.rate is not None and args.rate <= 0:
+        parser.error("--rate must be positive")
+    if args.arrival == "recorded" and args.rate:
+        parser.error("--arrival recorded takes its times from the file, drop --rate")
+
+    try:
+        entries = load_requests(args.requests_file)
+    except (OSError, ValueError) as e:
+        print(f"✗ {e}")
+        sys.exit(1)
+    if args.arrival == "recorded" and any(entry["at"] is None for entry in entries):
+        print(f"✗ --arrival recorded needs \"_at\" on every line of {args.requests_file}")
+        sys.exit(1)
+    if args.mock:
+        args.collection = args.collection or "mock"
+    supported = [entry for entry in entries if build_request(entry, args) is not None]
+    if len(supported) < len(entries):
+        print(f"  Skipping {len(entries) - len(supported)} searches, {args.target} has no search endpoint"
+              f"{' without --collection' if args.target == 'llama-stack' else ''}")
+    entries = supported
+    if not entries:
+        print(f"✗ No requests in {args.requests_file} for {args.target}")
+        sys.exit(1)
+    if not args.requests and not args.duration:
+        args.requests = len(entries)
+
+    mock = None
+    if args.mock:
+        mock, args.base_url = mock_rag_server.start(
+            ttft=args.mock_ttft_ms / 1000,
+            itl=args.mock_itl_ms / 1000,
+            tokens=args.mock_tokens,
+            search_latency=0.08,
+            max_concurrent=args.mock_max_concurrent,
+            error_rate=args.mock_error_rate,
+            seed=args.seed,
+        )
+    args.base_url = args.base_url or DEFAULT_URLS[args.target]
+
+    open_loop = args.rate or args.arrival == "recorded"
+    if not open_loop:
+        load = f"closed loop, {args.concurrency} callers"
+    elif args.arrival == "recorded":
+        load = f"open loop, recorded arrivals x{args.speedup}"
+    else:
+        load = f"open loop, {args.rate} req/s {args.arrival}"
+    limit = " and ".join(part for part in (args.requests and f"{args.requests} requests",
+                                           args.duration and f"{args.duration:g}s") if part)
+    print(f"Replaying {len(entries)} requests from {args.requests_file} against {args.target} {args.base_url}")
+    print(f"  {load}, stream {'on' if args.stream or args.target == 'rag-server' else 'off'}, up to {limit}")
+
+    try:
+        warmup(entries, args)
+        results, seconds = run(entries, args)
+    finally:
+        if mock:
+            mock.shutdown()
+
+    summary = {kind: summarize([r for r in results if r["kind"] == kind], seconds) for kind in ("chat", "search")}
+    summary["all"] = summarize(results, seconds)
+    print(f"\n{len(results)} requests in {seconds:.1f}s")
+    report(summary)
+    if open_loop and summary["all"]["send_delay_p99_ms"] > 100:
+        print(f"  ✗ requests waited up to {summary['all']['send_delay_p99_ms']:.0f} ms for a free sender, "
+              f"raise --max-inflight")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "target": args.target,
+                "base_url": args.base_url,
+                "requests_file": args.requests_file,
+                "load": load,
+                "stream": args.stream or args.target == "rag-server",
+                "seconds": round(seconds, 2),
+                "summary": summary,
+            }, f, indent=2)
+        print(f"✓ Results saved to {args.save}")
+
+    if not results:
+        print("✗ No requests sent")
+        sys.exit(1)
+    if summary["all"]["error_rate"] > args.max_error_rate:
+        print(f"✗ Error rate {summary['all']['error_rate']:.1%} is above {args.max_error_rate:.1%}")
+        sys.exit(1)
+    print(f"✓ Error rate {summary['all']['error_rate']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
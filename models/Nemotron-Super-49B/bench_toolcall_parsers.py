@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Benchmark the Nemotron tool call parsers on large adversarial outputs
+
+Generates multi-megabyte model outputs that are hard on regex based
+parsing (thousands of unclosed tags, large code parameters full of "<",
+deeply nested tags) and times extract_tool_calls and
+extract_tool_calls_streaming on them at increasing sizes. With a linear
+parser the time per MB stays flat as the size grows.
+
+Where vLLM is not installed the stand-ins of toolcall_parser_harness.py
+are used:
+
+    python bench_toolcall_parsers.py --sizes 1,2,4
+
+--baseline also times the regexes the XML parser used before, keep the
+sizes small (e.g. --sizes 0.05,0.1,0.2) since they are quadratic on
+unclosed tags.
+"""
+
+import argparse
+import importlib.util
+import os
+import re
+import sys
+import time
+
+PARSER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "llama_nemotron_toolcall_parser_no_streaming.py")
+
+MB = 1024 * 1024
+
+
+def load_parsers(path=PARSER_FILE):
+    """Import the parser plugin the way --tool-parser-plugin does"""
+    spec = importlib.util.spec_from_file_location("llama_nemotron_toolcall_parser", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def repeat_to(unit, size):
+    return unit * max(1, size // len(unit))
+
+
+def unclosed_tags(size):
+    """Every parameter is opened and never closed"""
+    return "<tool_call><tool>f</tool>" + repeat_to("<a>1 ", size) + "</tool_call>"
+
+
+def large_code_param(size):
+    """One huge parameter full of markup and comparisons"""
+    code = repeat_to("if (a < b && c > d) { x = '<div class=\"q\">' + y + '</div>'; }\n", size)
+    return f"<tool_call><tool>write_file</tool><path>app.js</path><content>{code}</content></tool_call>"
+
+
+def unclosed_block(size):
+    """A block that never ends, with a long unclosed parameter"""
+    return "Let me check.<tool_call><tool>f</tool><a>" + repeat_to("x < y ", size)
+
+
+def nested_tags(size):
+    """Same-named tags nested inside a parameter"""
+    depth = 1000
+    inner = "<c>" * depth + "leaf" + "</c>" * depth
+    return "<tool_call><tool>f</tool><c>" + repeat_to(inner, size) + "</c></tool_call>"
+
+
+def many_calls(size):
+    """Lots of small well formed tool calls"""
+    call = "<tool_call><tool>get_weather</tool><city>Paris</city><days>3</days></tool_call>\n"
+    return repeat_to(call, size)
+
+
+CASES = {
+    "unclosed_tags": unclosed_tags,
+    "large_code_param": large_code_param,
+    "unclosed_block": unclosed_block,
+    "nested_tags": nested_tags,
+    "many_calls": many_calls,
+}
+
+
+def regex_baseline(model_output):
+    """The block, name and backreference regexes the XML parser used before"""
+    block_regex = re.compile(r"<tool_call>(.*?)</tool_call>", re.DOTALL)
+    name_regex = re.compile(r"<tool>(.*?)</tool>", re.DOTALL)
+    param_regex = re.compile(r"<([^/>\s]+)>(.*?)</\1>", re.DOTALL)
+    calls = 0
+    for block in block_regex.findall(model_output):
+        if name_regex.search(block):
+            for _ in param_regex.finditer(block):
+                pass
+            calls += 1
+    return calls
+
+
+def time_non_streaming(parser, text, request):
+    start = time.perf_counter()
+    result = parser.extract_tool_calls(text, request)
+    return time.perf_counter() - start, len(result.tool_calls)
+
+
+def time_streaming(parser, text, request, delta_chars):
+    """Feed the text in fixed size deltas, only the parser calls are timed
+
+    Building every current_text copies the output, so small deltas on large
+    outputs make the benchmark itself slow, not the parser.
+    """
+    elapsed = 0.0
+    previous = ""
+    for end in range(delta_chars, len(text) + delta_chars, delta_chars):
+        current = text[:end]
+        start = time.perf_counter()
+        parser.extract_tool_calls_streaming(
+            previous, current, current[len(previous):], [], [], [], request
+        )
+        elapsed += time.perf_counter() - start
+        previous = current
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Nemotron tool call parsers")
+    parser.add_argument(
+        "--sizes",
+        default="1,2,4",
+        help="Comma separated output sizes in MB (default: 1,2,4)"
+    )
+    parser.add_argument(
+        "--cases",
+        default=",".join(CASES),
+        help=f"Comma separated cases (default: {','.join(CASES)})"
+    )
+    parser.add_argument(
+        "--delta-chars",
+        type=int,
+        default=4096,
+        help="Characters per streaming delta, 0 skips streaming (default: 4096)"
+    )
+    parser.add_argument(
+        "--baseline",
+        action="store_true",
+        help="Also time the previous regex based XML parsing"
+    )
+    parser.add_argument(
+        "--parser-file",
+        default=PARSER_FILE,
+        help="Parser plugin to benchmark (default: the copy next to this script)"
+    )
+
+    args = parser.parse_args()
+
+    from toolcall_parser_harness import install_stand_ins, make_request
+    install_stand_ins()
+    module = load_parsers(args.parser_file)
+    request = make_request([])
+
+    sizes = [float(size) for size in args.sizes.split(",")]
+    header = f"{'case':<18} {'MB':>6} {'calls':>6} {'parse s':>9} {'s/MB':>7}"
+    if args.delta_chars:
+        header += f" {'stream s':>9} {'s/MB':>7}"
+    if args.baseline:
+        header += f" {'regex s':>9}"
+    print(header)
+
+    for case in args.cases.split(","):
+        if case not in CASES:
+            print(f"✗ Unknown case: {case}", file=sys.stderr)
+            sys.exit(1)
+        for size in sizes:
+            text = CASES[case](int(size * MB))
+            megabytes = len(text) / MB
+
+            seconds, calls = time_non_streaming(module.LlamaNemotronXMLToolParser(None), text, request)
+            line = f"{case:<18} {megabytes:>6.2f} {calls:>6} {seconds:>9.3f} {seconds / megabytes:>7.3f}"
+            if args.delta_chars:
+                seconds = time_streaming(module.LlamaNemotronXMLToolParser(None), text, request, args.delta_chars)
+                line += f" {seconds:>9.3f} {seconds / megabytes:>7.3f}"
+            if args.baseline:
+                start = time.perf_counter()
+                regex_baseline(text)
+                line += f" {time.perf_counter() - start:>9.3f}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
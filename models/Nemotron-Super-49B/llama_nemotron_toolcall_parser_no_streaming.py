@@ -1,12 +1,28 @@
 import ast
+import functools
+import hashlib
 import json
+import keyword
 import re
-from collections.abc import Sequence
-from typing import Union
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Sequence
+from typing import Any, Union
 
 import partial_json_parser
 from partial_json_parser.core.options import Allow
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from prometheus_client import REGISTRY, Counter, Histogram
+except ImportError:
+    Counter = Histogram = None
+
 from vllm.entrypoints.openai.protocol import (
     ChatCompletionRequest,
     DeltaFunctionCall, DeltaMessage,
@@ -25,8 +41,568 @@ from vllm.utils import random_uuid
 
 logger = init_logger(__name__)
 
+# Schema indexes kept for recently seen tool definitions
+SCHEMA_INDEX_CACHE_SIZE = 128
+# Characters of a model output quoted when a parser fails on it
+LOG_OUTPUT_PREFIX_CHARS = 200
+
+XML_PARSER = "llama_nemotron_xml"
+JSON_PARSER = "llama_nemotron_json"
+PYTHONIC_PARSER = "llama_nemotron_pythonic"
+
+
+def _metric(metric_class, name: str, documentation: str, labelnames: list[str], **kwargs):
+    """Metric on the default registry, which vLLM serves on /metrics
+
+    Returns the already registered metric when the plugin is loaded twice in
+    one process, and None without prometheus_client.
+    """
+    if metric_class is None:
+        return None
+    try:
+        return metric_class(name, documentation, labelnames, **kwargs)
+    except ValueError:
+        return REGISTRY._names_to_collectors[name]
+
+
+_PARSE_DURATION = _metric(
+    Histogram,
+    "nemotron_tool_parser_duration_seconds",
+    "Time spent in one tool parser call, per delta when streaming",
+    ["parser", "mode"],
+    buckets=(1e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 1.0),
+)
+_TOOL_CALLS = _metric(Counter, "nemotron_tool_parser_tool_calls", "Tool calls parsed", ["parser", "mode"])
+_ARGUMENTS = _metric(Counter, "nemotron_tool_parser_arguments", "Tool call arguments parsed", ["parser", "mode"])
+_COERCION_FALLBACKS = _metric(
+    Counter,
+    "nemotron_tool_parser_coercion_fallbacks",
+    "Arguments kept as generated because they did not convert to the type in the tool schema",
+    ["parser", "reason"],
+)
+_FAILURES = _metric(
+    Counter,
+    "nemotron_tool_parser_failures",
+    "Tool calls or whole outputs the parser could not parse",
+    ["parser", "reason"],
+)
+
+
+def _count(counter, amount: int = 1, **labels: str) -> None:
+    if counter is not None and amount:
+        counter.labels(**labels).inc(amount)
+
+
+def _timed(parser: str, mode: str):
+    """Record the duration of every call of the decorated method"""
+    def decorate(method):
+        if _PARSE_DURATION is None:
+            return method
+        histogram = _PARSE_DURATION.labels(parser=parser, mode=mode)
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+
+        return timed
+    return decorate
+
+
+def _excerpt(model_output: str) -> str:
+    """Length and start of a model output, for logging it without the whole text"""
+    prefix = model_output[:LOG_OUTPUT_PREFIX_CHARS]
+    more = "..." if len(model_output) > len(prefix) else ""
+    return f"{len(model_output)} chars, starting {prefix!r}{more}"
+
+
+def _json_loads(text: str):
+    """json.loads, through orjson when it is installed"""
+    if orjson is not None:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            # json.loads accepts more (NaN, big integers, lone surrogates)
+            pass
+    return json.loads(text)
+
+
+class _NotSimpleLiteral(Exception):
+    """Syntax the fast literal parser leaves to ast"""
+
+
+# One token of the literal subset handled without ast, with leading whitespace
+_LITERAL_TOKEN = re.compile(r"""[ \t\n]*(?:
+    (?P<open>[\[{])
+  | '(?P<sq>[^'\\\n]*(?:\\[\\'"ntr][^'\\\n]*)*)'
+  | "(?P<dq>[^"\\\n]*(?:\\[\\'"ntr][^"\\\n]*)*)"
+  | (?P<num>[-+]?[ \t]*(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+)(?:[eE][+-]?[0-9]+)?)(?![A-Za-z0-9_.])
+  | (?P<name>[A-Za-z_][A-Za-z0-9_]*)(?![A-Za-z0-9_'"(\[.])
+)""", re.VERBOSE)
+_LITERAL_AFTER_ITEM = re.compile(r"[ \t\n]*([,\]}:])")
+_LITERAL_CLOSE = re.compile(r"[ \t\n]*([\]}])")
+_LITERAL_ESCAPE = re.compile(r"\\(.)")
+_LITERAL_ESCAPES = {"\\": "\\", "'": "'", '"': '"', "n": "\n", "t": "\t", "r": "\r"}
+_LITERAL_CONSTANTS = {"True": True, "False": False, "None": None}
+# Characters the Python tokenizer treats specially, always left to ast
+_LITERAL_UNSAFE = re.compile("[\\x00\\r\\ud800-\\udfff]")
+# Well below the nesting the Python parser accepts
+_LITERAL_MAX_DEPTH = 100
+_CALL_KEYWORD = re.compile(r"[ \t\n]*([A-Za-z_][A-Za-z0-9_]*)[ \t\n]*=(?!=)")
+_CALL_SEPARATOR = re.compile(r"[ \t\n]*(?:,|\Z)")
+_CALL_END = re.compile(r"[ \t\n]*\Z")
+_NO_KEY = object()
+
+
+def _literal_token_value(match: re.Match, bare_names: bool):
+    kind = match.lastgroup
+    token = match.group(kind)
+    if kind == "sq" or kind == "dq":
+        if "\\" in token:
+            token = _LITERAL_ESCAPE.sub(lambda m: _LITERAL_ESCAPES[m.group(1)], token)
+        return token
+    if kind == "num":
+        token = token.replace(" ", "").replace("\t", "")
+        if "." in token or "e" in token or "E" in token:
+            return float(token)
+        digits = token.lstrip("+-")
+        if (len(digits) > 1 and digits[0] == "0") or len(digits) > 100:
+            # Invalid leading zeros, or close to the int conversion limit
+            raise _NotSimpleLiteral()
+        return int(token)
+    if token in _LITERAL_CONSTANTS:
+        return _LITERAL_CONSTANTS[token]
+    if bare_names and not keyword.iskeyword(token):
+        return token
+    raise _NotSimpleLiteral()
+
+
+def _scan_literal(text: str, pos: int, bare_names: bool = False):
+    """Parse one literal starting at pos, returns (value, end)
+
+    Handles numbers, single and double quoted strings with simple escapes,
+    True/False/None, lists and dicts, which is what models put in tool call
+    arguments, without building an AST. With bare_names an identifier at the
+    top level evaluates to its name, as ast.Name does in
+    parse_function_arguments. Anything else (tuples, sets, prefixed or
+    implicitly concatenated strings, complex numbers, comments, ...) raises
+    _NotSimpleLiteral and is left to ast, so results are identical.
+    """
+    containers = []
+    keys = []
+    while True:
+        match = _LITERAL_TOKEN.match(text, pos)
+        if match is None:
+            raise _NotSimpleLiteral()
+        pos = match.end()
+
+        if match.lastgroup == "open":
+            if len(containers) >= _LITERAL_MAX_DEPTH:
+                raise _NotSimpleLiteral()
+            containers.append([] if match.group("open") == "[" else {})
+            keys.append(_NO_KEY)
+            close = _LITERAL_CLOSE.match(text, pos)
+            if close is None:
+                continue
+            # Empty container
+            pos = close.end()
+            value = containers.pop()
+            keys.pop()
+            if close.group(1) != ("]" if isinstance(value, list) else "}"):
+                raise _NotSimpleLiteral()
+        else:
+            value = _literal_token_value(match, bare_names and not containers)
+
+        # Add the value to its container, closing containers that end here
+        while containers:
+            container = containers[-1]
+            after = _LITERAL_AFTER_ITEM.match(text, pos)
+            if after is None:
+                raise _NotSimpleLiteral()
+            separator = after.group(1)
+            if isinstance(container, list):
+                container.append(value)
+            elif keys[-1] is _NO_KEY:
+                if separator != ":" or isinstance(value, (list, dict)):
+                    # A set, or not a literal
+                    raise _NotSimpleLiteral()
+                keys[-1] = value
+                pos = after.end()
+                break
+            else:
+                container[keys[-1]] = value
+                keys[-1] = _NO_KEY
+            pos = after.end()
+
+            if separator == ",":
+                close = _LITERAL_CLOSE.match(text, pos)
+                if close is None:
+                    break
+                # Trailing comma
+                pos = close.end()
+                separator = close.group(1)
+            if separator != ("]" if isinstance(container, list) else "}"):
+                raise _NotSimpleLiteral()
+            value = containers.pop()
+            keys.pop()
+        else:
+            return value, pos
+
+
+def _literal_eval(text: str):
+    """ast.literal_eval with a fast path for common literals"""
+    try:
+        stripped = text.lstrip(" \t")
+        if not stripped or stripped[0].isspace() or _LITERAL_UNSAFE.search(text):
+            raise _NotSimpleLiteral()
+        value, end = _scan_literal(text, len(text) - len(stripped))
+        if text[end:].strip(" \t"):
+            raise _NotSimpleLiteral()
+        return value
+    except _NotSimpleLiteral:
+        return ast.literal_eval(text)
+
+
+def _parse_call_arguments(args_str: str) -> dict:
+    """Fast path of parse_function_arguments
+
+    Parses "a=1, b='x', 2" into {"a": 1, "b": "x", "arg_0": 2}, raises
+    _NotSimpleLiteral for anything it cannot reproduce exactly.
+    """
+    if _LITERAL_UNSAFE.search(args_str):
+        raise _NotSimpleLiteral()
+    keywords = {}
+    positional = []
+    pos = 0
+    while not _CALL_END.match(args_str, pos):
+        match = _CALL_KEYWORD.match(args_str, pos)
+        if match is not None:
+            if keyword.iskeyword(match.group(1)) or match.group(1) in keywords:
+                # Repeated keywords are not valid Python, leave them to the ast path
+                raise _NotSimpleLiteral()
+            keywords[match.group(1)], pos = _scan_literal(args_str, match.end(), bare_names=True)
+        elif keywords:
+            # Positional argument follows keyword argument, a SyntaxError
+            raise _NotSimpleLiteral()
+        else:
+            value, pos = _scan_literal(args_str, pos, bare_names=True)
+            positional.append(value)
+        match = _CALL_SEPARATOR.match(args_str, pos)
+        if match is None:
+            raise _NotSimpleLiteral()
+        pos = match.end()
+
+    arguments = keywords
+    for i, value in enumerate(positional):
+        arguments[f"arg_{i}"] = value
+    return arguments
+
+
+def _coerce_untyped_string(param_value_str: str):
+    """Best effort conversion of a raw value without a schema type"""
+    try:
+        # For values like "true", "123", "['a', 'b']"
+        # ast.literal_eval('some_string_without_quotes') will raise SyntaxError
+        if (param_value_str.startswith("'") and param_value_str.endswith("'")) or \
+           (param_value_str.startswith('"') and param_value_str.endswith('"')) or \
+           (param_value_str.startswith('[') and param_value_str.endswith(']')) or \
+           (param_value_str.startswith('{') and param_value_str.endswith('}')) or \
+           param_value_str.lower() in ['true', 'false', 'none'] or \
+           param_value_str.replace('.', '', 1).isdigit() or \
+           (param_value_str.startswith('-') and param_value_str[1:].replace('.', '', 1).isdigit()):
+            return _literal_eval(param_value_str)
+        # It's likely a plain string not meant for ast.literal_eval
+        return param_value_str
+    except (ValueError, SyntaxError):
+        return param_value_str # Keep as string if ast.literal_eval fails
+
+
+def _json_or_literal(param_value_str: str):
+    try:
+        return _json_loads(param_value_str)
+    except json.JSONDecodeError:
+        # Fallback for non-strict JSON like Python dict/list string
+        return _literal_eval(param_value_str)
+
+
+def _json_if_string(value):
+    if isinstance(value, str):
+        try:
+            return _json_loads(value)
+        except json.JSONDecodeError:
+            # Keep as string if JSON parsing fails
+            pass
+    return value
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        return value.lower() in ['true', '1', 'yes']
+    return bool(value)
+
+
+# Raw text of an XML parameter -> declared type
+_STRING_CONVERTERS: dict[str, Callable[[str], Any]] = {
+    "integer": int,
+    "number": float,
+    "boolean": lambda value: value.lower() == 'true',
+    "object": _json_or_literal,
+    "array": _json_or_literal,
+}
+
+# Already parsed pythonic argument -> declared type
+_VALUE_CONVERTERS: dict[str, Callable[[Any], Any]] = {
+    "string": lambda value: value if isinstance(value, str) else str(value),
+    "integer": lambda value: value if isinstance(value, int) else int(value),
+    "number": lambda value: value if isinstance(value, (int, float)) else float(value),
+    "boolean": _to_bool,
+    "object": _json_if_string,
+    "array": _json_if_string,
+}
+
+
+def _string_coercer(param_name: str, target_type) -> Callable[[str], Any]:
+    convert = _STRING_CONVERTERS.get(target_type) if isinstance(target_type, str) else None
+    if convert is None:
+        # "string" or unknown type, keep as string
+        return lambda param_value_str: param_value_str
+
+    def coerce(param_value_str: str):
+        try:
+            return convert(param_value_str)
+        except (ValueError, SyntaxError, json.JSONDecodeError) as e:
+            logger.warning(
+                f"Could not convert param '{param_name}' with value '{param_value_str}' "
+                f"to type '{target_type}'. Error: {e}. Using string value."
+            )
+            # Only the XML parser converts raw strings
+            _count(_COERCION_FALLBACKS, parser=XML_PARSER, reason=target_type)
+            return param_value_str
+
+    return coerce
+
+
+def _value_coercer(param_name: str, target_type: str) -> Callable[[Any], Any]:
+    convert = _VALUE_CONVERTERS[target_type]
+
+    def coerce(value):
+        try:
+            return convert(value)
+        except (ValueError, TypeError) as e:
+            logger.warning(f"Type conversion failed for {param_name}: {e}")
+            # Only the pythonic parser converts parsed values
+            _count(_COERCION_FALLBACKS, parser=PYTHONIC_PARSER, reason=target_type)
+            # Keep original value if conversion fails
+            return value
+
+    return coerce
+
+
+class _ToolSchemaIndex:
+    """Coercers for the parameters of a request's tools
+
+    Maps tool name -> parameter name -> coercer for the parameter's declared
+    type, so converting an argument is two dict lookups instead of a scan of
+    every tool definition. Only typed parameters get an entry, the first
+    definition of a tool name wins.
+    """
+
+    def __init__(self, tools):
+        self.string_coercers: dict[str, dict[str, Callable[[str], Any]]] = {}
+        self.value_coercers: dict[str, dict[str, Callable[[Any], Any]]] = {}
+
+        for tool_def in tools or []:
+            tool_name = tool_def.function.name
+            if tool_name in self.string_coercers:
+                continue
+            string_coercers = self.string_coercers[tool_name] = {}
+            value_coercers = self.value_coercers[tool_name] = {}
+
+            parameters = tool_def.function.parameters
+            if not isinstance(parameters, dict) or not isinstance(parameters.get("properties"), dict):
+                continue
+            for param_name, param_info in parameters["properties"].items():
+                target_type = param_info.get("type") if isinstance(param_info, dict) else None
+                if not target_type:
+                    continue
+                string_coercers[param_name] = _string_coercer(param_name, target_type)
+                if isinstance(target_type, str) and target_type in _VALUE_CONVERTERS:
+                    value_coercers[param_name] = _value_coercer(param_name, target_type)
+
+    def coerce_string(self, tool_name: str, param_name: str, param_value_str: str):
+        """Convert a raw XML parameter value to its declared type"""
+        coercer = self.string_coercers.get(tool_name, {}).get(param_name)
+        if coercer is None:
+            return _coerce_untyped_string(param_value_str)
+        return coercer(param_value_str)
 
-@ToolParserManager.register_module("llama_nemotron_xml")
+    def coerce_values(self, tool_name: str, arguments: dict) -> None:
+        """Convert parsed arguments to their declared types in place"""
+        coercers = self.value_coercers.get(tool_name)
+        if not coercers:
+            return
+        for arg_name, arg_value in arguments.items():
+            coercer = coercers.get(arg_name)
+            if coercer is not None:
+                arguments[arg_name] = coercer(arg_value)
+
+
+_schema_index_cache: "OrderedDict[str, _ToolSchemaIndex]" = OrderedDict()
+_schema_index_lock = threading.Lock()
+
+
+def _tool_schema_index(tools) -> _ToolSchemaIndex:
+    """Schema index for request.tools, memoized by a hash of the tool definitions"""
+    if not tools:
+        return _ToolSchemaIndex(None)
+
+    digest = hashlib.sha256(json.dumps(
+        [[tool_def.function.name, tool_def.function.parameters] for tool_def in tools],
+        sort_keys=True,
+        default=str,
+    ).encode("utf-8")).hexdigest()
+
+    with _schema_index_lock:
+        index = _schema_index_cache.get(digest)
+        if index is not None:
+            _schema_index_cache.move_to_end(digest)
+            return index
+
+    index = _ToolSchemaIndex(tools)
+    with _schema_index_lock:
+        _schema_index_cache[digest] = index
+        while len(_schema_index_cache) > SCHEMA_INDEX_CACHE_SIZE:
+            _schema_index_cache.popitem(last=False)
+    return index
+
+
+# First character that cannot be part of a tag name
+_XML_TAG_NAME_END = re.compile(r"[/<>\s]")
+
+
+class _XMLToolCallScanner:
+    """Single pass scanner for the <tool_call> format
+
+    feed() is called with the whole text generated so far and only scans
+    what was appended since the previous call. It returns events:
+    ("content", text) for text before the first <tool_call>, ("start", None)
+    when a block opens, ("param", (name, value)) for every top-level element
+    of a block, <tool> included, and ("end", block_text) when </tool_call>
+    closes it.
+
+    Elements end at their balanced closing tag, so values may contain nested
+    and same-named tags. A tag name is a run of characters other than "/",
+    "<", ">" and whitespace. An element still open when its block ends is
+    treated as text and the complete elements inside it become parameters,
+    as if scanning restarted after its opening tag. Each character is looked
+    at a bounded number of times, so a scan is O(n) even for unclosed tags
+    and text fed in small deltas.
+    """
+
+    def __init__(self, start_token: str = "<tool_call>", end_tag: str = "tool_call"):
+        self.start_token = start_token
+        self.end_tag = end_tag
+
+        self.pos: int = 0
+        self.in_block: bool = False
+        self.block_seen: bool = False
+        self._block_start: int = 0
+        # Open elements, each [name, content_start, complete children as (name, start, end)]
+        self._stack: list[list] = []
+        self._open_names: dict[str, int] = {}
+        # "<" of a tag cut off at the end of the text, -1 if none
+        self._tag_start: int = -1
+
+    def feed(self, text: str) -> list[tuple[str, object]]:
+        events: list[tuple[str, object]] = []
+        while True:
+            if not self.in_block:
+                start = text.find(self.start_token, self.pos)
+                if start == -1:
+                    # Hold back a possible partial start token at the end of the text
+                    safe_end = len(text) - _partial_suffix_len(text, self.start_token)
+                    if not self.block_seen and safe_end > self.pos:
+                        events.append(("content", text[self.pos:safe_end]))
+                    self.pos = max(self.pos, safe_end)
+                    return events
+                if not self.block_seen and start > self.pos:
+                    events.append(("content", text[self.pos:start]))
+                self.block_seen = True
+                self.in_block = True
+                self._block_start = self.pos = start + len(self.start_token)
+                events.append(("start", None))
+
+            if not self._scan_block(text, events):
+                return events
+
+    def _scan_block(self, text: str, events: list) -> bool:
+        """Scan tags up to the end of the block, False if more text is needed"""
+        n = len(text)
+        while True:
+            if self._tag_start != -1:
+                lt = self._tag_start
+            else:
+                lt = text.find("<", self.pos)
+                if lt == -1:
+                    self.pos = n
+                    return False
+            name_start = lt + 1
+            if name_start < n and text[name_start] == "/":
+                name_start += 1
+            # Resume after the part of a cut off tag name that was already checked
+            stop = _XML_TAG_NAME_END.search(text, max(name_start, self.pos))
+            if stop is None:
+                self._tag_start = lt
+                self.pos = n
+                return False
+            self._tag_start = -1
+            name_end = stop.start()
+            if text[name_end] != ">" or name_end == name_start:
+                # Not a tag, the next "<" is at or after name_end
+                self.pos = lt + 1
+                continue
+
+            self.pos = name_end + 1
+            name = text[name_start:name_end]
+            if name_start == lt + 1:
+                self._stack.append([name, self.pos, []])
+                self._open_names[name] = self._open_names.get(name, 0) + 1
+            elif name == self.end_tag:
+                self._end_block(text, lt, events)
+                return True
+            elif self._open_names.get(name):
+                self._close(text, name, lt, events)
+
+    def _close(self, text: str, name: str, close_start: int, events: list) -> None:
+        # Elements opened inside this one and still open are part of its value
+        while True:
+            frame = self._stack.pop()
+            self._open_names[frame[0]] -= 1
+            if frame[0] == name:
+                break
+        if self._stack:
+            self._stack[-1][2].append((name, frame[1], close_start))
+        else:
+            events.append(("param", (name, text[frame[1]:close_start].strip())))
+
+    def _end_block(self, text: str, block_end: int, events: list) -> None:
+        # Unclosed elements are text, their complete children are parameters.
+        # Children of outer elements all precede the inner elements.
+        for frame in self._stack:
+            for name, start, end in frame[2]:
+                events.append(("param", (name, text[start:end].strip())))
+        events.append(("end", text[self._block_start:block_end]))
+        self._stack = []
+        self._open_names = {}
+        self.in_block = False
+
+
+@ToolParserManager.register_module(XML_PARSER)
 class LlamaNemotronXMLToolParser(ToolParser):
 
     def __init__(self, tokenizer: AnyTokenizer):
@@ -40,13 +616,33 @@ class LlamaNemotronXMLToolParser(ToolParser):
         self.tool_call_start_token: str = "<tool_call>"
         self.tool_call_end_token: str = "</tool_call>"
 
-        # Regex to find full <tool_call>...</tool_call> blocks and capture their content
-        self.tool_call_block_regex = re.compile(r"<tool_call>(.*?)</tool_call>", re.DOTALL)
-        # Regex to find <tool>...</tool> within a tool_call block content
-        self.name_regex = re.compile(r"<tool>(.*?)</tool>", re.DOTALL)
-        # Regex to find <key>value</key> pairs within the tool_call block content (excluding <tool> tags)
-        self.param_regex = re.compile(r"<([^/>\s]+)>(.*?)</\1>", re.DOTALL)
+        # Streaming state
+        self._scanner: _XMLToolCallScanner = _XMLToolCallScanner(self.tool_call_start_token)
+        self._block_tool_name: Union[str, None] = None
+        # Raw parameter values of the open block, the last of repeated names wins
+        self._block_params: dict[str, str] = {}
+
+        self._schema_index_request: Union[ChatCompletionRequest, None] = None
+        self._schema_index_value: Union[_ToolSchemaIndex, None] = None
 
+    def _schema_index(self, request: ChatCompletionRequest) -> _ToolSchemaIndex:
+        """Schema index of the request's tools, looked up once per request"""
+        if self._schema_index_request is not request:
+            self._schema_index_request = request
+            self._schema_index_value = _tool_schema_index(request.tools)
+        return self._schema_index_value
+
+    def _convert_param_value(
+        self,
+        tool_name: str,
+        param_name: str,
+        param_value_str: str,
+        request: ChatCompletionRequest,
+    ):
+        """Convert a raw <param> value to the type declared in the tool schema"""
+        return self._schema_index(request).coerce_string(tool_name, param_name, param_value_str)
+
+    @_timed(XML_PARSER, "non_streaming")
     def extract_tool_calls(
         self,
         model_output: str,
@@ -63,101 +659,45 @@ class LlamaNemotronXMLToolParser(ToolParser):
             )
         
         content = model_output[:tool_call_start_index].strip()
-        tool_calls_str_content = model_output[tool_call_start_index:]
 
         parsed_tool_calls = []
         
         try:
-            # Find all occurrences of <tool_call>...</tool_call>
-            xml_tool_call_contents = self.tool_call_block_regex.findall(tool_calls_str_content)
+            tool_name = None
+            params = []
+            for kind, value in _XMLToolCallScanner(self.tool_call_start_token).feed(model_output):
+                if kind == "start":
+                    tool_name = None
+                    params = []
+                elif kind == "param":
+                    param_name, param_value_str = value
+                    if param_name != "tool":
+                        params.append((param_name, param_value_str))
+                    elif tool_name is None:
+                        tool_name = param_value_str
+                elif kind == "end":
+                    if tool_name is None:
+                        logger.warning(f"Could not find tool name in XML block: {value}")
+                        _count(_FAILURES, parser=XML_PARSER, reason="missing_tool_name")
+                        continue
 
-            for tool_content_str in xml_tool_call_contents:
-                name_match = self.name_regex.search(tool_content_str)
-                if not name_match:
-                    logger.warning(f"Could not find tool name in XML block: {tool_content_str}")
-                    continue
-                tool_name = name_match.group(1).strip()
+                    parsed_arguments = {}
+                    for param_name, param_value_str in params:
+                        parsed_arguments[param_name] = self._convert_param_value(
+                            tool_name, param_name, param_value_str, request
+                        )
 
-                parsed_arguments = {}
-                
-                # Find all parameter tags in the tool_call content, excluding the <tool> tag
-                param_matches = self.param_regex.finditer(tool_content_str)
-                
-                for match in param_matches:
-                    param_name = match.group(1).strip()
-                    param_value_str = match.group(2).strip()
-                    
-                    # Skip the <tool> tag since it's not a parameter
-                    if param_name == "tool":
-                        continue
-                    
-                    target_type = None
-                    # Try to get type from request.tools schema
-                    if request.tools:
-                        for tool_def in request.tools:
-                            if tool_def.function.name == tool_name:
-                                if tool_def.function.parameters and \
-                                   isinstance(tool_def.function.parameters, dict) and \
-                                   "properties" in tool_def.function.parameters and \
-                                   isinstance(tool_def.function.parameters["properties"], dict) and \
-                                   param_name in tool_def.function.parameters["properties"] and \
-                                   isinstance(tool_def.function.parameters["properties"][param_name], dict):
-                                    target_type = tool_def.function.parameters["properties"][param_name].get("type")
-                                break
-                    
-                    typed_param_value = param_value_str # Default to string
-                    if target_type:
-                        try:
-                            if target_type == "string":
-                                typed_param_value = param_value_str
-                            elif target_type == "integer":
-                                typed_param_value = int(param_value_str)
-                            elif target_type == "number":
-                                typed_param_value = float(param_value_str)
-                            elif target_type == "boolean":
-                                typed_param_value = param_value_str.lower() == 'true'
-                            elif target_type in ["object", "array"]:
-                                try:
-                                    typed_param_value = json.loads(param_value_str)
-                                except json.JSONDecodeError:
-                                    # Fallback for non-strict JSON like Python dict/list string
-                                    typed_param_value = ast.literal_eval(param_value_str)
-                            else: # Unknown type, keep as string
-                                typed_param_value = param_value_str
-                        except (ValueError, SyntaxError, json.JSONDecodeError) as e:
-                            logger.warning(
-                                f"Could not convert param '{param_name}' with value '{param_value_str}' "
-                                f"to type '{target_type}'. Error: {e}. Using string value."
-                            )
-                            typed_param_value = param_value_str
-                    else: # No schema type, try ast.literal_eval
-                        try:
-                            # For values like "true", "123", "['a', 'b']"
-                            # ast.literal_eval('some_string_without_quotes') will raise SyntaxError
-                            if (param_value_str.startswith("'") and param_value_str.endswith("'")) or \
-                               (param_value_str.startswith('"') and param_value_str.endswith('"')) or \
-                               (param_value_str.startswith('[') and param_value_str.endswith(']')) or \
-                               (param_value_str.startswith('{') and param_value_str.endswith('}')) or \
-                               param_value_str.lower() in ['true', 'false', 'none'] or \
-                               param_value_str.replace('.', '', 1).isdigit() or \
-                               (param_value_str.startswith('-') and param_value_str[1:].replace('.', '', 1).isdigit()):
-                                typed_param_value = ast.literal_eval(param_value_str)
-                            else: # It's likely a plain string not meant for ast.literal_eval
-                                typed_param_value = param_value_str
-                        except (ValueError, SyntaxError):
-                            typed_param_value = param_value_str # Keep as string if ast.literal_eval fails
-
-                    parsed_arguments[param_name] = typed_param_value
-                
-                parsed_tool_calls.append(ToolCall(
-                    id=f"call_{random_uuid()}",
-                    type="function",
-                    function=FunctionCall(
-                        name=tool_name,
-                        arguments=json.dumps(parsed_arguments, ensure_ascii=False),
-                    ),
-                ))
+                    parsed_tool_calls.append(ToolCall(
+                        id=f"call_{random_uuid()}",
+                        type="function",
+                        function=FunctionCall(
+                            name=tool_name,
+                            arguments=json.dumps(parsed_arguments, ensure_ascii=False),
+                        ),
+                    ))
+                    _count(_ARGUMENTS, len(parsed_arguments), parser=XML_PARSER, mode="non_streaming")
 
+            _count(_TOOL_CALLS, len(parsed_tool_calls), parser=XML_PARSER, mode="non_streaming")
             return ExtractedToolCallInformation(
                 tools_called=len(parsed_tool_calls) > 0,
                 tool_calls=parsed_tool_calls,
@@ -165,7 +705,8 @@ class LlamaNemotronXMLToolParser(ToolParser):
             )
 
         except Exception:
-            logger.exception(f"Error in extracting XML tool call from response. Response: {model_output}")
+            logger.exception(f"Error in extracting XML tool call from response of {_excerpt(model_output)}")
+            _count(_FAILURES, parser=XML_PARSER, reason="exception")
             # Fallback to original model output if parsing fails catastrophically
             return ExtractedToolCallInformation(
                 tools_called=False,
@@ -173,6 +714,7 @@ class LlamaNemotronXMLToolParser(ToolParser):
                 content=model_output,
             )
 
+    @_timed(XML_PARSER, "streaming")
     def extract_tool_calls_streaming(
         self,
         previous_text: str,
@@ -183,11 +725,418 @@ class LlamaNemotronXMLToolParser(ToolParser):
         delta_token_ids: Sequence[int],
         request: ChatCompletionRequest,
     ) -> Union[DeltaMessage, None]:
+        """Stream content up to the first <tool_call>, then emit each tool name
+        as soon as </tool> has been generated and its arguments when
+        </tool_call> closes the block.
 
-        raise NotImplementedError("Tool calling is not supported in streaming mode!")
+        A parameter may repeat later in the block and extract_tool_calls keeps
+        its last value, so the arguments are held back until the block ends and
+        then sent as the same JSON object extract_tool_calls produces.
+
+        Content ending in a prefix of <tool_call> is held back only while it
+        can still become the tag. vLLM does not call the parser again when the
+        output ends, so an output that ends in e.g. "<" loses it when streamed.
+        """
+        content_parts: list[str] = []
+        tool_deltas: dict[int, dict] = {}
+
+        try:
+            self._scan_streaming(current_text, request, content_parts, tool_deltas)
+        except Exception:
+            logger.exception("Error in streaming XML tool call extraction")
+            _count(_FAILURES, parser=XML_PARSER, reason="exception")
+            return None
+
+        return _build_delta_message(content_parts, tool_deltas)
+
+    def _scan_streaming(
+        self,
+        text: str,
+        request: ChatCompletionRequest,
+        content_parts: list[str],
+        tool_deltas: dict[int, dict],
+    ) -> None:
+        """Advance the streaming scan over text, collecting what became complete"""
+        for kind, value in self._scanner.feed(text):
+            if kind == "content":
+                content_parts.append(value)
+            elif kind == "start":
+                self._block_tool_name = None
+                self._block_params = {}
+            elif kind == "param":
+                param_name, param_value_str = value
+                if param_name != "tool":
+                    self._block_params[param_name] = param_value_str
+                elif self._block_tool_name is None:
+                    self._start_streamed_tool_call(param_value_str, tool_deltas)
+            elif kind == "end":
+                if self._block_tool_name is not None:
+                    self._stream_arguments(request, tool_deltas)
+                else:
+                    logger.warning(f"Could not find tool name in XML block: {value}")
+                    _count(_FAILURES, parser=XML_PARSER, reason="missing_tool_name")
+
+    def _start_streamed_tool_call(self, tool_name: str, tool_deltas: dict[int, dict]) -> None:
+        self.current_tool_id += 1
+        self.current_tool_name_sent = True
+        self._block_tool_name = tool_name
+        self.prev_tool_call_arr.append({"name": tool_name, "arguments": {}})
+        self.streamed_args_for_tool.append("")
+        tool_deltas[self.current_tool_id] = {"id": f"call_{random_uuid()}", "name": tool_name}
+        _count(_TOOL_CALLS, parser=XML_PARSER, mode="streaming")
+
+    def _stream_arguments(self, request: ChatCompletionRequest, tool_deltas: dict[int, dict]) -> None:
+        arguments = self.prev_tool_call_arr[self.current_tool_id]["arguments"]
+        for param_name, param_value_str in self._block_params.items():
+            arguments[param_name] = self._convert_param_value(
+                self._block_tool_name, param_name, param_value_str, request
+            )
+        self._block_params = {}
+        _count(_ARGUMENTS, len(arguments), parser=XML_PARSER, mode="streaming")
+        fragment = json.dumps(arguments, ensure_ascii=False)
+        self.streamed_args_for_tool[self.current_tool_id] += fragment
+        delta = tool_deltas.setdefault(self.current_tool_id, {})
+        delta["arguments"] = delta.get("arguments", "") + fragment
+
+
+def _partial_suffix_len(text: str, token: str) -> int:
+    """Length of the longest suffix of text that is a proper prefix of token"""
+    for length in range(min(len(token) - 1, len(text)), 0, -1):
+        if text.endswith(token[:length]):
+            return length
+    return 0
+
+
+def _build_delta_message(content_parts: list[str], tool_deltas: dict[int, dict]) -> Union[DeltaMessage, None]:
+    """DeltaMessage for the content and tool call fragments collected in one step"""
+    if not content_parts and not tool_deltas:
+        return None
+
+    delta_tool_calls = []
+    for index, delta in tool_deltas.items():
+        delta_tool_calls.append(DeltaToolCall(
+            index=index,
+            id=delta.get("id"),
+            type="function" if "name" in delta else None,
+            function=DeltaFunctionCall(
+                name=delta.get("name"),
+                arguments=delta.get("arguments"),
+            ).model_dump(exclude_none=True),
+        ))
+
+    return DeltaMessage(
+        content="".join(content_parts) if content_parts else None,
+        tool_calls=delta_tool_calls,
+    )
+
+
+_JSON_STRING_STOP = re.compile(r'["\\]')
+_JSON_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_JSON_WHITESPACE = frozenset(" \t\r\n")
+_JSON_SCALAR_END = frozenset(" \t\r\n,:]}")
+
+
+class _JSONToolCallScanner:
+    """Incremental scanner for the JSON array of a <TOOLCALL> block
+
+    feed() only looks at the newly generated text and returns events:
+    ("name", name) once a call's name string is complete and its arguments
+    have started, and ("arguments", fragment) as its arguments grow. The
+    arguments are re-emitted in json.dumps(..., ensure_ascii=False) form, so
+    the fragments add up to exactly what extract_tool_calls returns for
+    object arguments, and to what vLLM compares them with at the end of the
+    stream for string arguments too. Arguments generated before the name are
+    held back until the name is known, and a call without arguments is never
+    sent, as extract_tool_calls skips it.
+    """
+
+    def __init__(self):
+        # Open containers, each [bracket, expecting_key, last_key]
+        self.stack: list[list] = []
+        self.done: bool = False
+
+        self._lex: Union[str, None] = None  # None, "string", "escape", "unicode" or "scalar"
+        self._token: str = ""
+        self._high_surrogate: str = ""
+        self._string_role: Union[str, None] = None
+        self._string_parts: list[str] = []
+
+        self._args_depth: Union[int, None] = None  # Stack depth of the arguments value while inside it
+        self._args_is_string: bool = False  # The arguments value is a JSON string, not an object
+        self._has_arguments: bool = False
+        self._name: Union[str, None] = None
+        self._name_sent: bool = False
+        self._pending_args: list[str] = []
+        self._events: list[tuple[str, str]] = []
+
+    def feed(self, text: str) -> list[tuple[str, str]]:
+        self._events = []
+        i, n = 0, len(text)
+        while i < n and not self.done:
+            if self._lex == "string":
+                # Take the whole run of plain characters at once
+                match = _JSON_STRING_STOP.search(text, i)
+                end = match.start() if match else n
+                if end > i:
+                    self._string_chars(text[i:end])
+                if match is None:
+                    break
+                i = end + 1
+                if text[end] == '"':
+                    self._end_string()
+                else:
+                    self._lex = "escape"
+                continue
+
+            ch = text[i]
+            i += 1
+            if self._lex == "escape":
+                if ch == "u":
+                    self._lex = "unicode"
+                    self._token = ""
+                else:
+                    self._lex = "string"
+                    self._string_chars(_JSON_ESCAPES.get(ch, ch))
+                continue
+            if self._lex == "unicode":
+                self._token += ch
+                if len(self._token) == 4:
+                    self._lex = "string"
+                    self._string_chars(chr(int(self._token, 16)))
+                continue
+            if self._lex == "scalar":
+                if ch not in _JSON_SCALAR_END:
+                    self._token += ch
+                    continue
+                self._lex = None
+                self._end_scalar()
+            self._structural(ch)
+        return self._events
+
+    def _in_call_value(self, key: str) -> bool:
+        """True if the next value belongs to key of a top-level call object"""
+        return len(self.stack) == 2 and self.stack[1][0] == "{" and \
+            not self.stack[1][1] and self.stack[1][2] == key
 
+    def _structural(self, ch: str) -> None:
+        if ch in _JSON_WHITESPACE:
+            return
+        capturing = self._args_depth is not None
+        if ch == "{" or ch == "[":
+            if not self.stack:
+                # A single call without the surrounding array
+                self.stack.append(["[", False, None])
+                if ch == "[":
+                    return
+            if capturing:
+                self._emit_args(ch)
+            elif self._in_call_value("arguments") and not self._has_arguments:
+                self._args_depth = len(self.stack)
+                self._args_is_string = False
+                self._emit_args(ch)
+            elif len(self.stack) == 1 and ch == "{":
+                self._start_call()
+            self.stack.append([ch, ch == "{", None])
+        elif ch == "}" or ch == "]":
+            if not self.stack or self.stack.pop()[0] != ("{" if ch == "}" else "["):
+                raise ValueError(f"Unbalanced {ch!r} in tool call JSON")
+            if capturing:
+                self._emit_args(ch)
+                if len(self.stack) == self._args_depth:
+                    self._end_arguments()
+            elif len(self.stack) == 1 and ch == "}":
+                self._end_call()
+            if not self.stack:
+                self.done = True
+        elif ch == ",":
+            if capturing:
+                self._emit_args(", ")
+            if self.stack and self.stack[-1][0] == "{":
+                self.stack[-1][1] = True
+        elif ch == ":":
+            if capturing:
+                self._emit_args(": ")
+                if len(self.stack) == self._args_depth + 1:
+                    # A key of the arguments object
+                    _count(_ARGUMENTS, parser=JSON_PARSER, mode="streaming")
+        elif ch == '"':
+            self._start_string()
+        elif self.stack:
+            # First character of a number, true, false or null
+            self._lex = "scalar"
+            self._token = ch
+        else:
+            raise ValueError(f"Unexpected {ch!r} before the tool call array")
+
+    def _start_call(self) -> None:
+        self._has_arguments = False
+        self._name = None
+        self._name_sent = False
+        self._pending_args = []
+
+    def _end_call(self) -> None:
+        if not self._name_sent:
+            logger.warning("Could not find tool name or arguments in JSON tool call")
+            _count(_FAILURES, parser=JSON_PARSER, reason="missing_name_or_arguments")
+
+    def _end_arguments(self) -> None:
+        self._args_depth = None
+        self._has_arguments = True
+        if self._name is not None and not self._name_sent:
+            self._send_name()
+
+    def _send_name(self) -> None:
+        self._name_sent = True
+        self._events.append(("name", self._name))
+        if self._pending_args:
+            self._events.append(("arguments", "".join(self._pending_args)))
+            self._pending_args = []
+
+    def _emit_args(self, fragment: str) -> None:
+        if not self._name_sent and self._name is not None:
+            self._send_name()
+        if self._name_sent:
+            self._events.append(("arguments", fragment))
+        else:
+            self._pending_args.append(fragment)
+
+    def _start_string(self) -> None:
+        if not self.stack:
+            raise ValueError("Unexpected string before the tool call array")
+        frame = self.stack[-1]
+        if self._args_depth is not None:
+            role = "arguments"
+            self._emit_args('"')
+        elif len(self.stack) == 2 and frame[0] == "{" and frame[1]:
+            role = "key"
+        elif self._in_call_value("name") and self._name is None:
+            role = "name"
+        elif self._in_call_value("arguments") and not self._has_arguments:
+            role = "arguments"
+            self._args_depth = len(self.stack)
+            self._args_is_string = True
+            self._emit_args('"')
+        else:
+            role = None
+        self._string_role = role
+        self._string_parts = []
+        self._lex = "string"
+
+    def _string_chars(self, chars: str) -> None:
+        # Join surrogate pairs from \uXXXX escapes as json.loads does
+        if self._high_surrogate:
+            high, self._high_surrogate = self._high_surrogate, ""
+            if "\udc00" <= chars[0] <= "\udfff":
+                chars = chr(0x10000 + ((ord(high) - 0xD800) << 10) + ord(chars[0]) - 0xDC00) + chars[1:]
+            else:
+                chars = high + chars
+        if "\ud800" <= chars[-1] <= "\udbff":
+            self._high_surrogate = chars[-1]
+            chars = chars[:-1]
+        if chars:
+            self._dispatch_string_chars(chars)
+
+    def _dispatch_string_chars(self, chars: str) -> None:
+        role = self._string_role
+        if role == "arguments":
+            self._emit_args(json.dumps(chars, ensure_ascii=False)[1:-1])
+        elif role is not None:
+            self._string_parts.append(chars)
+
+    def _end_string(self) -> None:
+        self._lex = None
+        if self._high_surrogate:
+            # Unpaired, kept as is
+            self._dispatch_string_chars(self._high_surrogate)
+            self._high_surrogate = ""
+
+        frame = self.stack[-1]
+        role = self._string_role
+        if role == "arguments":
+            self._emit_args('"')
+            if self._args_is_string:
+                self._end_arguments()
+        elif role == "key":
+            frame[2] = "".join(self._string_parts)
+        elif role == "name":
+            self._name = "".join(self._string_parts)
+            if self._has_arguments or self._pending_args:
+                self._send_name()
+        if frame[0] == "{" and frame[1]:
+            # That string was a key
+            frame[1] = False
+
+    def _end_scalar(self) -> None:
+        token, self._token = self._token, ""
+        value = json.loads(token)
+        if self._args_depth is not None:
+            self._emit_args(json.dumps(value, ensure_ascii=False))
+
+
+class _StreamedArguments(list):
+    """streamed_args_for_tool with O(1) appends
+
+    Each entry is kept as a list of fragments and joined when it is read,
+    instead of copying the whole string for every delta.
+    """
+
+    def append(self, value: str) -> None:
+        super().append([value])
+
+    def append_fragment(self, index: int, fragment: str) -> None:
+        super().__getitem__(index).append(fragment)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(len(self))[index]]
+        parts = super().__getitem__(index)
+        if len(parts) > 1:
+            parts[:] = ["".join(parts)]
+        return parts[0]
+
+    def __setitem__(self, index, value) -> None:
+        super().__getitem__(index)[:] = [value]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class _StreamedToolCall(dict):
+    """prev_tool_call_arr entry whose arguments are parsed when they are read
+
+    vLLM only reads the arguments at the end of the stream, to autocomplete
+    what was streamed, so the per-delta path never re-parses them.
+    """
 
-@ToolParserManager.register_module("llama_nemotron_json")
+    def __init__(self, name: str, streamed_args_for_tool: _StreamedArguments, index: int):
+        super().__init__(name=name)
+        self._streamed_args_for_tool = streamed_args_for_tool
+        self._index = index
+
+    def __getitem__(self, key):
+        if key == "arguments":
+            return self._arguments()
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        if key == "arguments":
+            return self._arguments()
+        return super().get(key, default)
+
+    def _arguments(self):
+        # String arguments were streamed JSON encoded and parse back to the
+        # string, so json.dumps of the result is what was streamed either way
+        streamed = self._streamed_args_for_tool[self._index]
+        if not streamed:
+            return {}
+        try:
+            return partial_json_parser.loads(streamed, Allow.ALL)
+        except Exception:
+            return {}
+
+
+@ToolParserManager.register_module(JSON_PARSER)
 class LlamaNemotronJSONToolParser(ToolParser):
 
     def __init__(self, tokenizer: AnyTokenizer):
@@ -196,13 +1145,18 @@ class LlamaNemotronJSONToolParser(ToolParser):
         self.current_tool_name_sent: bool = False
         self.prev_tool_call_arr: list[dict] = []
         self.current_tool_id: int = -1
-        self.streamed_args_for_tool: list[str] = []
+        self.streamed_args_for_tool: list[str] = _StreamedArguments()
 
         self.tool_call_start_token: str = "<TOOLCALL>"
         self.tool_call_end_token: str = "</TOOLCALL>"
 
         self.tool_call_regex = re.compile(r"<TOOLCALL>(.*?)</TOOLCALL>", re.DOTALL)
 
+        # Streaming state, _scan_pos is an offset into current_text
+        self._scan_pos: int = 0
+        self._scanner: Union[_JSONToolCallScanner, None] = None
+
+    @_timed(JSON_PARSER, "non_streaming")
     def extract_tool_calls(
         self,
         model_output: str,
@@ -224,7 +1178,7 @@ class LlamaNemotronJSONToolParser(ToolParser):
                     str_tool_calls = "[" + str_tool_calls
                 if not str_tool_calls.endswith("]"):
                     str_tool_calls = "]" + str_tool_calls
-                json_tool_calls = json.loads(str_tool_calls)
+                json_tool_calls = _json_loads(str_tool_calls)
                 tool_calls = []
                 for tool_call in json_tool_calls:
                     try:
@@ -237,7 +1191,11 @@ class LlamaNemotronJSONToolParser(ToolParser):
                             ),
                         ))
                     except:
+                        _count(_FAILURES, parser=JSON_PARSER, reason="invalid_tool_call")
                         continue
+                    if isinstance(tool_call["arguments"], dict):
+                        _count(_ARGUMENTS, len(tool_call["arguments"]), parser=JSON_PARSER, mode="non_streaming")
+                _count(_TOOL_CALLS, len(tool_calls), parser=JSON_PARSER, mode="non_streaming")
 
                 content = model_output[:model_output.rfind(self.tool_call_start_token)]
 
@@ -247,14 +1205,16 @@ class LlamaNemotronJSONToolParser(ToolParser):
                     content=content if content else None,
                 )
 
-            except Exception:
-                logger.exception(f"Error in extracting tool call from response. Response: {model_output}")
+            except Exception as e:
+                logger.exception(f"Error in extracting tool call from response of {_excerpt(model_output)}")
+                _count(_FAILURES, parser=JSON_PARSER, reason="invalid_json" if isinstance(e, ValueError) else "exception")
                 return ExtractedToolCallInformation(
                     tools_called=False,
                     tool_calls=[],
                     content=model_output,
                 )
 
+    @_timed(JSON_PARSER, "streaming")
     def extract_tool_calls_streaming(
         self,
         previous_text: str,
@@ -265,11 +1225,78 @@ class LlamaNemotronJSONToolParser(ToolParser):
         delta_token_ids: Sequence[int],
         request: ChatCompletionRequest,
     ) -> Union[DeltaMessage, None]:
+        """Stream content up to <TOOLCALL>, then scan the JSON array
+        incrementally, emitting each name once its string is complete and
+        arguments as they grow.
 
-        raise NotImplementedError("Tool calling is not supported in streaming mode!")
+        Only the text generated since the previous call is scanned, so long
+        arguments stay linear in the output length. As in the XML parser, an
+        output ending in a prefix of <TOOLCALL> loses it when streamed.
+        """
+        content_parts: list[str] = []
+        tool_deltas: dict[int, dict] = {}
+
+        try:
+            self._scan_streaming(current_text, content_parts, tool_deltas)
+        except Exception:
+            logger.exception("Error in streaming JSON tool call extraction")
+            _count(_FAILURES, parser=JSON_PARSER, reason="exception")
+            # Nothing more can be parsed from this block
+            if self._scanner is not None:
+                self._scanner.done = True
+
+        return _build_delta_message(content_parts, tool_deltas)
+
+    def _scan_streaming(
+        self,
+        text: str,
+        content_parts: list[str],
+        tool_deltas: dict[int, dict],
+    ) -> None:
+        if self._scanner is None:
+            start = text.find(self.tool_call_start_token, self._scan_pos)
+            if start == -1:
+                # Hold back a possible partial start token at the end of the text
+                safe_end = len(text) - _partial_suffix_len(text, self.tool_call_start_token)
+                if safe_end > self._scan_pos:
+                    content_parts.append(text[self._scan_pos:safe_end])
+                    self._scan_pos = safe_end
+                return
+            if start > self._scan_pos:
+                content_parts.append(text[self._scan_pos:start])
+            self._scanner = _JSONToolCallScanner()
+            self._scan_pos = start + len(self.tool_call_start_token)
+
+        # Only the first block is parsed, as in extract_tool_calls
+        if self._scanner.done:
+            return
+        end = text.find(self.tool_call_end_token, self._scan_pos)
+        block_closed = end != -1
+        if not block_closed:
+            end = len(text) - _partial_suffix_len(text, self.tool_call_end_token)
+        chunk = text[self._scan_pos:end]
+        self._scan_pos = max(self._scan_pos, end)
+
+        events = self._scanner.feed(chunk)
+        if block_closed:
+            self._scanner.done = True
+        for kind, value in events:
+            if kind == "name":
+                self.current_tool_id += 1
+                self.current_tool_name_sent = True
+                self.streamed_args_for_tool.append("")
+                self.prev_tool_call_arr.append(
+                    _StreamedToolCall(value, self.streamed_args_for_tool, self.current_tool_id)
+                )
+                tool_deltas[self.current_tool_id] = {"id": f"call_{random_uuid()}", "name": value}
+                _count(_TOOL_CALLS, parser=JSON_PARSER, mode="streaming")
+            else:
+                self.streamed_args_for_tool.append_fragment(self.current_tool_id, value)
+                delta = tool_deltas.setdefault(self.current_tool_id, {})
+                delta["arguments"] = delta.get("arguments", "") + value
 
 
-@ToolParserManager.register_module("llama_nemotron_pythonic")
+@ToolParserManager.register_module(PYTHONIC_PARSER)
 class LlamaNemotronPythonicToolParser(ToolParser):
 
     def __init__(self, tokenizer: AnyTokenizer):
@@ -287,10 +1314,26 @@ class LlamaNemotronPythonicToolParser(ToolParser):
         # Regex to parse pythonic function calls: function_name(arg1="value1", arg2=123, arg3=True)
         self.function_call_regex = re.compile(r"(\w+)\((.*?)\)$", re.DOTALL)
 
+        self._schema_index_request: Union[ChatCompletionRequest, None] = None
+        self._schema_index_value: Union[_ToolSchemaIndex, None] = None
+
+    def _schema_index(self, request: ChatCompletionRequest) -> _ToolSchemaIndex:
+        """Schema index of the request's tools, looked up once per request"""
+        if self._schema_index_request is not request:
+            self._schema_index_request = request
+            self._schema_index_value = _tool_schema_index(request.tools)
+        return self._schema_index_value
+
     def parse_function_arguments(self, args_str: str) -> dict:
         """Parse pythonic function arguments string into a dictionary"""
         if not args_str.strip():
             return {}
+
+        # Plain literal arguments are parsed without building an AST
+        try:
+            return _parse_call_arguments(args_str)
+        except _NotSimpleLiteral:
+            pass
         
         # Use ast.parse to safely parse the function call arguments
         # We'll construct a temporary function call and parse it
@@ -342,8 +1385,10 @@ class LlamaNemotronPythonicToolParser(ToolParser):
             
         except (SyntaxError, ValueError) as e:
             logger.warning(f"Failed to parse function arguments '{args_str}': {e}")
+            _count(_FAILURES, parser=PYTHONIC_PARSER, reason="invalid_arguments")
             return {}
 
+    @_timed(PYTHONIC_PARSER, "non_streaming")
     def extract_tool_calls(
         self,
         model_output: str,
@@ -382,6 +1427,7 @@ class LlamaNemotronPythonicToolParser(ToolParser):
                 match = self.function_call_regex.match(func_line)
                 if not match:
                     logger.warning(f"Could not parse function call: {func_line}")
+                    _count(_FAILURES, parser=PYTHONIC_PARSER, reason="unparsable_call")
                     continue
                 
                 function_name = match.group(1)
@@ -391,45 +1437,7 @@ class LlamaNemotronPythonicToolParser(ToolParser):
                 parsed_arguments = self.parse_function_arguments(args_str)
                 
                 # Apply type conversion based on schema if available
-                if request.tools:
-                    for tool_def in request.tools:
-                        if tool_def.function.name == function_name:
-                            schema_properties = {}
-                            if (tool_def.function.parameters and 
-                                isinstance(tool_def.function.parameters, dict) and 
-                                "properties" in tool_def.function.parameters and 
-                                isinstance(tool_def.function.parameters["properties"], dict)):
-                                schema_properties = tool_def.function.parameters["properties"]
-                            
-                            # Convert arguments based on schema types
-                            for arg_name, arg_value in parsed_arguments.items():
-                                if arg_name in schema_properties:
-                                    param_info = schema_properties[arg_name]
-                                    target_type = param_info.get("type")
-                                    
-                                    try:
-                                        if target_type == "string" and not isinstance(arg_value, str):
-                                            parsed_arguments[arg_name] = str(arg_value)
-                                        elif target_type == "integer" and not isinstance(arg_value, int):
-                                            parsed_arguments[arg_name] = int(arg_value)
-                                        elif target_type == "number" and not isinstance(arg_value, (int, float)):
-                                            parsed_arguments[arg_name] = float(arg_value)
-                                        elif target_type == "boolean" and not isinstance(arg_value, bool):
-                                            if isinstance(arg_value, str):
-                                                parsed_arguments[arg_name] = arg_value.lower() in ['true', '1', 'yes']
-                                            else:
-                                                parsed_arguments[arg_name] = bool(arg_value)
-                                        elif target_type in ["object", "array"]:
-                                            if isinstance(arg_value, str):
-                                                try:
-                                                    parsed_arguments[arg_name] = json.loads(arg_value)
-                                                except json.JSONDecodeError:
-                                                    # Keep as string if JSON parsing fails
-                                                    pass
-                                    except (ValueError, TypeError) as e:
-                                        logger.warning(f"Type conversion failed for {arg_name}: {e}")
-                                        # Keep original value if conversion fails
-                            break
+                self._schema_index(request).coerce_values(function_name, parsed_arguments)
                 
                 parsed_tool_calls.append(ToolCall(
                     id=f"call_{random_uuid()}",
@@ -439,7 +1447,9 @@ class LlamaNemotronPythonicToolParser(ToolParser):
                         arguments=json.dumps(parsed_arguments, ensure_ascii=False),
                     ),
                 ))
+                _count(_ARGUMENTS, len(parsed_arguments), parser=PYTHONIC_PARSER, mode="non_streaming")
 
+            _count(_TOOL_CALLS, len(parsed_tool_calls), parser=PYTHONIC_PARSER, mode="non_streaming")
             return ExtractedToolCallInformation(
                 tools_called=len(parsed_tool_calls) > 0,
                 tool_calls=parsed_tool_calls,
@@ -447,7 +1457,8 @@ class LlamaNemotronPythonicToolParser(ToolParser):
             )
 
         except Exception:
-            logger.exception(f"Error in extracting pythonic tool call from response. Response: {model_output}")
+            logger.exception(f"Error in extracting pythonic tool call from response of {_excerpt(model_output)}")
+            _count(_FAILURES, parser=PYTHONIC_PARSER, reason="exception")
             return ExtractedToolCallInformation(
                 tools_called=False,
                 tool_calls=[],
@@ -0,0 +1,790 @@
+#!/usr/bin/env python3
+"""
+Fuzz and benchmark harness for the Nemotron tool call parsers
+
+Covers the three parsers registered by the plugin (llama_nemotron_xml,
+llama_nemotron_json, llama_nemotron_pythonic) on generated model outputs,
+varying the output size, the number of calls, the number of tools in the
+request and malformed variants (truncated, missing closing tags, injected
+markup).
+
+    fuzz   checks that well formed calls round trip, that streaming and
+           non-streaming extraction agree, that the streamed arguments match
+           what vLLM compares them against at the end of the stream, and that
+           no input makes a parser raise. Failures are shrunk to a minimal
+           output and printed with the seed to replay them.
+    bench  times extract_tool_calls and extract_tool_calls_streaming over a
+           matrix of corpora, optionally saving the results as JSON and
+           failing when a case got slower than a saved baseline.
+
+vLLM is not needed: when it cannot be imported (or with --stand-ins) the
+protocol classes the plugin imports are replaced by minimal stand-ins, so
+the harness runs on any CPU box with partial_json_parser installed.
+
+    python toolcall_parser_harness.py fuzz --iterations 2000 --seed 1
+    python toolcall_parser_harness.py bench --save bench.json
+    python toolcall_parser_harness.py bench --baseline bench.json --max-regression 0.5
+"""
+
+import argparse
+import gc
+import json
+import logging
+import random
+import sys
+import time
+import types
+import uuid
+import warnings
+from typing import Any
+
+from bench_toolcall_parsers import PARSER_FILE, load_parsers
+
+PARSERS = {
+    "xml": "LlamaNemotronXMLToolParser",
+    "json": "LlamaNemotronJSONToolParser",
+    "pythonic": "LlamaNemotronPythonicToolParser",
+}
+# The pythonic parser does not support streaming
+STREAMING_PARSERS = ("xml", "json")
+
+KB = 1024
+
+
+# vLLM stand-ins
+
+class _StandIn:
+    """Keyword argument model with the bits of pydantic the plugin uses"""
+
+    _defaults: dict = {}
+
+    def __init__(self, **kwargs):
+        for name, default in self._defaults.items():
+            setattr(self, name, default() if callable(default) else default)
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+
+    def model_dump(self, exclude_none=False):
+        return {
+            name: value.model_dump(exclude_none) if isinstance(value, _StandIn) else value
+            for name, value in vars(self).items()
+            if not (exclude_none and value is None)
+        }
+
+
+class FunctionCall(_StandIn):
+    pass
+
+
+class ToolCall(_StandIn):
+    _defaults = {"id": lambda: f"chatcmpl-tool-{uuid.uuid4().hex}", "type": "function"}
+
+
+class DeltaFunctionCall(_StandIn):
+    _defaults = {"name": None, "arguments": None}
+
+
+class DeltaToolCall(_StandIn):
+    _defaults = {"id": None, "type": None, "function": None}
+
+
+class DeltaMessage(_StandIn):
+    _defaults = {"role": None, "content": None, "tool_calls": list}
+
+
+class ExtractedToolCallInformation(_StandIn):
+    _defaults = {"content": None}
+
+
+class ChatCompletionRequest(_StandIn):
+    _defaults = {"tools": None}
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        if self.tools is not None:
+            self.tools = [
+                types.SimpleNamespace(
+                    type=tool.get("type", "function"),
+                    function=types.SimpleNamespace(
+                        name=tool["function"]["name"],
+                        description=tool["function"].get("description"),
+                        parameters=tool["function"].get("parameters"),
+                    ),
+                )
+                for tool in self.tools
+            ]
+
+
+class ToolParser:
+    def __init__(self, tokenizer):
+        self.prev_tool_call_arr = []
+        self.current_tool_id = -1
+        self.current_tool_name_sent = False
+        self.streamed_args_for_tool = []
+        self.model_tokenizer = tokenizer
+
+
+class ToolParserManager:
+    tool_parsers = {}
+
+    @classmethod
+    def register_module(cls, name):
+        def register(parser_class):
+            cls.tool_parsers[name] = parser_class
+            return parser_class
+        return register
+
+
+def install_stand_ins(force=False):
+    """Make the plugin's vLLM imports resolve, returns True if stand-ins are used"""
+    if not force:
+        try:
+            import vllm.entrypoints.openai.protocol  # noqa: F401
+            return False
+        except ImportError:
+            pass
+
+    modules = {
+        "vllm": {},
+        "vllm.entrypoints": {},
+        "vllm.entrypoints.openai": {},
+        "vllm.entrypoints.openai.protocol": {
+            "ChatCompletionRequest": ChatCompletionRequest,
+            "DeltaFunctionCall": DeltaFunctionCall,
+            "DeltaMessage": DeltaMessage,
+            "DeltaToolCall": DeltaToolCall,
+            "ExtractedToolCallInformation": ExtractedToolCallInformation,
+            "FunctionCall": FunctionCall,
+            "ToolCall": ToolCall,
+        },
+        "vllm.entrypoints.openai.tool_parsers": {},
+        "vllm.entrypoints.openai.tool_parsers.abstract_tool_parser": {
+            "ToolParser": ToolParser,
+            "ToolParserManager": ToolParserManager,
+        },
+        "vllm.logger": {"init_logger": logging.getLogger},
+        "vllm.transformers_utils": {},
+        "vllm.transformers_utils.tokenizer": {"AnyTokenizer": Any},
+        "vllm.utils": {"random_uuid": lambda: uuid.uuid4().hex},
+    }
+    for name, attributes in modules.items():
+        module = types.ModuleType(name)
+        module.__dict__.update(attributes)
+        sys.modules[name] = module
+    return True
+
+
+def make_request(tools):
+    from vllm.entrypoints.openai.protocol import ChatCompletionRequest
+    return ChatCompletionRequest(
+        model="harness",
+        messages=[],
+        tools=[{"type": "function", "function": tool} for tool in tools] or None,
+    )
+
+
+# Corpus
+
+WORDS = ["the", "weather", "in", "Paris", "report", "résumé", "données", "東京", "😀",
+         "x", "a < b", "c > d", "it's", 'say "hi"', "C:\\temp", "50%", "&amp;",
+         "{braces}", "[1]", "(x)", "a=b", "tab\there", "new\nline"]
+PARAM_NAMES = ["city", "days", "query", "limit", "unit", "path", "content", "verbose",
+               "tags", "options", "threshold", "start", "end", "language", "count"]
+PARAM_TYPES = ["string", "string", "integer", "number", "boolean", "array", "object"]
+PROSE = ["Let me check that.", "Sure,", "I will call a tool.", "Looking it up now.", "Ok."]
+
+# Fragments injected into malformed outputs
+NOISE = ["<", "</", ">", "<tool_call>", "</tool_call>", "<tool>", "</tool>", "<TOOLCALL>",
+         "</TOOLCALL>", "{", "}", "[", "]", '"', "'", ",", ":", "(", ")", "=", "\\", "\n",
+         "<city>", "</city>", "null", "True", "\ud83d"]
+
+
+def random_text(rng, length):
+    """Words from WORDS, without leading or trailing whitespace"""
+    words = []
+    total = 0
+    while total < length:
+        word = rng.choice(WORDS)
+        words.append(word)
+        total += len(word) + 1
+    return " ".join(words).strip() or "x"
+
+
+def random_value(rng, param_type, length, depth=0):
+    if param_type == "string":
+        return random_text(rng, length)
+    if param_type == "integer":
+        return rng.randint(-10**6, 10**6)
+    if param_type == "number":
+        return round(rng.uniform(-1000, 1000), rng.randint(0, 6))
+    if param_type == "boolean":
+        return rng.random() < 0.5
+    item_type = rng.choice(["string", "integer", "number", "boolean"] + (["array", "object"] if depth < 2 else []))
+    items = rng.randint(0, 4)
+    if param_type == "array":
+        return [random_value(rng, item_type, length // max(items, 1), depth + 1) for _ in range(items)]
+    return {
+        rng.choice(PARAM_NAMES) + str(i): random_value(rng, item_type, length // max(items, 1), depth + 1)
+        for i in range(items)
+    }
+
+
+def random_tools(rng, count, sized=False):
+    """count tools with random parameters, sized gives each a "content" string
+    so that generated calls reach the requested size"""
+    tools = []
+    for i in range(count):
+        params = rng.sample(PARAM_NAMES, rng.randint(0, 5))
+        properties = {name: {"type": rng.choice(PARAM_TYPES)} for name in params}
+        if sized:
+            properties["content"] = {"type": "string"}
+        tools.append({
+            "name": f"tool_{i}",
+            "description": f"Generated tool {i}",
+            "parameters": {"type": "object", "properties": properties},
+        })
+    return tools
+
+
+def random_calls(rng, tools, count, size):
+    """count calls to random tools, with roughly size characters of strings"""
+    calls = []
+    for _ in range(count):
+        tool = rng.choice(tools)
+        properties = tool["parameters"]["properties"]
+        strings = sum(1 for schema in properties.values() if schema["type"] == "string")
+        length = max(1, size // max(1, count * strings))
+        calls.append((tool["name"], {
+            name: random_value(rng, schema["type"], length) for name, schema in properties.items()
+        }))
+    return calls
+
+
+def xml_value(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return json.dumps(value, ensure_ascii=False)
+
+
+def render(fmt, calls, prefix=""):
+    """Model output for calls in the parser's format"""
+    if fmt == "xml":
+        blocks = [
+            f"<tool_call>\n<tool>{name}</tool>\n"
+            + "".join(f"<{param}>{xml_value(value)}</{param}>\n" for param, value in arguments.items())
+            + "</tool_call>"
+            for name, arguments in calls
+        ]
+        return prefix + "\n".join(blocks)
+    if fmt == "json":
+        body = json.dumps([{"name": name, "arguments": arguments} for name, arguments in calls], ensure_ascii=False)
+        return f"{prefix}<TOOLCALL>{body}</TOOLCALL>"
+    lines = [
+        f"{name}(" + ", ".join(f"{param}={value!r}" for param, value in arguments.items()) + ")"
+        for name, arguments in calls
+    ]
+    return prefix + "<TOOLCALL>\n" + "\n".join(lines) + "\n</TOOLCALL>"
+
+
+def string_arguments(rng, arguments):
+    """arguments as a string: key=value pairs, free text, or JSON text with
+    and without spaces"""
+    choice = rng.randrange(4)
+    if choice == 0:
+        return "&".join(f"{name}={xml_value(value)}" for name, value in arguments.items())
+    if choice == 1:
+        # Quotes, backslashes, control and non-ASCII characters, or nothing
+        return random_text(rng, rng.randint(1, 40)) if rng.random() < 0.9 else ""
+    if choice == 2:
+        return json.dumps(arguments, ensure_ascii=False)
+    return json.dumps(arguments, ensure_ascii=False, separators=(",", ":"))
+
+
+def mutate(rng, text):
+    """A malformed variant of a model output"""
+    for _ in range(rng.randint(1, 3)):
+        choice = rng.randrange(4)
+        pos = rng.randint(0, len(text))
+        if choice == 0:
+            text = text[:pos]
+        elif choice == 1:
+            text = text[:pos] + rng.choice(NOISE) + text[pos:]
+        elif choice == 2:
+            end = min(len(text), pos + rng.randint(1, 12))
+            text = text[:pos] + text[end:]
+        else:
+            end = min(len(text), pos + rng.randint(1, 24))
+            text = text[:pos] + text[pos:end] * 2 + text[end:]
+    return text
+
+
+def generate_case(rng, fmt, calls=None, tools=None, size=None, malformed=None):
+    """(model output, request tools, expected calls or None if malformed)"""
+    tools = random_tools(rng, tools or rng.randint(1, 8), sized=size is not None)
+    calls = random_calls(rng, tools, calls if calls is not None else rng.randint(0, 4), size or rng.randint(1, 200))
+    if fmt == "json" and size is None:
+        # "arguments" may also be a string, which extract_tool_calls passes through
+        calls = [(name, string_arguments(rng, arguments) if rng.random() < 0.15 else arguments)
+                 for name, arguments in calls]
+    prefix = rng.choice(["", rng.choice(PROSE) + "\n"])
+    text = render(fmt, calls, prefix)
+    if malformed if malformed is not None else rng.random() < 0.3:
+        return mutate(rng, text), tools, None
+    return text, tools, calls
+
+
+# Drivers
+
+def run_non_streaming(module, fmt, text, request):
+    result = getattr(module, PARSERS[fmt])(None).extract_tool_calls(text, request)
+    calls = [(call.function.name, call.function.arguments) for call in result.tool_calls]
+    return result.content, calls
+
+
+def split_points(rng, length, max_delta):
+    points = []
+    pos = 0
+    while pos < length:
+        pos = min(length, pos + rng.randint(1, max_delta))
+        points.append(pos)
+    return points
+
+
+def delta_arguments(tool_call):
+    function = tool_call.function
+    if function is None:
+        return None
+    if not isinstance(function, dict):
+        function = function.model_dump(exclude_none=True)
+    return function.get("arguments")
+
+
+def finish_arguments(parser, delta):
+    """(index, arguments) vLLM sends instead of those of the last delta
+
+    When the output finishes with a delta whose first tool call carries
+    arguments, vLLM's chat completion streaming completes the arguments of
+    the last call to json.dumps of its prev_tool_call_arr entry, so string
+    arguments "city=Paris" must have been streamed as json.dumps("city=Paris")
+    for the client to get them intact. None if the delta carries no arguments.
+
+    vLLM also drops the rest of that delta, which only matters when it holds
+    a whole call or parts of several, so those deltas are taken as they are.
+    """
+    if not delta.tool_calls or delta_arguments(delta.tool_calls[0]) is None:
+        return None
+    index = max(len(parser.prev_tool_call_arr) - 1, 0)
+    if any(tool_call.index != index or tool_call.id is not None for tool_call in delta.tool_calls):
+        return None
+    latest_delta_len = len(delta_arguments(delta.tool_calls[0]))
+    expected_call = json.dumps(parser.prev_tool_call_arr[index].get("arguments", {}), ensure_ascii=False)
+    actual_call = parser.streamed_args_for_tool[index]
+    if latest_delta_len > 0:
+        actual_call = actual_call[:-latest_delta_len]
+    return index, expected_call.replace(actual_call, "", 1)
+
+
+def run_streaming(module, fmt, text, request, points):
+    """Stream text cut at points, returns (content, calls, parser) as the
+    client receives them"""
+    parser = getattr(module, PARSERS[fmt])(None)
+    content = []
+    calls = {}
+    previous = ""
+    for end in points:
+        current = text[:end]
+        delta = parser.extract_tool_calls_streaming(
+            previous, current, current[len(previous):], [], [], [], request
+        )
+        previous = current
+        if delta is None:
+            continue
+        if delta.content:
+            content.append(delta.content)
+        finish = finish_arguments(parser, delta) if end == len(text) else None
+        if finish is not None:
+            calls[finish[0]][1] += finish[1]
+            continue
+        for tool_call in delta.tool_calls:
+            call = calls.setdefault(tool_call.index, ["", ""])
+            function = tool_call.function
+            if function is None:
+                continue
+            if not isinstance(function, dict):
+                function = function.model_dump(exclude_none=True)
+            call[0] += function.get("name") or ""
+            call[1] += function.get("arguments") or ""
+    return "".join(content), [tuple(calls[index]) for index in sorted(calls)], parser
+
+
+def has_duplicate_keys(text):
+    """True if the <TOOLCALL> JSON repeats a key
+
+    json.loads keeps the last value, which streaming cannot do since the
+    first value has already been sent by then.
+    """
+    def check(pairs):
+        keys = [key for key, _ in pairs]
+        if len(set(keys)) != len(keys):
+            raise KeyError("duplicate")
+        return dict(pairs)
+
+    block = text.split("<TOOLCALL>", 1)[-1].split("</TOOLCALL>", 1)[0].strip()
+    try:
+        json.loads(block if block.startswith("[") else "[" + block, object_pairs_hook=check)
+    except KeyError:
+        return True
+    except ValueError:
+        pass
+    return False
+
+
+def block_tokens(fmt):
+    return {"xml": ("<tool_call>", "</tool_call>")}.get(fmt, ("<TOOLCALL>", "</TOOLCALL>"))
+
+
+def ends_inside_block(fmt, text):
+    """Streaming holds back an unfinished block, non-streaming drops it"""
+    start, end = block_tokens(fmt)
+    return text.rfind(start) > text.rfind(end)
+
+
+def held_back_suffix(fmt, text):
+    """Content that streaming never sends: a start token cut off at the end
+
+    The parsers hold back a suffix that may still become the start token and
+    vLLM does not call them once more when the output ends, so an output
+    without tool calls that ends in e.g. "<tool" loses it when streamed.
+    """
+    start, _ = block_tokens(fmt)
+    if start in text:
+        return ""
+    for length in range(len(start) - 1, 0, -1):
+        if text.endswith(start[:length]):
+            return start[:length]
+    return ""
+
+
+# Fuzzing
+
+def check_case(module, fmt, text, tools, expected, points):
+    """Problems found on one output, an empty list if it passes"""
+    request = make_request(tools)
+    problems = []
+    try:
+        content, calls = run_non_streaming(module, fmt, text, request)
+    except Exception as e:
+        return [f"extract_tool_calls raised {e!r}"]
+
+    if expected is not None:
+        decoded = [
+            (name, arguments if isinstance(expected_arguments, str) else json.loads(arguments))
+            for (name, arguments), (_, expected_arguments) in zip(calls, expected)
+        ]
+        if len(calls) != len(expected) or decoded != expected:
+            problems.append(f"round trip: got {decoded!r}, expected {expected!r}")
+
+    if fmt not in STREAMING_PARSERS:
+        return problems
+    try:
+        stream_content, stream_calls, parser = run_streaming(module, fmt, text, request, points)
+    except Exception as e:
+        return problems + [f"extract_tool_calls_streaming raised {e!r}"]
+
+    # Malformed JSON fails as a whole without streaming, so only outputs it
+    # parsed are comparable; the XML parser skips bad blocks either way
+    if fmt == "xml":
+        comparable = not ends_inside_block(fmt, text)
+    else:
+        comparable = bool(calls) and text.count("<TOOLCALL>") == 1 and \
+            not ends_inside_block(fmt, text) and not has_duplicate_keys(text)
+    if comparable:
+        # String arguments are streamed JSON encoded, and passed through as is
+        # without streaming
+        decoded_stream_calls = []
+        for name, arguments in stream_calls:
+            if arguments.startswith('"'):
+                try:
+                    arguments = json.loads(arguments)
+                except ValueError:
+                    pass
+            decoded_stream_calls.append((name, arguments))
+        if decoded_stream_calls != calls:
+            problems.append(f"streaming calls {stream_calls!r} != non-streaming {calls!r}")
+        expected_content = content or ""
+        held_back = held_back_suffix(fmt, text)
+        if held_back and expected_content.endswith(held_back):
+            expected_content = expected_content[:-len(held_back)]
+        if stream_content.strip() != expected_content.strip():
+            problems.append(f"streaming content {stream_content!r} != non-streaming {content!r}"
+                            f"{f' without {held_back!r}' if held_back else ''}")
+        # vLLM compares the streamed text with this when the stream finishes
+        # and sends the difference, for string arguments too
+        for index, streamed in enumerate(parser.streamed_args_for_tool):
+            arguments = parser.prev_tool_call_arr[index].get("arguments", {})
+            expected_streamed = json.dumps(arguments, ensure_ascii=False)
+            if expected_streamed != str(streamed):
+                problems.append(f"call {index}: streamed arguments {str(streamed)!r} "
+                                f"!= json.dumps of prev_tool_call_arr {expected_streamed!r}")
+    return problems
+
+
+def shrink(text, fails):
+    """Smallest output found by deleting chunks while fails(text) holds"""
+    chunk = max(1, len(text) // 2)
+    while chunk >= 1:
+        pos = 0
+        while pos < len(text):
+            candidate = text[:pos] + text[pos + chunk:]
+            if candidate != text and fails(candidate):
+                text = candidate
+            else:
+                pos += chunk
+        chunk //= 2
+    return text
+
+
+# Outputs checked before the generated ones: (format, output, expected
+# calls, text the last delta starts with)
+REGRESSIONS = [
+    # String arguments completed by the last delta, the client got city="Paris"
+    ("json", '<TOOLCALL>[{"name": "get_weather", "arguments": "city=Paris"}]</TOOLCALL>',
+     [("get_weather", "city=Paris")], "Paris"),
+]
+
+
+def fuzz(module, args):
+    failures = 0
+    for fmt, text, expected, last_delta in REGRESSIONS:
+        if fmt not in args.parsers:
+            continue
+        tools = [{"name": name, "parameters": {"type": "object", "properties": {}}} for name, _ in expected]
+        problems = check_case(module, fmt, text, tools, expected, [text.rindex(last_delta), len(text)])
+        if problems:
+            failures += 1
+            print(f"✗ {fmt} regression {text!r}")
+            for problem in problems:
+                print(f"    {problem[:500]}")
+    for fmt in args.parsers:
+        for iteration in range(args.iterations):
+            seed = f"{args.seed}-{fmt}-{iteration}"
+            rng = random.Random(seed)
+            text, tools, expected = generate_case(rng, fmt)
+            max_delta = rng.choice([1, 3, 8, 64])
+            points = split_points(rng, len(text), max_delta)
+            problems = check_case(module, fmt, text, tools, expected, points)
+            if not problems:
+                continue
+
+            failures += 1
+            if failures > args.max_failures:
+                continue
+
+            def fails(candidate):
+                # Streaming deltas of the shrunk output, round trip no longer applies
+                return bool(check_case(module, fmt, candidate, tools, None,
+                                       split_points(random.Random(seed), len(candidate), max_delta)))
+
+            minimal = shrink(text, fails) if expected is None else text
+            print(f"✗ {fmt} seed {seed} (deltas up to {max_delta} chars)")
+            for problem in problems:
+                print(f"    {problem[:500]}")
+            print(f"    output: {minimal[:1000]!r}")
+        print(f"{fmt}: {args.iterations} outputs checked")
+
+    if failures:
+        print(f"✗ {failures} failing outputs")
+        sys.exit(1)
+    print("✓ No failures")
+
+
+# Benchmarks
+
+def time_best(function, min_seconds, min_runs=3):
+    """Best time of repeated calls, repeating for at least min_seconds
+
+    The garbage collector is off while timing, as in timeit.
+    """
+    best = float("inf")
+    runs = 0
+    started = time.perf_counter()
+    gc.disable()
+    try:
+        while runs < min_runs or time.perf_counter() - started < min_seconds:
+            start = time.perf_counter()
+            function()
+            best = min(best, time.perf_counter() - start)
+            runs += 1
+    finally:
+        gc.enable()
+    return best
+
+
+def bench(module, args):
+    results = {}
+    print(f"{'case':<40} {'us/op':>11} {'MB/s':>8}")
+    for fmt in args.parsers:
+        for size_kb in args.sizes:
+            for calls in args.calls:
+                for tools in args.tools:
+                    rng = random.Random(f"{args.seed}-{fmt}-{size_kb}-{calls}-{tools}")
+                    text, tool_defs, _ = generate_case(rng, fmt, calls, tools, int(size_kb * KB), malformed=False)
+                    request = make_request(tool_defs)
+                    megabytes = len(text.encode("utf-8")) / KB / KB
+                    case = f"{fmt}/{size_kb:g}KB/{calls}calls/{tools}tools"
+
+                    modes = [("parse", lambda: run_non_streaming(module, fmt, text, request))]
+                    if fmt in STREAMING_PARSERS and args.delta_chars and size_kb <= args.stream_max_kb:
+                        points = list(range(args.delta_chars, len(text), args.delta_chars)) + [len(text)]
+                        modes.append(("stream", lambda: run_streaming(module, fmt, text, request, points)))
+
+                    for mode, function in modes:
+                        seconds = time_best(function, args.min_seconds)
+                        key = f"{case}/{mode}"
+                        results[key] = {"us_per_op": seconds * 1e6, "mb_per_s": megabytes / seconds}
+                        print(f"{key:<40} {seconds * 1e6:>11.1f} {megabytes / seconds:>8.2f}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"✓ Results saved to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = []
+        for key, result in results.items():
+            if key not in baseline:
+                continue
+            ratio = result["us_per_op"] / baseline[key]["us_per_op"]
+            if ratio > 1 + args.max_regression:
+                regressions.append((key, ratio))
+        for key, ratio in regressions:
+            print(f"✗ {key}: {ratio:.2f}x the baseline")
+        if regressions:
+            sys.exit(1)
+        print(f"✓ No case more than {args.max_regression:.0%} slower than {args.baseline}")
+
+
+def number_list(value):
+    return [float(item) if "." in item else int(item) for item in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuzz and benchmark the Nemotron tool call parsers")
+    parser.add_argument(
+        "--parser-file",
+        default=PARSER_FILE,
+        help="Parser plugin to test (default: the copy next to this script)"
+    )
+    parser.add_argument(
+        "--parsers",
+        default=",".join(PARSERS),
+        help=f"Comma separated parsers (default: {','.join(PARSERS)})"
+    )
+    parser.add_argument(
+        "--seed",
+        default="0",
+        help="Seed for the generated outputs (default: 0)"
+    )
+    parser.add_argument(
+        "--stand-ins",
+        action="store_true",
+        help="Use the vLLM stand-ins even if vLLM is installed"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    fuzz_parser = commands.add_parser("fuzz", help="Property based checks on generated outputs")
+    fuzz_parser.add_argument(
+        "--iterations",
+        type=int,
+        default=2000,
+        help="Outputs generated per parser (default: 2000)"
+    )
+    fuzz_parser.add_argument(
+        "--max-failures",
+        type=int,
+        default=5,
+        help="Failures printed before only counting (default: 5)"
+    )
+
+    bench_parser = commands.add_parser("bench", help="Latency and throughput benchmarks")
+    bench_parser.add_argument(
+        "--sizes",
+        type=number_list,
+        default=[1, 16, 256],
+        help="Comma separated output sizes in KB (default: 1,16,256)"
+    )
+    bench_parser.add_argument(
+        "--calls",
+        type=number_list,
+        default=[1, 16],
+        help="Comma separated numbers of tool calls per output (default: 1,16)"
+    )
+    bench_parser.add_argument(
+        "--tools",
+        type=number_list,
+        default=[4, 128],
+        help="Comma separated numbers of tools in the request (default: 4,128)"
+    )
+    bench_parser.add_argument(
+        "--delta-chars",
+        type=int,
+        default=16,
+        help="Characters per streaming delta, 0 skips streaming (default: 16)"
+    )
+    bench_parser.add_argument(
+        "--stream-max-kb",
+        type=float,
+        default=64,
+        help="Largest output streamed, building every current_text is quadratic (default: 64)"
+    )
+    bench_parser.add_argument(
+        "--min-seconds",
+        type=float,
+        default=0.2,
+        help="Minimum time spent per case, the best run is reported (default: 0.2)"
+    )
+    bench_parser.add_argument(
+        "--save",
+        help="Write the results to this JSON file"
+    )
+    bench_parser.add_argument(
+        "--baseline",
+        help="JSON results to compare against, exits 1 on regressions"
+    )
+    bench_parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.5,
+        help="Allowed slowdown against the baseline, as a fraction (default: 0.5)"
+    )
+
+    args = parser.parse_args()
+
+    args.parsers = args.parsers.split(",")
+    for fmt in args.parsers:
+        if fmt not in PARSERS:
+            print(f"✗ Unknown parser: {fmt}", file=sys.stderr)
+            sys.exit(1)
+
+    if install_stand_ins(args.stand_ins):
+        print("Using vLLM stand-ins")
+    # Malformed outputs make the parsers log warnings and tracebacks, and ast
+    # warn about invalid escapes
+    logging.disable(logging.CRITICAL)
+    warnings.simplefilter("ignore", SyntaxWarning)
+    module = load_parsers(args.parser_file)
+
+    if args.command == "fuzz":
+        fuzz(module, args)
+    else:
+        bench(module, args)
+
+
+if __name__ == "__main__":
+    main()
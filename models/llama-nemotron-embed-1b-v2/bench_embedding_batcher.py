@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Benchmark embedding_batcher.py against a stub embedding server
+
+The stub answers /v1/embeddings like vLLM with --runner pooling, but runs
+one "forward pass" at a time taking --stub-pass-ms plus --stub-token-us
+per token, so many small requests are slow and few large ones are fast,
+as on the GPU. Its embeddings are derived from the input text, so every
+caller's result is checked against the inputs it sent.
+
+Stub, proxy and callers share one process, and with it the JSON encoding
+of every vector. Keep --dimensions small so the run measures the batching
+rather than the encoding, the proxy runs in its own process when deployed.
+
+--clients threads send --requests requests of 1 to --max-inputs short
+texts each, first straight to the stub and then through the proxy, and
+the throughput, latency percentiles and batch sizes are compared:
+
+    python bench_embedding_batcher.py --clients 32 --requests 20
+
+--serve-stub only runs the stub, e.g. as --upstream for a proxy started
+by hand:
+
+    python bench_embedding_batcher.py --serve-stub 127.0.0.1:8000
+    python embedding_batcher.py --upstream http://127.0.0.1:8000 --listen 127.0.0.1:8080
+"""
+
+import argparse
+import functools
+import hashlib
+import json
+import math
+import random
+import struct
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+import embedding_batcher
+
+WORDS = ("policy", "claim", "invoice", "customer", "contract", "renewal", "deadline", "premium",
+         "report", "quarter", "revenue", "risk", "audit", "approval", "payment", "account")
+
+
+@functools.lru_cache(maxsize=65536)
+def stub_embedding(text, dimensions):
+    """Deterministic unit vector for a text"""
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    values = [v / 2**31 for v in struct.unpack("<8i", digest)]
+    vector = [values[i % 8] * (1 + i // 8) for i in range(dimensions)]
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def make_stub_handler(dimensions, pass_seconds, token_seconds, max_inputs):
+    gpu = threading.Lock()
+    stats = {"passes": 0, "inputs": 0}
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _reply(self, status, body):
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path == "/v1/models":
+                self._reply(200, {"object": "list", "data": [{"id": "stub", "object": "model"}]})
+            elif self.path == "/stats":
+                self._reply(200, stats)
+            else:
+                self._reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            if len(inputs) > max_inputs:
+                self._reply(400, embedding_batcher.openai_error(f"at most {max_inputs} inputs"))
+                return
+            if any(not isinstance(text, str) or not text for text in inputs):
+                self._reply(400, embedding_batcher.openai_error("empty input"))
+                return
+            tokens = sum(len(text.split()) + 2 for text in inputs)
+            with gpu:
+                time.sleep(pass_seconds + tokens * token_seconds)
+                stats["passes"] += 1
+                stats["inputs"] += len(inputs)
+            self._reply(200, {
+                "object": "list",
+                "model": body.get("model", "stub"),
+                "data": [
+                    {"object": "embedding", "index": index, "embedding": stub_embedding(text, dimensions)}
+                    for index, text in enumerate(inputs)
+                ],
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            })
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def serve(handler, listen="127.0.0.1:0"):
+    host, port = listen.rsplit(":", 1)
+    server = embedding_batcher.BatcherServer((host, int(port)), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(pct / 100 * len(ordered))) - 1]
+
+
+def run_clients(url, args, dimensions):
+    """Send every client's requests, returns (latencies, inputs, wall seconds, errors)"""
+    latencies = []
+    errors = []
+    inputs_sent = [0]
+    lock = threading.Lock()
+
+    def client(index):
+        rng = random.Random(args.seed * 1000 + index)
+        for _ in range(args.requests):
+            texts = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 40)))
+                     for _ in range(rng.randint(1, args.max_inputs))]
+            # Single strings exercise the non-list form of input
+            payload = {"model": "stub", "input": texts[0] if len(texts) == 1 else texts}
+            started = time.perf_counter()
+            try:
+                with urlopen(Request(f"{url}/v1/embeddings", data=json.dumps(payload).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"}), timeout=120) as response:
+                    result = json.loads(response.read())
+            except HTTPError as e:
+                with lock:
+                    errors.append(f"HTTP {e.code}: {e.read()[:200]!r}")
+                continue
+            except (URLError, OSError) as e:
+                with lock:
+                    errors.append(f"{type(e).__name__}: {e}")
+                continue
+            elapsed = time.perf_counter() - started
+            data = result["data"]
+            if len(data) != len(texts) or any(
+                item["index"] != i or item["embedding"] != stub_embedding(texts[i], dimensions)
+                for i, item in enumerate(data)
+            ):
+                with lock:
+                    errors.append(f"client {index} got embeddings that do not belong to its inputs")
+                continue
+            with lock:
+                latencies.append(elapsed)
+                inputs_sent[0] += len(texts)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, inputs_sent[0], time.perf_counter() - started, errors
+
+
+def report(name, latencies, inputs, seconds, errors, passes):
+    print(f"{name:<8} {len(latencies):>5} requests  {inputs / seconds:>8.1f} inputs/s  "
+          f"p50 {percentile(latencies, 50) * 1000:>7.1f} ms  p95 {percentile(latencies, 95) * 1000:>7.1f} ms  "
+          f"{passes:>5} passes  {inputs / passes if passes else 0:>6.1f} inputs/pass  {len(errors)} errors")
+    for error in errors[:5]:
+        print(f"  ✗ {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding_batcher.py against a stub embedding server")
+    parser.add_argument(
+        "--clients",
+        type=int,
+        default=32,
+        help="Concurrent callers (default: 32)"
+    )
+    parser.add_argument(
+        "--requests",
+        type=int,
+        default=20,
+        help="Requests per caller (default: 20)"
+    )
+    parser.add_argument(
+        "--max-inputs",
+        type=int,
+        default=4,
+        help="Most texts in one request (default: 4)"
+    )
+    parser.add_argument(
+        "--dimensions",
+        type=int,
+        default=64,
+        help="Embedding size of the stub (default: 64)"
+    )
+    parser.add_argument(
+        "--stub-pass-ms",
+        type=float,
+        default=10.0,
+        help="Fixed cost of one forward pass of the stub (default: 10)"
+    )
+    parser.add_argument(
+        "--stub-token-us",
+        type=float,
+        default=20.0,
+        help="Cost per token of one forward pass of the stub (default: 20)"
+    )
+    parser.add_argument(
+        "--stub-max-inputs",
+        type=int,
+        default=512,
+        help="Inputs the stub accepts per request, like vLLM's --max-num-seqs (default: 512)"
+    )
+    parser.add_argument(
+        "--max-wait-ms",
+        type=float,
+        default=5.0,
+        help="--max-wait-ms of the proxy (default: 5)"
+    )
+    parser.add_argument(
+        "--max-batch-tokens",
+        type=int,
+        default=16384,
+        help="--max-batch-tokens of the proxy (default: 16384)"
+    )
+    parser.add_argument(
+        "--max-batch-inputs",
+        type=int,
+        default=256,
+        help="--max-batch-inputs of the proxy (default: 256)"
+    )
+    parser.add_argument(
+        "--max-inflight",
+        type=int,
+        default=2,
+        help="--max-inflight of the proxy (default: 2)"
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Seed of the generated texts (default: 0)"
+    )
+    parser.add_argument(
+        "--serve-stub",
+        metavar="HOST:PORT",
+        help="Only run the stub embedding server on this address"
+    )
+
+    args = parser.parse_args()
+
+    stub_handler = make_stub_handler(args.dimensions, args.stub_pass_ms / 1000, args.stub_token_us / 1e6,
+                                     args.stub_max_inputs)
+    if args.serve_stub:
+        stub, stub_url = serve(stub_handler, args.serve_stub)
+        print(f"Stub embedding server on {stub_url}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    stub, stub_url = serve(stub_handler)
+
+    def passes():
+        with urlopen(f"{stub_url}/stats") as response:
+            return json.loads(response.read())["passes"]
+
+    batcher = embedding_batcher.Batcher(
+        stub_url,
+        max_batch_tokens=args.max_batch_tokens,
+        max_batch_inputs=args.max_batch_inputs,
+        max_wait=args.max_wait_ms / 1000,
+        max_inflight=args.max_inflight,
+    )
+    batcher.start()
+    proxy, proxy_url = serve(embedding_batcher.make_handler(batcher))
+
+    print(f"{args.clients} clients x {args.requests} requests of 1-{args.max_inputs} texts, "
+          f"stub pass {args.stub_pass_ms} ms + {args.stub_token_us} us/token")
+    before = passes()
+    direct = run_clients(stub_url, args, args.dimensions)
+    report("direct", *direct, passes() - before)
+
+    before = passes()
+    batched = run_clients(proxy_url, args, args.dimensions)
+    report("batched", *batched, passes() - before)
+
+    status = batcher.status()
+    print(f"proxy: {status['batches']} batches, {status['mean_batch_requests']:.1f} requests and "
+          f"{status['mean_batch_inputs']:.1f} inputs per batch")
+
+    # A bad input fails only its own caller
+    mixed = []
+
+    def bad_or_good(text):
+        payload = json.dumps({"model": "stub", "input": [text]}).encode("utf-8")
+        try:
+            with urlopen(Request(f"{proxy_url}/v1/embeddings", data=payload,
+                                 headers={"Content-Type": "application/json"})) as response:
+                mixed.append((text, response.status))
+        except HTTPError as e:
+            mixed.append((text, e.code))
+
+    threads = [threading.Thread(target=bad_or_good, args=(text,)) for text in ("", "good one", "good two")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    isolated = sorted(mixed) == [("", 400), ("good one", 200), ("good two", 200)]
+    print(f"{'✓' if isolated else '✗'} an invalid input in a merged batch fails only its own request {sorted(mixed)}")
+
+    proxy.shutdown()
+    stub.shutdown()
+    if direct[3] or batched[3] or not isolated:
+        sys.exit(1)
+    speedup = (batched[1] / batched[2]) / (direct[1] / direct[2])
+    print(f"✓ {speedup:.1f}x the inputs/s through the proxy")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+"""
+Request coalescing proxy for the OpenAI /v1/embeddings API
+
+Storage runs and the RAG server's query embeddings each send small
+requests to the vLLM pooling endpoint, which then runs many tiny forward
+passes. The proxy queues the requests it receives and merges the ones
+arriving within --max-wait-ms of each other into one upstream request,
+bounded by --max-batch-tokens and --max-batch-inputs, then hands every
+caller its own slice of the result.
+
+Only requests with the same model, options (encoding_format, dimensions,
+...), input kind (text or token ids) and Authorization header are merged.
+Token counts are estimated from --chars-per-token for text inputs. A
+request above the budget on its own is sent alone. When vLLM rejects a
+merged batch as invalid (4xx), its requests are retried one by one so a
+bad input only fails its own caller.
+
+API:
+    POST /v1/embeddings    OpenAI embeddings request, answered like the upstream does
+    GET  /status           queue and batch statistics
+    GET  /metrics          Prometheus metrics (with prometheus_client installed)
+    GET  other paths       passed through to the upstream, e.g. /v1/models and /health
+"""
+
+import argparse
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+except ImportError:
+    Counter = Histogram = None
+
+# Statuses for which a merged batch is retried one request at a time
+RETRY_ALONE_STATUSES = {400, 413, 422}
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+def _metric(metric_class, name, documentation, labelnames=(), **kwargs):
+    """Metric on the default registry, None without prometheus_client"""
+    if metric_class is None:
+        return None
+    return metric_class(name, documentation, labelnames, **kwargs)
+
+
+_QUEUE_SECONDS = _metric(
+    Histogram,
+    "embedding_batcher_queue_seconds",
+    "Time a request waited in the proxy before its batch was sent",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+_BATCH_INPUTS = _metric(Histogram, "embedding_batcher_batch_inputs", "Inputs per upstream request", buckets=SIZE_BUCKETS)
+_BATCH_REQUESTS = _metric(
+    Histogram, "embedding_batcher_batch_requests", "Caller requests merged per upstream request", buckets=SIZE_BUCKETS
+)
+_BATCH_TOKENS = _metric(
+    Histogram,
+    "embedding_batcher_batch_tokens",
+    "Estimated tokens per upstream request",
+    buckets=(64, 256, 1024, 2048, 4096, 8192, 16384, 32768, 65536, 131072),
+)
+_UPSTREAM_SECONDS = _metric(
+    Histogram,
+    "embedding_batcher_upstream_seconds",
+    "Duration of the upstream embeddings requests",
+    ["status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+_REQUESTS = _metric(Counter, "embedding_batcher_requests", "Caller requests answered", ["outcome"])
+
+
+def _observe(histogram, value, **labels):
+    if histogram is not None:
+        (histogram.labels(**labels) if labels else histogram).observe(value)
+
+
+def _count(outcome):
+    if _REQUESTS is not None:
+        _REQUESTS.labels(outcome=outcome).inc()
+
+
+def openai_error(message, error_type="invalid_request_error"):
+    return {"error": {"message": message, "type": error_type}}
+
+
+def normalize_input(value):
+    """Split an OpenAI input into (kind, inputs), kind is "text" or "tokens"
+
+    A string or a list of token ids is a single input, a list of either is
+    several. Raises ValueError for anything else.
+    """
+    if isinstance(value, str):
+        return "text", [value]
+    if isinstance(value, list) and value:
+        if all(isinstance(item, int) for item in value):
+            return "tokens", [value]
+        if all(isinstance(item, str) for item in value):
+            return "text", list(value)
+        if all(isinstance(item, list) and item and all(isinstance(t, int) for t in item) for item in value):
+            return "tokens", list(value)
+    raise ValueError("'input' must be a non-empty string, list of strings or list of token id lists")
+
+
+class Batcher:
+    """Queues embedding requests and sends them upstream in merged batches
+
+    Requests are grouped by batch key. A group is sent once its oldest
+    request has waited max_wait seconds, or as soon as it fills a batch.
+    max_inflight dispatcher threads send batches, so while all of them
+    wait for the upstream the queue keeps filling the next batches.
+    """
+
+    def __init__(self, upstream, max_batch_tokens=16384, max_batch_inputs=256, max_wait=0.005,
+                 max_inflight=4, chars_per_token=4.0, timeout=120.0):
+        self.upstream = upstream.rstrip("/")
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_inputs = max_batch_inputs
+        self.max_wait = max_wait
+        self.max_inflight = max_inflight
+        self.chars_per_token = chars_per_token
+        self.timeout = timeout
+
+        self._cond = threading.Condition()
+        self._groups = OrderedDict()
+        self._inflight = 0
+        self._batches = 0
+        self._batched_requests = 0
+        self._batched_inputs = 0
+
+    def start(self):
+        for _ in range(self.max_inflight):
+            threading.Thread(target=self._dispatch, daemon=True).start()
+
+    def embed(self, body, authorization=None):
+        """Embed one caller request, returns (status, response body)"""
+        try:
+            kind, inputs = normalize_input(body.get("input"))
+        except ValueError as e:
+            _count("invalid")
+            return 400, openai_error(str(e))
+
+        options = {name: value for name, value in body.items() if name not in ("input", "user")}
+        request = {
+            "key": json.dumps([options, kind, authorization], sort_keys=True),
+            "options": options,
+            "authorization": authorization,
+            "inputs": inputs,
+            "tokens": sum(self._estimate_tokens(item) for item in inputs),
+            "enqueued_at": time.monotonic(),
+            "done": threading.Event(),
+            "result": None,
+        }
+        with self._cond:
+            self._groups.setdefault(request["key"], []).append(request)
+            self._cond.notify()
+
+        if not request["done"].wait(self.max_wait + 2 * self.timeout):
+            _count("timeout")
+            return 504, openai_error("Timed out waiting for the embedding batch", "timeout")
+        status, response = request["result"]
+        _count("success" if status == 200 else "error")
+        return status, response
+
+    def status(self):
+        with self._cond:
+            now = time.monotonic()
+            queued = [request for group in self._groups.values() for request in group]
+            return {
+                "upstream": self.upstream,
+                "queued_requests": len(queued),
+                "queued_tokens": sum(request["tokens"] for request in queued),
+                "oldest_wait_seconds": max((now - request["enqueued_at"] for request in queued), default=0.0),
+                "inflight_batches": self._inflight,
+                "batches": self._batches,
+                "mean_batch_requests": self._batched_requests / self._batches if self._batches else 0.0,
+                "mean_batch_inputs": self._batched_inputs / self._batches if self._batches else 0.0,
+            }
+
+    def _estimate_tokens(self, item):
+        if isinstance(item, list):
+            return len(item)
+        return max(1, math.ceil(len(item) / self.chars_per_token))
+
+    def _take_batch(self, now):
+        """Remove and return the next ready batch, or None with the seconds until one is due; caller holds the lock"""
+        next_due = None
+        for key, group in self._groups.items():
+            tokens = sum(request["tokens"] for request in group)
+            inputs = sum(len(request["inputs"]) for request in group)
+            due = group[0]["enqueued_at"] + self.max_wait
+            if due > now and tokens < self.max_batch_tokens and inputs < self.max_batch_inputs:
+                next_due = due if next_due is None else min(next_due, due)
+                continue
+
+            # Oldest first while it fits, the first request goes even if it alone is over the budget
+            batch = [group.pop(0)]
+            tokens, inputs = batch[0]["tokens"], len(batch[0]["inputs"])
+            while group and tokens + group[0]["tokens"] <= self.max_batch_tokens \
+                    and inputs + len(group[0]["inputs"]) <= self.max_batch_inputs:
+                request = group.pop(0)
+                batch.append(request)
+                tokens += request["tokens"]
+                inputs += len(request["inputs"])
+            if not group:
+                del self._groups[key]
+            return batch, None
+        return None, (next_due - now if next_due is not None else None)
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    batch, wait = self._take_batch(now)
+                    if batch:
+                        break
+                    self._cond.wait(wait)
+                self._inflight += 1
+                self._batches += 1
+                self._batched_requests += len(batch)
+                self._batched_inputs += sum(len(request["inputs"]) for request in batch)
+                # Another dispatcher may take the next group right away
+                self._cond.notify()
+
+            try:
+                for request in batch:
+                    _observe(_QUEUE_SECONDS, now - request["enqueued_at"])
+                self._send(batch)
+            except Exception as e:
+                for request in batch:
+                    if not request["done"].is_set():
+                        self._finish(request, 500, openai_error(f"{type(e).__name__}: {e}", "internal_error"))
+            finally:
+                with self._cond:
+                    self._inflight -= 1
+
+    def _send(self, batch):
+        """Send one merged upstream request and fan the result out to the callers"""
+        inputs = [item for request in batch for item in request["inputs"]]
+        _observe(_BATCH_INPUTS, len(inputs))
+        _observe(_BATCH_REQUESTS, len(batch))
+        _observe(_BATCH_TOKENS, sum(request["tokens"] for request in batch))
+
+        status, response = self._post(batch[0], inputs)
+        if status != 200:
+            if len(batch) > 1 and status in RETRY_ALONE_STATUSES:
+                for request in batch:
+                    self._send([request])
+                return
+            for request in batch:
+                self._finish(request, status, response)
+            return
+
+        data = sorted(response.get("data", []), key=lambda item: item["index"])
+        if len(data) != len(inputs):
+            for request in batch:
+                self._finish(request, 502, openai_error(
+                    f"Upstream returned {len(data)} embeddings for {len(inputs)} inputs", "upstream_error"
+                ))
+            return
+
+        # Usage is reported per upstream request, split it by estimated tokens
+        prompt_tokens = response.get("usage", {}).get("prompt_tokens", 0)
+        batch_tokens = sum(request["tokens"] for request in batch)
+        offset = 0
+        for request in batch:
+            items = data[offset:offset + len(request["inputs"])]
+            offset += len(request["inputs"])
+            share = round(prompt_tokens * request["tokens"] / batch_tokens) if batch_tokens else 0
+            self._finish(request, 200, {
+                **response,
+                "data": [{**item, "index": index} for index, item in enumerate(items)],
+                "usage": {"prompt_tokens": share, "total_tokens": share},
+            })
+
+    def _post(self, request, inputs):
+        headers = {"Content-Type": "application/json"}
+        if request["authorization"]:
+            headers["Authorization"] = request["authorization"]
+        payload = json.dumps({**request["options"], "input": inputs}).encode("utf-8")
+        started = time.perf_counter()
+        try:
+            with urlopen(Request(f"{self.upstream}/v1/embeddings", data=payload, headers=headers),
+                         timeout=self.timeout) as response:
+                status, body = response.status, json.loads(response.read())
+        except HTTPError as e:
+            status = e.code
+            try:
+                body = json.loads(e.read())
+            except ValueError:
+                body = openai_error(f"Upstream returned HTTP {e.code}", "upstream_error")
+        except (URLError, OSError) as e:
+            status, body = 502, openai_error(f"Upstream unreachable: {e}", "upstream_error")
+        _observe(_UPSTREAM_SECONDS, time.perf_counter() - started, status=str(status))
+        return status, body
+
+    def _finish(self, request, status, response):
+        request["result"] = (status, response)
+        request["done"].set()
+
+
+def make_handler(batcher):
+    class BatcherHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _reply(self, status, body, content_type="application/json"):
+            payload = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path == "/status":
+                self._reply(200, batcher.status())
+            elif self.path == "/metrics" and Counter is not None:
+                self._reply(200, generate_latest(REGISTRY), CONTENT_TYPE_LATEST)
+            else:
+                self._pass_through()
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            if self.path.rstrip("/") != "/v1/embeddings":
+                self.rfile.read(length)
+                self._reply(404, openai_error("not found", "not_found"))
+                return
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError:
+                self._reply(400, openai_error("invalid JSON"))
+                return
+            if not isinstance(body, dict):
+                self._reply(400, openai_error("the request must be a JSON object"))
+                return
+            self._reply(*batcher.embed(body, self.headers.get("Authorization")))
+
+        def _pass_through(self):
+            headers = {"Authorization": self.headers["Authorization"]} if self.headers.get("Authorization") else {}
+            try:
+                with urlopen(Request(batcher.upstream + self.path, headers=headers), timeout=batcher.timeout) as response:
+                    self._reply(response.status, response.read(), response.headers.get("Content-Type", "application/json"))
+            except HTTPError as e:
+                self._reply(e.code, e.read(), e.headers.get("Content-Type", "application/json"))
+            except (URLError, OSError) as e:
+                self._reply(502, openai_error(f"Upstream unreachable: {e}", "upstream_error"))
+
+        def log_message(self, format, *args):
+            pass
+
+    return BatcherHandler
+
+
+class BatcherServer(ThreadingHTTPServer):
+    # Many callers connect at once, the default backlog of 5 resets them
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Request coalescing proxy for the OpenAI embeddings API")
+    parser.add_argument(
+        "--upstream",
+        required=True,
+        help="Base URL of the embedding server, without /v1 (e.g. http://llama-nemotron-embed-1b-v2-predictor:8080)"
+    )
+    parser.add_argument(
+        "--listen",
+        default="0.0.0.0:8080",
+        help="Listen address (default: 0.0.0.0:8080)"
+    )
+    parser.add_argument(
+        "--max-wait-ms",
+        type=float,
+        default=5.0,
+        help="Milliseconds a request waits for others to share its batch (default: 5)"
+    )
+    parser.add_argument(
+        "--max-batch-tokens",
+        type=int,
+        default=16384,
+        help="Estimated tokens per upstream request, keep it within vLLM's --max-num-batched-tokens (default: 16384)"
+    )
+    parser.add_argument(
+        "--max-batch-inputs",
+        type=int,
+        default=256,
+        help="Inputs per upstream request, keep it within vLLM's --max-num-seqs (default: 256)"
+    )
+    parser.add_argument(
+        "--max-inflight",
+        type=int,
+        default=4,
+        help="Upstream requests sent at once (default: 4)"
+    )
+    parser.add_argument(
+        "--chars-per-token",
+        type=float,
+        default=4.0,
+        help="Characters per token when estimating the tokens of text inputs (default: 4)"
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=120.0,
+        help="Seconds an upstream request may take (default: 120)"
+    )
+
+    args = parser.parse_args()
+
+    batcher = Batcher(
+        args.upstream,
+        max_batch_tokens=args.max_batch_tokens,
+        max_batch_inputs=args.max_batch_inputs,
+        max_wait=args.max_wait_ms / 1000,
+        max_inflight=args.max_inflight,
+        chars_per_token=args.chars_per_token,
+        timeout=args.timeout,
+    )
+    batcher.start()
+    host, port = args.listen.rsplit(":", 1)
+    server = BatcherServer((host, int(port)), make_handler(batcher))
+    print(f"Batching embeddings for {args.upstream}, listening on {args.listen}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()